@@ -1,12 +1,26 @@
 import inspect
+import os
+import sys
 import traceback
 import typing
+import uuid
 
 import edq.util.code
+import edq.util.dirent
+import edq.util.json
 import edq.util.serial
 
 import autograder.question
+import autograder.util.invoke
+import autograder.util.preload
 import autograder.util.prepare_submission
+import autograder.util.resultcache
+
+RESULT_FILENAME: str = 'result.json'
+PARTIAL_RESULTS_FILENAME: str = 'partial-results.ndjson'
+
+DEFAULT_WORKER_POOL_MAX_TASKS: typing.Union[int, None] = 1
+""" Workers grade a single question by default, so no question can see changes made by another. """
 
 class GradedAssignment(edq.util.serial.DictConverter):
     """
@@ -63,6 +77,26 @@ class GradedAssignment(edq.util.serial.DictConverter):
         self.proxy_end_time: typing.Any = edq.util.time.Timestamp(proxy_end_time)
         """ When proxy grading ended. """
 
+    def to_dict(self,
+            context: typing.Union[edq.util.serial.SerializationContext, None] = None,
+            include_resource_usage: bool = False,
+            ) -> typing.Dict[str, edq.util.serial.PODType]:
+        """
+        Return a dict that can be used to represent this result.
+        If include_resource_usage is true, each question's resource usage will be included
+        (see autograder.question.GradedQuestion.resource_usage).
+        """
+
+        if (include_resource_usage):
+            if (context is None):
+                context = edq.util.serial.SerializationContext()
+            else:
+                context = context.copy()
+
+            context.extra[autograder.question.SERIALIZATION_INCLUDE_RESOURCE_USAGE] = True
+
+        return super().to_dict(context)
+
     def to_test_submission(self, options: typing.Union[typing.Dict[str, typing.Any], None] = None) -> typing.Dict[str, typing.Any]:
         """
         Output a dict that can be used as a test submission.
@@ -145,6 +179,33 @@ class GradedAssignment(edq.util.serial.DictConverter):
 
         return "\n".join(output)
 
+    def resource_usage_report(self, prefix: str = '', precision: int = 2) -> str:
+        """
+        Return a string representation of the resources used to grade each question.
+        """
+
+        if ((prefix != '') and (not prefix.endswith(' '))):
+            prefix += ' '
+
+        output = [prefix + "Resource usage (user CPU / system CPU / wall time in seconds, peak memory in KB):"]
+
+        for question in self.questions:
+            usage = question.resource_usage
+            if (usage is None):
+                output.append(f"{prefix}{question.name}: unavailable")
+                continue
+
+            values = [
+                autograder.util.math.number_to_str(usage.user_cpu_sec, precision = precision),
+                autograder.util.math.number_to_str(usage.system_cpu_sec, precision = precision),
+                autograder.util.math.number_to_str(usage.wall_sec, precision = precision),
+                str(usage.peak_rss_kb),
+            ]
+
+            output.append(f"{prefix}{question.name}: {' / '.join(values)}")
+
+        return "\n".join(output)
+
     def _format_logue(self, text: typing.Union[str, None], prefix: str) -> typing.List[str]:
         """ Format the output logue (prologe/epilogue). """
 
@@ -184,7 +245,16 @@ class Assignment:
             output_dir: str = '.',
             work_dir: str = '.',
             prep_submission: bool = True,
+            lazy_submission: bool = False,
+            code_cache_dir: typing.Union[str, None] = None,
             additional_data: typing.Union[typing.Dict[str, typing.Any], None] = None,
+            worker_pool_size: int = 0,
+            worker_pool_max_tasks: typing.Union[int, None] = DEFAULT_WORKER_POOL_MAX_TASKS,
+            max_parallel_questions: int = 1,
+            result_cache_dir: typing.Union[str, None] = None,
+            result_cache_max_entries: int = autograder.util.resultcache.DEFAULT_MAX_ENTRIES,
+            preload_modules: typing.Union[typing.List[str], None] = None,
+            stream_results: bool = False,
             **kwargs: typing.Any) -> None:
         if (name is None):
             name = type(self).__name__
@@ -216,18 +286,106 @@ class Assignment:
         self.prep_submission: bool = prep_submission
         """ Whether or not to call self.prepare_submission() to prepare the input directory before grading. """
 
+        self.lazy_submission: bool = lazy_submission
+        """
+        Whether or not to prepare the submission lazily (only importing files when they are used).
+        When more than one question needs to be graded, the files are still all imported before grading
+        (so each question's process does not import them again),
+        but errors in a file only affect the questions that use it.
+        See autograder.util.prepare_submission.prepare() and preload().
+        """
+
+        self.code_cache_dir: typing.Union[str, None] = code_cache_dir
+        """
+        If set, the sanitized and compiled code of submission files is cached in this (private) dir,
+        so files that have not changed since they were last graded do not need to be prepared again.
+        See autograder.util.prepare_submission.prepare().
+        """
+
         if (additional_data is None):
             additional_data = {}
 
         self.additional_data: typing.Dict[str, typing.Any] = additional_data
         """ Additional data that can be passed to the grader. """
 
+        self.worker_pool_size: int = worker_pool_size
+        """
+        The number of worker processes to grade questions with.
+        Workers are forked from a process that already has the submission, questions, and additional data,
+        so nothing needs to be pickled to send a question to a worker.
+        When zero (the default), every question will be graded in its own fresh process.
+        """
+
+        self.worker_pool_max_tasks: typing.Union[int, None] = worker_pool_max_tasks
+        """
+        When using a worker pool, the number of questions a worker can grade before it is replaced.
+        By default (one), every question is graded on a fresh worker, so using a pool cannot change any grades.
+        Larger values (or None, where workers are only replaced when they are killed or an error occurs)
+        reuse workers, so changes a question makes to the submission, itself, or any global state
+        may be seen by later questions graded on the same worker.
+        Only reuse workers when every question leaves the submission as it found it.
+        """
+
+        self.max_parallel_questions: int = max_parallel_questions
+        """
+        The maximum number of questions to grade at the same time.
+        The default (one) grades questions one after another.
+        Questions that do not allow parallel grading (see Question.allow_parallel) are always graded alone.
+        Parallel grading is only supported on Linux, other platforms will grade questions one after another.
+        """
+
+        self.result_cache: typing.Union[autograder.util.resultcache.ResultCache, None] = None
+        """
+        A cache of question results (see autograder.util.resultcache).
+        When set (by passing a result_cache_dir), questions whose submission, grader code, settings, and additional data
+        have not changed since they were last graded will reuse their cached result instead of being graded again.
+        Only questions that ran to completion (see Question.is_complete()) are cached.
+        Questions that depend on anything else (e.g., the time, randomness, or files outside the input dir)
+        should not be graded with a result cache.
+        """
+
+        if (result_cache_dir is not None):
+            self.result_cache = autograder.util.resultcache.ResultCache(result_cache_dir, max_entries = result_cache_max_entries)
+
+        if (preload_modules is None):
+            preload_modules = []
+
+        self.preload_modules: typing.List[str] = preload_modules
+        """
+        Modules (e.g., heavy libraries like numpy) to import before grading starts (see autograder.util.preload),
+        so each question process inherits them instead of importing them again.
+        """
+
+        self.preload_report: typing.Union[autograder.util.preload.PreloadReport, None] = None
+        """ A report on the preloaded modules (set once grading starts). """
+
+        self.stream_results: bool = stream_results
+        """
+        Whether to write results to the output dir while grading.
+        Each question's result is appended (as a line of JSON) to PARTIAL_RESULTS_FILENAME as soon as it is graded,
+        and the final result is (atomically) written to RESULT_FILENAME once grading is done.
+        So if grading is killed (e.g., by a timeout or running out of memory), the finished questions can still be recovered
+        (see load_partial_results()), and grading progress can be followed by watching the partial results.
+        """
+
         self.result: typing.Union[GradedAssignment, None] = None
         """ The result of grading. """
 
     def grade(self, **kwargs: typing.Any) -> GradedAssignment:
         """ Grade this assignment. """
 
+        self.preload_report = autograder.util.preload.preload_modules(self.preload_modules)
+
+        result = self._grade(**kwargs)
+
+        if (self.stream_results):
+            self._write_result(result)
+
+        return result
+
+    def _grade(self, **kwargs: typing.Any) -> GradedAssignment:
+        """ Grade this assignment, any errors will be reported in the result. """
+
         try:
             return self._grade_submission(self._prepare_submission(), **kwargs)
         except Exception:
@@ -265,31 +423,260 @@ class Assignment:
         self.result = GradedAssignment(name = self.name, questions = [])
         self.result.grading_start_time = edq.util.time.Timestamp.now()
 
+        if (self.stream_results):
+            edq.util.dirent.mkdir(self.output_dir)
+            with open(os.path.join(self.output_dir, PARTIAL_RESULTS_FILENAME), 'w', encoding = edq.util.dirent.DEFAULT_ENCODING):
+                pass
+
+        cache_keys, cached_results = self._get_cached_results()
+
+        if (self.lazy_submission and (cached_results.count(None) > 1)):
+            # Questions are graded in their own processes,
+            # so do any lazy imports once here instead of again in every question's process.
+            autograder.util.prepare_submission.preload(submission)
+
+        worker_pool = None
+        if (None in cached_results):
+            worker_pool = self._create_worker_pool(submission)
+
+        try:
+            if ((worker_pool is not None) and (self.max_parallel_questions > 1)):
+                results = self._grade_questions_parallel(submission, worker_pool, show_exceptions, cached_results)
+            else:
+                results = self._grade_questions(submission, worker_pool, show_exceptions, cached_results)
+        finally:
+            if (worker_pool is not None):
+                worker_pool.close()
+
+        self._cache_results(cache_keys, cached_results, results)
+
+        # Once a question hard fails, all later questions are skipped.
         stop_grading = False
-        for question in self.questions:
-            if (stop_grading):
+        for (i, question) in enumerate(self.questions):
+            result = results[i]
+
+            if (stop_grading or (result is None)):
                 now = edq.util.time.Timestamp.now()
 
-                self.result.questions.append(autograder.question.GradedQuestion(
+                result = autograder.question.GradedQuestion(
                     name = question.name,
                     max_points = question.max_points,
                     score = 0,
                     message = "Grading stopped because of a hard error, skipping question...",
                     grading_start_time = now,
                     grading_end_time = now,
-                    skipped = True))
-            else:
+                    skipped = True)
+
+            self.result.questions.append(result)
+
+            stop_grading = result.hard_fail
+
+        self.result.grading_end_time = edq.util.time.Timestamp.now()
+
+        return self.result
+
+    def _grade_questions(self,
+            submission: typing.Union[object, None],
+            worker_pool: typing.Union[autograder.util.invoke.WorkerPool, None],
+            show_exceptions: bool,
+            cached_results: typing.List[typing.Union[autograder.question.GradedQuestion, None]],
+            ) -> typing.List[typing.Union[autograder.question.GradedQuestion, None]]:
+        """
+        Grade questions one after another until a question hard fails.
+        Questions with a cached result are not graded again.
+        Questions that were not graded will have a None result.
+        """
+
+        results: typing.List[typing.Union[autograder.question.GradedQuestion, None]] = [None] * len(self.questions)
+
+        for (i, question) in enumerate(self.questions):
+            result = cached_results[i]
+            if (result is None):
                 result = question.grade(submission,
                     additional_data = self.additional_data,
-                    show_exceptions = show_exceptions)
+                    show_exceptions = show_exceptions,
+                    worker_pool = worker_pool)
+
+            results[i] = result
+            self._question_finished(result)
 
-                self.result.questions.append(result)
+            if (result.hard_fail):
+                break
 
+        return results
+
+    def _grade_questions_parallel(self,
+            submission: typing.Union[object, None],
+            worker_pool: autograder.util.invoke.WorkerPool,
+            show_exceptions: bool,
+            cached_results: typing.List[typing.Union[autograder.question.GradedQuestion, None]],
+            ) -> typing.List[typing.Union[autograder.question.GradedQuestion, None]]:
+        """
+        Grade questions at the same time (as many as the worker pool allows).
+        Questions are started in order, and no new questions are started once a question hard fails.
+        Questions with a cached result are not graded again (they are treated as finishing immediately).
+        Questions that were not graded will have a None result.
+        """
+
+        results: typing.List[typing.Union[autograder.question.GradedQuestion, None]] = [None] * len(self.questions)
+        running: typing.Dict[autograder.util.invoke.PoolTask, int] = {}
+
+        def wait_for_question() -> bool:
+            """ Wait for a running question to finish and return true if it hard failed. """
+
+            task = worker_pool.wait(list(running.keys()))
+            index = running.pop(task)
+
+            result = self.questions[index].finish_grade(task)
+            results[index] = result
+            self._question_finished(result)
+
+            return result.hard_fail
+
+        stop_grading = False
+        for (i, question) in enumerate(self.questions):
+            cached_result = cached_results[i]
+            if (cached_result is not None):
+                results[i] = cached_result
+                self._question_finished(cached_result)
+                stop_grading = cached_result.hard_fail
+            elif (not question.allow_parallel):
+                # Wait for all the running questions and then grade this question alone.
+                while ((not stop_grading) and (len(running) > 0)):
+                    stop_grading = wait_for_question()
+
+                if (stop_grading):
+                    break
+
+                result = question.grade(submission,
+                    additional_data = self.additional_data,
+                    show_exceptions = show_exceptions,
+                    worker_pool = worker_pool)
+
+                results[i] = result
+                self._question_finished(result)
                 stop_grading = result.hard_fail
+            else:
+                while ((not stop_grading) and (not worker_pool.has_capacity())):
+                    stop_grading = wait_for_question()
 
-        self.result.grading_end_time = edq.util.time.Timestamp.now()
+                if (stop_grading):
+                    break
 
-        return self.result
+                task = question.start_grade(submission, worker_pool,
+                    additional_data = self.additional_data,
+                    show_exceptions = show_exceptions)
+
+                if ((task is None) or (task.result is not None)):
+                    result = question.finish_grade(task)
+                    results[i] = result
+                    self._question_finished(result)
+                    stop_grading = result.hard_fail
+                else:
+                    running[task] = i
+
+            if (stop_grading):
+                break
+
+        # Questions before a hard fail still need to finish (later questions will be skipped anyways).
+        while (len(running) > 0):
+            wait_for_question()
+
+        return results
+
+    def _question_finished(self, result: autograder.question.GradedQuestion) -> None:
+        """ Called as soon as each question is done being graded (in the order they finish). """
+
+        if (not self.stream_results):
+            return
+
+        # Write each result as a single (appended) line,
+        # so being killed mid-write can only ever damage the last line.
+        line = edq.util.json.dumps(result.to_dict()) + "\n"
+        with open(os.path.join(self.output_dir, PARTIAL_RESULTS_FILENAME), 'a', encoding = edq.util.dirent.DEFAULT_ENCODING) as file:
+            file.write(line)
+
+    def _write_result(self, result: GradedAssignment) -> None:
+        """ Atomically write the final result to the output dir, so a partial result is never seen. """
+
+        edq.util.dirent.mkdir(self.output_dir)
+
+        path = os.path.join(self.output_dir, RESULT_FILENAME)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+
+        edq.util.json.dump_path(result.to_dict(), temp_path, indent = 4)
+        os.replace(temp_path, path)
+
+    def _get_cached_results(self) -> typing.Tuple[
+            typing.List[typing.Union[str, None]],
+            typing.List[typing.Union[autograder.question.GradedQuestion, None]]]:
+        """
+        Look up each question in the result cache.
+        Return the cache key and the cached result (or None) for each question.
+        Without a result cache, all keys and results will be None.
+        """
+
+        if (self.result_cache is None):
+            return ([None] * len(self.questions), [None] * len(self.questions))
+
+        submission_hash = autograder.util.resultcache.hash_dir(self.input_dir)
+
+        keys: typing.List[typing.Union[str, None]] = []
+        results: typing.List[typing.Union[autograder.question.GradedQuestion, None]] = []
+
+        for question in self.questions:
+            key = self.result_cache.get_key(question, submission_hash, self.additional_data)
+            result = self.result_cache.get(key)
+
+            if (result is not None):
+                question.result = result
+
+            keys.append(key)
+            results.append(result)
+
+        return (keys, results)
+
+    def _cache_results(self,
+            cache_keys: typing.List[typing.Union[str, None]],
+            cached_results: typing.List[typing.Union[autograder.question.GradedQuestion, None]],
+            results: typing.List[typing.Union[autograder.question.GradedQuestion, None]],
+            ) -> None:
+        """ Store the results of questions that were just graded (and ran to completion) in the result cache. """
+
+        if (self.result_cache is None):
+            return
+
+        for (i, question) in enumerate(self.questions):
+            key = cache_keys[i]
+            result = results[i]
+
+            if ((key is None) or (result is None) or (cached_results[i] is not None) or (not question.is_complete())):
+                continue
+
+            self.result_cache.put(key, result)
+
+    def _create_worker_pool(self, submission: typing.Union[object, None]) -> typing.Union[autograder.util.invoke.WorkerPool, None]:
+        """
+        Create a worker pool for grading questions (if a pool or parallel grading was requested).
+        The submission, questions, and additional data are shared with the workers so they are never pickled.
+        """
+
+        if (self.worker_pool_size > 0):
+            # Reuse workers.
+            size = max(self.worker_pool_size, self.max_parallel_questions)
+            max_tasks = self.worker_pool_max_tasks
+        elif ((self.max_parallel_questions > 1) and sys.platform.startswith('linux')):
+            # Use a fresh worker for each question.
+            size = self.max_parallel_questions
+            max_tasks = 1
+        else:
+            return None
+
+        worker_pool = autograder.util.invoke.WorkerPool(size = size, max_tasks_per_worker = max_tasks)
+
+        worker_pool.share(submission, self.additional_data, *self.questions)
+
+        return worker_pool
 
     def _prepare_submission(self) -> typing.Union[object, None]:
         """
@@ -302,10 +689,33 @@ class Assignment:
         """
 
         if (self.prep_submission):
-            return autograder.util.prepare_submission.prepare(self.input_dir)
+            return autograder.util.prepare_submission.prepare(self.input_dir, lazy = self.lazy_submission,
+                    use_cache = (self.code_cache_dir is not None), cache_dir = self.code_cache_dir)
 
         return None
 
+def load_partial_results(output_dir: str) -> typing.List[autograder.question.GradedQuestion]:
+    """
+    Load the question results that were streamed to an output dir while grading (see Assignment.stream_results),
+    in the order the questions finished.
+    A final line that was only partially written (e.g., grading was killed mid-write) is ignored.
+    """
+
+    path = os.path.join(output_dir, PARTIAL_RESULTS_FILENAME)
+    if (not os.path.exists(path)):
+        return []
+
+    results = []
+
+    with open(path, 'r', encoding = edq.util.dirent.DEFAULT_ENCODING) as file:
+        for line in file:
+            if (not line.endswith("\n")):
+                break
+
+            results.append(autograder.question.GradedQuestion.from_dict(edq.util.json.loads(line, strict = True)))
+
+    return results
+
 def load_assignment_classes(path: str) -> typing.List[typing.Type[Assignment]]:
     """
     Recursively load all the assignment classes in a path (file or dir).
@@ -1,8 +1,13 @@
 import json
+import os
+import sys
 import time
 import typing
+import unittest
 
 import edq.testing.unittest
+import edq.util.dirent
+import edq.util.json
 import edq.util.time
 
 import autograder.assignment
@@ -14,6 +19,9 @@ BASE_ERROR_MESSAGE = "Bad result for question."
 HARD_FAIL_ERROR_MESSAGE = "Fix your code! Hard failing..."
 SKIPPING_QUESTION_MESSAGE = "Grading stopped because of a hard error, skipping question..."
 
+# How long parallel questions will wait for each other to start (generous, so a loaded machine does not fail the test).
+PARALLEL_WAIT_TIMEOUT_SEC = 30.0
+
 class TestAssignment(edq.testing.unittest.BaseTest):
     """ Test assignments. """
 
@@ -120,6 +128,284 @@ class TestAssignment(edq.testing.unittest.BaseTest):
         self.assertEqual(total_score, 0)
         self.assertEqual(max_score, 1)
 
+    def test_worker_pool(self) -> None:
+        """ Test grading questions on a worker pool. """
+
+        questions = [
+            TestAssignment.QuestionAlwaysPass(1),
+            TestAssignment.QuestionBase(1),
+            TestAssignment.QuestionAlwaysFail(1),
+            TestAssignment.QuestionAlwaysHardFail(1),
+            TestAssignment.QuestionAlwaysPass(1),
+        ]
+
+        class TA(autograder.assignment.Assignment):
+            """ A test class representing a TA's example submission. """
+
+            def _prepare_submission(self) -> typing.Callable:
+                return lambda: True
+
+        assignment = TA('test_worker_pool', questions, worker_pool_size = 1)
+        result = assignment.grade(show_exceptions = True)
+
+        self.assertEqual([1, 1, 0, 0, 0], [question.score for question in result.questions])
+        self.assertEqual([False, False, False, True, False], [question.hard_fail for question in result.questions])
+        self.assertEqual([False, False, False, False, True], [question.skipped for question in result.questions])
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "worker pools require Linux")
+    def test_worker_pool_isolation(self) -> None:
+        """ Test that questions only see each other's changes when workers are explicitly reused. """
+
+        class QuestionMutate(autograder.question.Question):
+            """ A testing question that only passes if no other question has changed the submission. """
+
+            def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+                submission.append(self.name)
+
+                if (len(submission) == 1):
+                    self.full_credit()
+                else:
+                    self.fail(BASE_ERROR_MESSAGE)
+
+        class TA(autograder.assignment.Assignment):
+            """ A test class representing a TA's example submission. """
+
+            def _prepare_submission(self) -> typing.List[str]:
+                return []
+
+        # [(assignment kwargs, expected scores), ...]
+        test_cases: typing.List[typing.Tuple[typing.Dict[str, typing.Any], typing.List[float]]] = [
+            ({}, [1, 1, 1]),
+            ({'worker_pool_max_tasks': 1}, [1, 1, 1]),
+            ({'worker_pool_max_tasks': None}, [1, 0, 0]),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (kwargs, expected_scores) = test_case
+
+            with self.subTest(i = i, kwargs = kwargs):
+                questions = [QuestionMutate(1, name = f"Q{j}") for j in range(3)]
+                assignment = TA('test_worker_pool_isolation', questions, worker_pool_size = 1, **kwargs)
+                result = assignment.grade(show_exceptions = True)
+
+                self.assertEqual(expected_scores, [question.score for question in result.questions])
+
+    def test_resource_usage(self) -> None:
+        """ Test that resource usage is recorded for each question, but only serialized on request. """
+
+        class QuestionBusy(autograder.question.Question):
+            """ Use some CPU and memory. """
+
+            def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+                data = list(range(1000000))
+                self.full_credit(str(len(data)))
+
+        class TA(autograder.assignment.Assignment):
+            """ A test class representing a TA's example submission. """
+
+            def _prepare_submission(self) -> typing.Callable:
+                return lambda: True
+
+        assignment = TA('test_resource_usage', [QuestionBusy(1), TestAssignment.QuestionAlwaysPass(1)])
+        result = assignment.grade(show_exceptions = True)
+
+        for question in result.questions:
+            usage = question.resource_usage
+            if (usage is None):
+                # Usage is not available on all platforms.
+                continue
+
+            self.assertGreaterEqual(usage.user_cpu_sec, 0)
+            self.assertGreaterEqual(usage.system_cpu_sec, 0)
+            self.assertGreater(usage.wall_sec, 0)
+            self.assertGreater(usage.peak_rss_kb, 0)
+
+        questions: typing.Any = result.to_dict()['questions']
+        self.assertNotIn('resource_usage', questions[0])
+
+        data = result.to_dict(include_resource_usage = True)
+        questions = data['questions']
+        self.assertIn('resource_usage', questions[0])
+
+        loaded_result = autograder.assignment.GradedAssignment.from_dict(data)
+        self.assertEqual(result.questions[0].resource_usage, loaded_result.questions[0].resource_usage)
+
+    def test_result_cache(self) -> None:
+        """ Test that unchanged questions reuse their cached results. """
+
+        class QuestionCounted(autograder.question.Question):
+            """ Count how many times this question is scored (in a file, since questions are scored in another process). """
+
+            def __init__(self, max_points: float, count_path: str, **kwargs: typing.Any) -> None:
+                super().__init__(max_points, **kwargs)
+                self.count_path = count_path
+
+            def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+                with open(self.count_path, 'a', encoding = edq.util.dirent.DEFAULT_ENCODING) as file:
+                    file.write('.')
+
+                self.set_score(float(kwargs.get('score', 1)))
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-result-cache-')
+        input_dir = os.path.join(temp_dir, 'input')
+        cache_dir = os.path.join(temp_dir, 'cache')
+        count_path = os.path.join(temp_dir, 'count.txt')
+
+        edq.util.dirent.mkdir(input_dir)
+        edq.util.dirent.write_file(os.path.join(input_dir, 'submission.py'), 'A')
+        edq.util.dirent.write_file(count_path, '')
+
+        def grade(score: int = 1, max_entries: int = 100) -> typing.List[float]:
+            questions = [QuestionCounted(1, count_path, name = 'a'), QuestionCounted(1, count_path, name = 'b')]
+
+            assignment = autograder.assignment.Assignment('test_result_cache', questions,
+                    input_dir = input_dir, prep_submission = False, additional_data = {'score': score},
+                    result_cache_dir = cache_dir, result_cache_max_entries = max_entries)
+
+            result = assignment.grade(show_exceptions = True)
+            return [question.score for question in result.questions]
+
+        # (description, score, max entries, expected scores, expected number of scorings)
+        test_cases = [
+            ('first grade', 1, 100, [1, 1], 2),
+            ('unchanged', 1, 100, [1, 1], 2),
+            ('changed additional data', 0, 100, [0, 0], 4),
+            ('original additional data', 1, 100, [1, 1], 4),
+            ('changed submission', 1, 100, [1, 1], 6),
+            ('evict', 2, 3, [2, 2], 8),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (description, score, max_entries, expected_scores, expected_count) = test_case
+
+            if (description == 'changed submission'):
+                edq.util.dirent.write_file(os.path.join(input_dir, 'submission.py'), 'B')
+
+            with self.subTest(i = i, description = description):
+                self.assertEqual(expected_scores, grade(score, max_entries))
+                self.assertEqual(expected_count, len(edq.util.dirent.read_file(count_path)))
+
+        # Eviction keeps the most recent results.
+        self.assertLessEqual(len(os.listdir(cache_dir)), 3)
+        self.assertEqual([2, 2], grade(2, 3))
+        self.assertEqual(8, len(edq.util.dirent.read_file(count_path)))
+
+        # A cache dir that is not private is not used (every question is graded again, and nothing is stored).
+        os.chmod(cache_dir, 0o777)
+        num_entries = len(os.listdir(cache_dir))
+
+        with self.assertLogs('autograder.util.resultcache', level = 'WARNING'):
+            self.assertEqual([2, 2], grade(2, 3))
+
+        self.assertEqual(10, len(edq.util.dirent.read_file(count_path)))
+        self.assertEqual(num_entries, len(os.listdir(cache_dir)))
+
+    def test_stream_results(self) -> None:
+        """ Test writing question results as they finish, and the final result at the end. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-stream-results-')
+
+        for max_parallel_questions in [1, 2]:
+            with self.subTest(max_parallel_questions = max_parallel_questions):
+                output_dir = os.path.join(temp_dir, str(max_parallel_questions))
+
+                questions = [
+                    TestAssignment.QuestionAlwaysPass(1),
+                    TestAssignment.QuestionAlwaysFail(1),
+                    TestAssignment.QuestionAlwaysHardFail(1),
+                ]
+
+                assignment = autograder.assignment.Assignment('test_stream_results', questions,
+                        output_dir = output_dir, prep_submission = False, stream_results = True,
+                        max_parallel_questions = max_parallel_questions)
+
+                result = assignment.grade(show_exceptions = True)
+
+                partial_results = autograder.assignment.load_partial_results(output_dir)
+                self.assertEqual(
+                        ['QuestionAlwaysFail', 'QuestionAlwaysHardFail', 'QuestionAlwaysPass'],
+                        sorted([question.name for question in partial_results]))
+
+                for partial_result in partial_results:
+                    self.assertIn(partial_result, result.questions)
+
+                data = edq.util.json.load_path(os.path.join(output_dir, autograder.assignment.RESULT_FILENAME))
+                self.assertEqual(result, autograder.assignment.GradedAssignment.from_dict(data))
+                self.assertEqual([autograder.assignment.RESULT_FILENAME, autograder.assignment.PARTIAL_RESULTS_FILENAME],
+                        sorted(os.listdir(output_dir), reverse = True))
+
+                # A partially written last line is ignored.
+                partial_path = os.path.join(output_dir, autograder.assignment.PARTIAL_RESULTS_FILENAME)
+                with open(partial_path, 'a', encoding = edq.util.dirent.DEFAULT_ENCODING) as file:
+                    file.write('{"name": "Trunc')
+
+                self.assertEqual(partial_results, autograder.assignment.load_partial_results(output_dir))
+
+    def test_parallel(self) -> None:
+        """ Test grading questions at the same time. """
+
+        class QuestionInterval(autograder.question.Question):
+            """
+            A testing question that records when it started and ended (in files, since questions are scored in other processes).
+            When waiting, the question will not end until the expected number of questions have started (or a long timeout).
+            """
+
+            def __init__(self, max_points: float, times_dir: str, wait_count: int, **kwargs: typing.Any) -> None:
+                super().__init__(max_points, **kwargs)
+                self.times_dir = times_dir
+                self.wait_count = wait_count
+
+            def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+                edq.util.dirent.write_file(os.path.join(self.times_dir, f"{self.name}.start"), str(time.time()))
+
+                deadline = time.time() + PARALLEL_WAIT_TIMEOUT_SEC
+                while (time.time() < deadline):
+                    started = [name for name in os.listdir(self.times_dir) if name.endswith('.start')]
+                    if (len(started) >= self.wait_count):
+                        break
+
+                    time.sleep(0.01)
+
+                edq.util.dirent.write_file(os.path.join(self.times_dir, f"{self.name}.end"), str(time.time()))
+                self.full_credit()
+
+        # [(allow parallel, expect overlap), ...]
+        test_cases = [
+            (True, sys.platform.startswith('linux')),
+            (False, False),
+        ]
+
+        for (allow_parallel, expect_overlap) in test_cases:
+            with self.subTest(allow_parallel = allow_parallel):
+                times_dir = edq.util.dirent.get_temp_dir('autograder-test-parallel-')
+                wait_count = 4 if expect_overlap else 0
+
+                questions = [QuestionInterval(1, times_dir, wait_count, name = f"Q{i}", allow_parallel = allow_parallel) for i in range(4)]
+
+                assignment = autograder.assignment.Assignment('test_parallel', questions,
+                        prep_submission = False, max_parallel_questions = 4)
+
+                result = assignment.grade(show_exceptions = True)
+
+                self.assertEqual(['Q0', 'Q1', 'Q2', 'Q3'], [question.name for question in result.questions])
+                self.assertEqual((4, 4), result.get_score())
+
+                intervals = []
+                for question in questions:
+                    start = float(edq.util.dirent.read_file(os.path.join(times_dir, f"{question.name}.start")))
+                    end = float(edq.util.dirent.read_file(os.path.join(times_dir, f"{question.name}.end")))
+                    intervals.append((start, end))
+
+                intervals.sort()
+
+                if (expect_overlap):
+                    # Every question was running at the same time.
+                    self.assertLess(max(start for (start, _) in intervals), min(end for (_, end) in intervals))
+                else:
+                    # Each question ended before the next one started.
+                    for ((_, end), (next_start, _)) in zip(intervals, intervals[1:]):
+                        self.assertLessEqual(end, next_start)
+
     def test_hard_fail(self) -> None:
         """ Test hard failing. """
 
@@ -352,6 +638,34 @@ class TestAssignment(edq.testing.unittest.BaseTest):
                     + f" Expected: '{json.dumps(expected_result.to_dict(), indent = 4)}',"
                     + f" actual: '{json.dumps(result.to_dict(), indent = 4)}'.")
 
+    def test_hard_fail_parallel(self) -> None:
+        """ Test that hard failing while grading questions at the same time gives the same results as grading them in order. """
+
+        question_classes: typing.List[typing.Callable[..., autograder.question.Question]] = [
+            TestAssignment.QuestionAlwaysPass,
+            TestAssignment.QuestionAlwaysFail,
+            TestAssignment.QuestionAlwaysHardFail,
+        ]
+
+        class TA(autograder.assignment.Assignment):
+            """ A test class representing a TA's example submission. """
+
+            def _prepare_submission(self) -> None:
+                pass
+
+        for (i, question_class_a) in enumerate(question_classes):
+            for (j, question_class_b) in enumerate(question_classes):
+                with self.subTest(i = i, j = j):
+                    results = []
+                    for max_parallel_questions in [1, 2]:
+                        questions = [question_class_a(1), question_class_b(1)]
+                        assignment = TA('test_hard_fail_parallel', questions, max_parallel_questions = max_parallel_questions)
+                        results.append(assignment.grade(show_exceptions = True))
+
+                    self.assertEqual(results[0], results[1], "Unexpected result:"
+                        + f" Expected: '{json.dumps(results[0].to_dict(), indent = 4)}',"
+                        + f" actual: '{json.dumps(results[1].to_dict(), indent = 4)}'.")
+
     def test_report_score_format(self) -> None:
         """ Test the formatting for assignment scores. """
 
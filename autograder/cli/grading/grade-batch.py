@@ -0,0 +1,105 @@
+# pylint: disable=invalid-name
+
+"""
+Grade every submission in a directory (each child directory is a submission) with an assignment (specified by an assignment JSON file).
+Submissions are graded in parallel, and the static portion of grading is only prepared once.
+A JSON result will be written for each submission, along with a summary table.
+"""
+
+import argparse
+import os
+import sys
+import typing
+
+import edq.util.dirent
+
+import autograder.cli.parser
+import autograder.submission
+import autograder.util.math
+import autograder.util.preload
+
+DEFAULT_ASSIGNMENT: str = 'assignment.json'
+SUMMARY_FILENAME: str = 'summary.tsv'
+SUMMARY_HEADERS: typing.List[str] = ['submission', 'score', 'max_points', 'message']
+
+def run_cli(args: argparse.Namespace) -> int:
+    """ Run the CLI. """
+
+    summaries = autograder.submission.grade_submissions(args.assignment, args.submissions, args.out_dir,
+            num_workers = args.jobs, timeout = args.timeout,
+            use_snapshot = args.use_snapshot,
+            snapshot_cache_dir = args.snapshot_cache_dir,
+            link_mode = args.link_mode,
+            include_resource_usage = args.include_resource_usage,
+            preload_modules = args.preload_modules)
+
+    rows = [SUMMARY_HEADERS]
+    errors = 0
+
+    for summary in summaries:
+        if (summary.message != ''):
+            errors += 1
+
+        rows.append([
+            summary.id,
+            autograder.util.math.number_to_str(summary.score),
+            autograder.util.math.number_to_str(summary.max_points),
+            summary.message.replace("\n", ' ').replace("\t", ' '),
+        ])
+
+    table = "\n".join(["\t".join(row) for row in rows])
+
+    print(table)
+    edq.util.dirent.write_file(os.path.join(args.out_dir, SUMMARY_FILENAME), table)
+
+    print(f"\nGraded {len(summaries) - errors} / {len(summaries)} submissions.")
+
+    preload_report = autograder.util.preload.get_report()
+    if (len(preload_report.modules) > 0):
+        print(preload_report.report(num_children = len(summaries)))
+
+    if (errors > 0):
+        return 1
+
+    return 0
+
+def main() -> int:
+    """ Get a parser, parse the args, and call run. """
+    return run_cli(_get_parser().parse_args())
+
+def _get_parser() -> argparse.ArgumentParser:
+    parser = autograder.cli.parser.get_parser(__doc__.strip(), include_snapshot = True, include_filespec_cache = True)
+
+    parser.add_argument('-a', '--assignment',
+        action = 'store', type = str, required = False, default = DEFAULT_ASSIGNMENT,
+        help = 'The path to a JSON file describing an assignment (default: %(default)s).')
+
+    parser.add_argument('-s', '--submissions',
+        action = 'store', type = str, required = True,
+        help = 'The path to a dir containing one submission dir per student.')
+
+    parser.add_argument('-o', '--out-dir', dest = 'out_dir',
+        action = 'store', type = str, required = True,
+        help = 'The dir to write results (and the summary) to.')
+
+    parser.add_argument('-j', '--jobs',
+        action = 'store', type = int, default = (os.cpu_count() or 1),
+        help = 'The number of submissions to grade at the same time (default: %(default)s).')
+
+    parser.add_argument('--timeout',
+        action = 'store', type = float, default = None,
+        help = 'The maximum number of seconds to spend grading a single submission (default: no timeout).')
+
+    parser.add_argument('--resource-usage', dest = 'include_resource_usage',
+        action = 'store_true', default = False,
+        help = 'Include the resources (CPU time, memory, etc.) used to grade each question in the results (default: %(default)s).')
+
+    parser.add_argument('--preload-module', dest = 'preload_modules',
+        action = 'append', type = str, default = [],
+        help = 'A module to import before any grading processes are started,'
+            + ' in addition to any listed in the assignment config (may be specified multiple times).')
+
+    return parser
+
+if (__name__ == '__main__'):
+    sys.exit(main())
@@ -26,10 +26,14 @@ def run_cli(args: argparse.Namespace) -> int:
 
     print(result.report())
 
+    if (args.include_resource_usage):
+        print()
+        print(result.resource_usage_report())
+
     if (args.outpath is not None):
         out_path = os.path.abspath(args.outpath)
         edq.util.dirent.mkdir(os.path.dirname(os.path.abspath(out_path)))
-        edq.util.json.dump_path(result.to_dict(), out_path, indent = 4)
+        edq.util.json.dump_path(result.to_dict(include_resource_usage = args.include_resource_usage), out_path, indent = 4)
 
     return 0
 
@@ -56,6 +60,10 @@ def _get_parser() -> argparse.ArgumentParser:
         action = 'store', type = str, required = False, default = None,
         help = 'The path to a output the JSON result.')
 
+    parser.add_argument('--resource-usage', dest = 'include_resource_usage',
+        action = 'store_true', default = False,
+        help = 'Output the resources (CPU time, memory, etc.) used to grade each question (default: %(default)s).')
+
     return parser
 
 if (__name__ == '__main__'):
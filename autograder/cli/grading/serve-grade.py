@@ -0,0 +1,53 @@
+# pylint: disable=invalid-name
+
+"""
+Ask a running grading server (see `grading.serve`) to grade a submission.
+"""
+
+import argparse
+import sys
+
+import autograder.cli.parser
+import autograder.serve
+
+def run_cli(args: argparse.Namespace) -> int:
+    """ Run the CLI. """
+
+    try:
+        result = autograder.serve.request_grade(args.submission, socket_path = args.socket,
+                output_path = args.output_path, timeout = args.timeout)
+    except Exception as ex:
+        print(f"Failed to grade submission '{args.submission}': '{ex}'.")
+        return 1
+
+    print(result.report())
+
+    return 0
+
+def main() -> int:
+    """ Get a parser, parse the args, and call run. """
+    return run_cli(_get_parser().parse_args())
+
+def _get_parser() -> argparse.ArgumentParser:
+    parser = autograder.cli.parser.get_parser(__doc__.strip())
+
+    parser.add_argument('-s', '--submission',
+        action = 'store', type = str, required = True,
+        help = 'The path to a submission dir.')
+
+    parser.add_argument('-o', '--output-path', dest = 'output_path',
+        action = 'store', type = str, default = None,
+        help = 'If specified, the server will also write the result to this path (must be inside the server\'s output root).')
+
+    parser.add_argument('--socket',
+        action = 'store', type = str, default = autograder.serve.DEFAULT_SOCKET_PATH,
+        help = 'The path of the server\'s Unix socket (default: %(default)s).')
+
+    parser.add_argument('--timeout',
+        action = 'store', type = float, default = None,
+        help = 'The maximum number of seconds to wait for the result (default: no timeout).')
+
+    return parser
+
+if (__name__ == '__main__'):
+    sys.exit(main())
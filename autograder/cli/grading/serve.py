@@ -0,0 +1,94 @@
+# pylint: disable=invalid-name
+
+"""
+Serve grading requests for an assignment (specified by an assignment JSON file) over a local Unix socket.
+The assignment is loaded once, and each request is graded in a fresh process forked from the server.
+The grader is reloaded (for new requests) whenever the assignment changes.
+Use `grading.serve-grade` to send requests.
+"""
+
+import argparse
+import os
+import signal
+import sys
+import traceback
+import typing
+
+import autograder.cli.parser
+import autograder.serve
+import autograder.util.fastcopy
+import autograder.util.preload
+
+DEFAULT_ASSIGNMENT: str = 'assignment.json'
+
+def run_cli(args: argparse.Namespace) -> int:
+    """ Run the CLI. """
+
+    server = autograder.serve.GradingServer(args.assignment, socket_path = args.socket,
+            max_concurrent = args.jobs, timeout = args.timeout, link_mode = args.link_mode,
+            preload_modules = args.preload_modules, output_root = args.output_root)
+
+    def stop(signal_number: int, frame: typing.Any) -> None:
+        server.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"Serving assignment '{server.assignment_config_path}' on '{server.socket_path}'.")
+
+    try:
+        server.serve_forever()
+    except Exception as ex:
+        print(f"Failed to serve assignment '{args.assignment}': '{ex}'.")
+        traceback.print_exc()
+        return 1
+
+    print(f"Served {server.num_requests} request(s) and reloaded the grader {server.num_reloads} time(s).")
+
+    preload_report = autograder.util.preload.get_report()
+    if (len(preload_report.modules) > 0):
+        print(preload_report.report(num_children = server.num_requests))
+
+    return 0
+
+def main() -> int:
+    """ Get a parser, parse the args, and call run. """
+    return run_cli(_get_parser().parse_args())
+
+def _get_parser() -> argparse.ArgumentParser:
+    parser = autograder.cli.parser.get_parser(__doc__.strip(), include_filespec_cache = True)
+
+    parser.add_argument('-a', '--assignment',
+        action = 'store', type = str, required = False, default = DEFAULT_ASSIGNMENT,
+        help = 'The path to a JSON file describing an assignment (default: %(default)s).')
+
+    parser.add_argument('--socket',
+        action = 'store', type = str, default = autograder.serve.DEFAULT_SOCKET_PATH,
+        help = 'The path of the Unix socket to listen on (default: %(default)s).')
+
+    parser.add_argument('--output-root', dest = 'output_root',
+        action = 'store', type = str, default = None,
+        help = 'Only allow requests to write their results to paths inside this dir (default: no output paths allowed).')
+
+    parser.add_argument('-j', '--jobs',
+        action = 'store', type = int, default = (os.cpu_count() or 1),
+        help = 'The number of submissions to grade at the same time (default: %(default)s).')
+
+    parser.add_argument('--timeout',
+        action = 'store', type = float, default = None,
+        help = 'The maximum number of seconds to spend grading a single submission (default: no timeout).')
+
+    parser.add_argument('--link-mode', dest = 'link_mode',
+        action = 'store', type = str, default = autograder.util.fastcopy.DEFAULT_LINK_MODE,
+        choices = autograder.util.fastcopy.LINK_MODES,
+        help = 'How to copy the assignment\'s static files into each grading dir (default: %(default)s).')
+
+    parser.add_argument('--preload-module', dest = 'preload_modules',
+        action = 'append', type = str, default = [],
+        help = 'A module to import before any grading processes are started,'
+            + ' in addition to any listed in the assignment config (may be specified multiple times).')
+
+    return parser
+
+if (__name__ == '__main__'):
+    sys.exit(main())
@@ -14,7 +14,10 @@ import lms.model.constants
 
 import autograder
 import autograder.api.common
+import autograder.filespec
 import autograder.model.config
+import autograder.util.fastcopy
+import autograder.util.filespeccache
 import autograder.util.net
 
 CONFIG_FILENAME: str = 'autograder.json'
@@ -35,12 +38,23 @@ def _post_parse(
     if (args.testing_mode):
         autograder.api.common.set_testing_source_info()
 
+    if ((getattr(args, 'filespec_cache_dir', None) is not None) or getattr(args, 'filespec_cache_only', False)):
+        cache_dir = args.filespec_cache_dir
+        if (cache_dir is None):
+            cache_dir = autograder.util.filespeccache.DEFAULT_CACHE_DIR
+
+        autograder.filespec.set_default_cache(autograder.util.filespeccache.FileSpecCache(cache_dir,
+                refresh_sec = args.filespec_cache_refresh_sec,
+                cache_only = args.filespec_cache_only))
+
 def get_parser(
         description: str,
         api_params: typing.Union[typing.List[autograder.api.config.APIParam], None] = None,
         include_output_format: bool = False,
         include_net: bool = True,
         include_skip_rows: bool = False,
+        include_snapshot: bool = False,
+        include_filespec_cache: bool = False,
         ) -> argparse.ArgumentParser:
     """
     Get an argument parser specialized for autograder-py.
@@ -113,4 +127,41 @@ def get_parser(
             action = 'store', type = int, default = DEFAULT_SKIP_ROWS,
             help = 'The number of header rows to skip (default: %(default)s).')
 
+    if (include_snapshot):
+        group = parser.add_argument_group('grading dir options')
+
+        group.add_argument('--use-snapshot', dest = 'use_snapshot',
+            action = 'store_true', default = False,
+            help = ('Reuse a cached copy of the assignment\'s static files (and static file operations)'
+                + ' instead of building them for each submission.'
+                + ' Assignments with remote static files that are not pinned (to a commit or checksum) are never cached'
+                + ' (default: %(default)s).'))
+
+        group.add_argument('--snapshot-cache-dir', dest = 'snapshot_cache_dir',
+            action = 'store', type = str, default = None,
+            help = 'Where to store cached static files (default: a dir in the system\'s temp dir).')
+
+        group.add_argument('--link-mode', dest = 'link_mode',
+            action = 'store', type = str, default = autograder.util.fastcopy.DEFAULT_LINK_MODE,
+            choices = autograder.util.fastcopy.LINK_MODES,
+            help = ('How to copy prepared static files into a grading dir.'
+                + ' Hard links should only be used if graders do not modify their static files (default: %(default)s).'))
+
+    if (include_filespec_cache):
+        group = parser.add_argument_group('remote file cache options')
+
+        group.add_argument('--filespec-cache-dir', dest = 'filespec_cache_dir',
+            action = 'store', type = str, default = None,
+            help = ('Copy remote (git and URL) static files through a local cache in this dir'
+                + ' instead of fetching them every time (default: no cache).'))
+
+        group.add_argument('--filespec-cache-refresh', dest = 'filespec_cache_refresh_sec',
+            action = 'store', type = float, default = autograder.util.filespeccache.DEFAULT_REFRESH_SEC,
+            help = 'The number of seconds cached remote files are used before they are checked for changes (default: %(default)s).')
+
+        group.add_argument('--filespec-cache-only', dest = 'filespec_cache_only',
+            action = 'store_true', default = False,
+            help = ('Only use remote files that are already cached, never fetch them (e.g., for offline grading).'
+                + ' Uses the default cache dir (in the system\'s temp dir) if no cache dir is given (default: %(default)s).'))
+
     return parser
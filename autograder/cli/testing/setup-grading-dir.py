@@ -33,7 +33,7 @@ def main() -> int:
     return run_cli(_get_parser().parse_args())
 
 def _get_parser() -> argparse.ArgumentParser:
-    parser = autograder.cli.parser.get_parser(__doc__.strip())
+    parser = autograder.cli.parser.get_parser(__doc__.strip(), include_filespec_cache = True)
 
     parser.add_argument('-a', '--assignment',
         action = 'store', type = str, required = True,
@@ -2,14 +2,17 @@
 
 """
 Run a grader against multiple test assignments and ensure the output matches the expected output.
+Each test submission is run in its own process (on Linux), and several may be run at the same time.
 """
 
 import argparse
+import os
 import sys
 import traceback
 
 import autograder.cli.parser
 import autograder.submission
+import autograder.util.preload
 
 DEFAULT_ASSIGNMENT = 'assignment.json'
 
@@ -23,19 +26,31 @@ def run_cli(args: argparse.Namespace) -> int:
         traceback.print_exc()
         return 101
 
+    try:
+        results = autograder.submission.run_test_submissions(args.assignment, sorted(test_submissions),
+                num_workers = args.jobs, timeout = args.timeout, preload_modules = args.preload_modules)
+    except Exception as ex:
+        print(f"Failed to run submissions for assignment '{args.assignment}': '{ex}'.")
+        traceback.print_exc()
+        return max(1, len(test_submissions))
+
     errors = 0
-    for test_submission in sorted(test_submissions):
-        success = False
+    for result in results:
+        print(result.output, end = '')
 
-        try:
-            success = autograder.submission.run_test_submission(args.assignment, test_submission)
-        except Exception as ex:
-            print(f"Failed to run submission '{test_submission}': '{ex}'.")
-            traceback.print_exc()
+        if (result.message != ''):
+            print(f"Failed to run submission '{result.path}': {result.message}")
 
-        if (not success):
+        if (not result.success):
             errors += 1
 
+    if (args.report):
+        print(autograder.submission.report_test_submissions(results))
+
+    preload_report = autograder.util.preload.get_report()
+    if (len(preload_report.modules) > 0):
+        print(preload_report.report(num_children = len(results)))
+
     print(f"Encountered {errors} error(s) while testing {len(test_submissions)} submissions.")
 
     if (errors > 0):
@@ -50,7 +65,7 @@ def main() -> int:
     return run_cli(_get_parser().parse_args())
 
 def _get_parser() -> argparse.ArgumentParser:
-    parser = autograder.cli.parser.get_parser(__doc__.strip())
+    parser = autograder.cli.parser.get_parser(__doc__.strip(), include_filespec_cache = True)
 
     parser.add_argument('-a', '--assignment',
         action = 'store', type = str, required = False, default = DEFAULT_ASSIGNMENT,
@@ -60,6 +75,23 @@ def _get_parser() -> argparse.ArgumentParser:
         action = 'store', type = str, required = True,
         help = 'The path to a dir containing one or more test submissions.')
 
+    parser.add_argument('-j', '--jobs',
+        action = 'store', type = int, default = (os.cpu_count() or 1),
+        help = 'The number of test submissions to run at the same time (default: %(default)s).')
+
+    parser.add_argument('--timeout',
+        action = 'store', type = float, default = None,
+        help = 'The maximum number of seconds to spend on a single test submission (default: no timeout).')
+
+    parser.add_argument('--report', dest = 'report',
+        action = 'store_true', default = False,
+        help = 'Also print a table of each test submission\'s status and run time (default: %(default)s).')
+
+    parser.add_argument('--preload-module', dest = 'preload_modules',
+        action = 'append', type = str, default = [],
+        help = 'A module to import before any grading processes are started,'
+            + ' in addition to any listed in the assignment config (may be specified multiple times).')
+
     return parser
 
 if (__name__ == '__main__'):
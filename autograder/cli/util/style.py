@@ -18,7 +18,8 @@ def run_cli(args: argparse.Namespace) -> int:
     count, total_lines = autograder.style.check_paths(args.paths,
             ignore_paths = args.ignore_paths,
             ignore_patterns = args.ignore_patterns,
-            style_overrides = style_overrides)
+            style_overrides = style_overrides,
+            jobs = args.jobs)
 
     print(f"Found {count} style errors.")
 
@@ -54,6 +55,10 @@ def _get_parser() -> argparse.ArgumentParser:
         type = str, action = 'store', default = '{}',
         help = 'A JSON object containing style overrides to send to flake8 (default: %(default)s).')
 
+    parser.add_argument('-j', '--jobs',
+        type = int, action = 'store', default = autograder.style.DEFAULT_JOBS,
+        help = 'The number of processes to check files with (default: %(default)s).')
+
     return parser
 
 if (__name__ == '__main__'):
@@ -26,7 +26,10 @@ def run(args: argparse.Namespace) -> int:
     assignment_config_path = os.path.abspath(args.assignment)
     submission_path = os.path.abspath(args.submission)
 
-    grading_dir = autograder.submission.prep_grading_dir(assignment_config_path, submission_path)
+    grading_dir = autograder.submission.prep_grading_dir(assignment_config_path, submission_path,
+            use_snapshot = args.use_snapshot,
+            snapshot_cache_dir = args.snapshot_cache_dir,
+            link_mode = args.link_mode)
 
     result = autograder.submission.run_submission(grading_dir,
             assignment_config_path = assignment_config_path)
@@ -35,11 +38,15 @@ def run(args: argparse.Namespace) -> int:
 
     print(result.report())
 
+    if (args.include_resource_usage):
+        print()
+        print(result.resource_usage_report())
+
     if (args.out_path is not None):
         out_path = os.path.abspath(args.out_path)
         edq.util.dirent.mkdir(os.path.dirname(os.path.abspath(out_path)))
 
-        edq.util.json.dump_path(result, out_path, indent = 4)
+        edq.util.json.dump_path(result.to_dict(include_resource_usage = args.include_resource_usage), out_path, indent = 4)
 
     if (args.test_submission_path is not None):
         test_submission_path = os.path.abspath(args.test_submission_path)
@@ -55,7 +62,7 @@ def run(args: argparse.Namespace) -> int:
 def _get_parser() -> argparse.ArgumentParser:
     """ Get a parser for this operation. """
 
-    parser = autograder.cli.parser.get_parser(__doc__.strip())
+    parser = autograder.cli.parser.get_parser(__doc__.strip(), include_snapshot = True, include_filespec_cache = True)
 
     parser.add_argument('-a', '--assignment',
         action = 'store', type = str, required = False, default = DEFAULT_ASSIGNMENT,
@@ -75,6 +82,10 @@ def _get_parser() -> argparse.ArgumentParser:
             + ' If an existing dir is provided,'
             + f" a '{TEST_SUBMISSION_FILENAME}' file will be created inside that dir."))
 
+    parser.add_argument('--resource-usage', dest = 'include_resource_usage',
+        action = 'store_true', default = False,
+        help = 'Output the resources (CPU time, memory, etc.) used to grade each question (default: %(default)s).')
+
     return parser
 
 def main() -> int:
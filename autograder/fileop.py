@@ -8,13 +8,14 @@ See:
 """
 
 import fnmatch
-import glob
+import functools
 import os
 import re
 import typing
 
 import edq.util.dirent
 
+import autograder.util.fastcopy
 import autograder.util.path
 
 FILE_OP_LONG_COPY: str = "copy"
@@ -52,6 +53,12 @@ fileop_num_args: typing.Dict[str, int] = {
 }
 """ The number of operations for each file operation. """
 
+PLAN_CACHE_SIZE: int = 128
+""" The number of compiled plans to keep (see compile_file_operations()). """
+
+_GLOB_MAGIC: typing.Pattern = re.compile(r'[*?[]')
+""" Characters that make a path component a glob (the same ones glob uses). """
+
 FileOp = typing.List[str]
 """ Alias file operations until they are formalized in a more robust class. """
 
@@ -115,46 +122,173 @@ def validate(operation: typing.Union[None, typing.List[str], FileOp]) -> FileOp:
 
     return operation
 
-def execute(operation: FileOp, base_dir: str) -> None:
-    """ Execute operation operation in the given directory. """
+def execute(operation: FileOp, base_dir: str, link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE) -> None:
+    """
+    Execute operation operation in the given directory.
+    Copies are made according to the link mode (see autograder.util.fastcopy).
+    """
 
-    validate(operation)
+    compile_file_operations([operation]).execute(base_dir, link_mode = link_mode)
 
-    command = operation[0]
+def validate_file_operations(operations: typing.List[typing.Union[None, typing.List[str]]]) -> typing.List[FileOp]:
+    """ Validate multiple file operations. """
 
-    if (command == FILE_OP_LONG_COPY):
-        source_path = _resolve_path(operation[1], base_dir)
-        dest_path = _resolve_path(operation[2], base_dir)
+    return [validate(operation) for operation in operations]
 
-        _handle_glob_file_operation(
-            source_path, dest_path, edq.util.dirent.copy,
-        )
-    elif (command == FILE_OP_LONG_MOVE):
-        source_path = _resolve_path(operation[1], base_dir)
-        dest_path = _resolve_path(operation[2], base_dir)
+def compile_file_operations(operations: typing.List[typing.Union[None, typing.List[str]]]) -> 'FileOpPlan':
+    """
+    Get a plan for executing file operations (see FileOpPlan).
+    Plans are cached by their operations, so compiling the same operations again is cheap.
+    """
 
-        _handle_glob_file_operation(source_path, dest_path, edq.util.dirent.move)
-    elif (command == FILE_OP_LONG_MKDIR):
-        path = _resolve_path(operation[1], base_dir)
+    key = tuple((None if (operation is None) else tuple(operation)) for operation in operations)
+    return _compile_file_operations(key)
 
-        edq.util.dirent.mkdir(path)
-    elif (command == FILE_OP_LONG_REMOVE):
-        path_glob = _resolve_path(operation[1], base_dir)
+def exec_file_operations(operations: typing.Union[typing.List[FileOp], 'FileOpPlan'], base_dir: str,
+        link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE) -> None:
+    """ Execute multiple file operations (or a compiled plan) in the given directory. """
 
-        _handle_glob_remove(path_glob)
-    else:
-        raise ValueError(f"Unknown file operation: '{command}'.")
+    if (not isinstance(operations, FileOpPlan)):
+        operations = compile_file_operations(typing.cast(typing.List[typing.Union[None, typing.List[str]]], operations))
 
-def validate_file_operations(operations: typing.List[typing.Union[None, typing.List[str]]]) -> typing.List[FileOp]:
-    """ Validate multiple file operations. """
+    operations.execute(base_dir, link_mode = link_mode)
 
-    return [validate(operation) for operation in operations]
+class FileOpPlan:
+    """
+    A list of file operations that has been validated and compiled once,
+    and can then be executed in any number of base dirs.
+
+    Glob patterns are compiled up front,
+    and the dir listings used to match them are shared between all the operations in a single execution
+    (a listing is only read again after an operation may have changed it).
+    """
+
+    def __init__(self, operations: typing.List[typing.Union[None, typing.List[str]]]) -> None:
+        self.operations: typing.List[FileOp] = [validate(None if (operation is None) else list(operation)) for operation in operations]
+        """ The validated (and normalized) operations. """
+
+        self._steps: typing.List[typing.Tuple[str, typing.List[_PathPattern]]] = [
+            (operation[0], [_PathPattern(path) for path in operation[1:]]) for operation in self.operations
+        ]
+
+    def execute(self, base_dir: str, link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE) -> None:
+        """
+        Execute the operations in the given directory.
+        Copies are made according to the link mode (see autograder.util.fastcopy).
+        """
+
+        base_dir = os.path.normpath(base_dir)
+        scan = _DirScan()
+
+        for (command, patterns) in self._steps:
+            if (command == FILE_OP_LONG_COPY):
+                _handle_glob_file_operation(
+                    patterns[0], patterns[1].resolve(base_dir), base_dir, scan, autograder.util.fastcopy.copy,
+                    link_mode = link_mode,
+                )
+            elif (command == FILE_OP_LONG_MOVE):
+                _handle_glob_file_operation(patterns[0], patterns[1].resolve(base_dir), base_dir, scan, edq.util.dirent.move)
+            elif (command == FILE_OP_LONG_MKDIR):
+                path = patterns[0].resolve(base_dir)
+
+                edq.util.dirent.mkdir(path)
+                scan.invalidate(path)
+            elif (command == FILE_OP_LONG_REMOVE):
+                _handle_glob_remove(patterns[0], base_dir, scan)
+            else:
+                raise ValueError(f"Unknown file operation: '{command}'.")
+
+class _PathPattern:
+    """ A (validated) fileop path argument, with any glob components compiled. """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+        # [(component, compiled glob (or None if the component is literal)), ...]
+        self.parts: typing.List[typing.Tuple[str, typing.Union[typing.Pattern, None]]] = []
+        for part in path.split(os.sep):
+            regex = None
+            if (_GLOB_MAGIC.search(part) is not None):
+                regex = re.compile(fnmatch.translate(part))
 
-def exec_file_operations(operations: typing.List[FileOp], base_dir: str) -> None:
-    """ Execute multiple file operations in the given directory. """
+            self.parts.append((part, regex))
 
-    for operation in operations:
-        execute(operation, base_dir)
+        self.has_magic: bool = any((regex is not None) for (_, regex) in self.parts)
+
+    def resolve(self, base_dir: str) -> str:
+        """ Get the (unglobbed) path in the given base dir. """
+
+        return _resolve_path(self.path, base_dir)
+
+    def match(self, base_dir: str, scan: '_DirScan') -> typing.List[str]:
+        """ Get all the existing paths in the base dir that match this pattern (like glob.glob()). """
+
+        if (not self.has_magic):
+            path = self.resolve(base_dir)
+            if (os.path.lexists(path)):
+                return [path]
+
+            return []
+
+        paths = [base_dir]
+        for (i, (part, regex)) in enumerate(self.parts):
+            is_last = (i == (len(self.parts) - 1))
+            next_paths = []
+
+            for dirpath in paths:
+                if (regex is None):
+                    path = os.path.join(dirpath, part)
+                    if ((is_last and os.path.lexists(path)) or ((not is_last) and os.path.isdir(path))):
+                        next_paths.append(path)
+
+                    continue
+
+                for (name, is_dir) in scan.list(dirpath):
+                    # Like glob, hidden entries are only matched by patterns that start with a dot.
+                    if (name.startswith('.') and (not part.startswith('.'))):
+                        continue
+
+                    if ((is_last or is_dir) and (regex.match(name) is not None)):
+                        next_paths.append(os.path.join(dirpath, name))
+
+            paths = next_paths
+
+        return paths
+
+class _DirScan:
+    """ Cached dir listings that are dropped when an operation touches them. """
+
+    def __init__(self) -> None:
+        self._listings: typing.Dict[str, typing.List[typing.Tuple[str, bool]]] = {}
+        """ {dirpath: [(name, is dir), ...], ...}. """
+
+    def list(self, dirpath: str) -> typing.List[typing.Tuple[str, bool]]:
+        """ List a dir (an empty list for anything that is not a dir). """
+
+        listing = self._listings.get(dirpath, None)
+        if (listing is None):
+            try:
+                with os.scandir(dirpath) as entries:
+                    listing = [(entry.name, entry.is_dir()) for entry in entries]
+            except OSError:
+                listing = []
+
+            self._listings[dirpath] = listing
+
+        return listing
+
+    def invalidate(self, path: str) -> None:
+        """ Drop the listings that may have changed because of a change to the given path (its ancestors and anything inside it). """
+
+        path = os.path.normpath(path)
+
+        for dirpath in list(self._listings.keys()):
+            if ((dirpath == path) or edq.util.dirent.contains_path(dirpath, path) or edq.util.dirent.contains_path(path, dirpath)):
+                del self._listings[dirpath]
+
+@functools.lru_cache(maxsize = PLAN_CACHE_SIZE)
+def _compile_file_operations(key: typing.Tuple[typing.Union[None, typing.Tuple[str, ...]], ...]) -> FileOpPlan:
+    return FileOpPlan([(None if (operation is None) else list(operation)) for operation in key])
 
 def _resolve_path(path: str, base_dir: str) -> str:
     """ Resolve a path (which may be relative) in the given base directory. """
@@ -164,10 +298,16 @@ def _resolve_path(path: str, base_dir: str) -> str:
 
     return os.path.normpath(os.path.join(base_dir, path))
 
-def _handle_glob_file_operation(source_path_glob: str, dest_path: str, operation: typing.Callable, **kwargs: typing.Any) -> None:
+def _handle_glob_file_operation(
+        source_pattern: _PathPattern,
+        dest_path: str,
+        base_dir: str,
+        scan: _DirScan,
+        operation: typing.Callable,
+        **kwargs: typing.Any) -> None:
     """ Resolve a path that may contain globs, and perform the given file system operation. """
 
-    source_paths = _prep_for_globs(source_path_glob, dest_path)
+    source_paths = _prep_for_globs(source_pattern, dest_path, base_dir, scan)
 
     for source_path in source_paths:
         if (source_path == dest_path):
@@ -181,15 +321,19 @@ def _handle_glob_file_operation(source_path_glob: str, dest_path: str, operation
 
         operation(source_path, resolved_dest_path, **kwargs)
 
-def _handle_glob_remove(path_glob: str) -> None:
+        scan.invalidate(source_path)
+        scan.invalidate(resolved_dest_path)
+
+def _handle_glob_remove(path_pattern: _PathPattern, base_dir: str, scan: _DirScan) -> None:
     """ Resolve a path that may contain a glob and remove the resolved paths. """
 
-    paths = glob.glob(path_glob)
+    paths = path_pattern.match(base_dir, scan)
 
     for path in paths:
         edq.util.dirent.remove(path)
+        scan.invalidate(path)
 
-def _prep_for_globs(source_path_glob: str, dest_path: str) -> typing.List[str]:
+def _prep_for_globs(source_pattern: _PathPattern, dest_path: str, base_dir: str, scan: _DirScan) -> typing.List[str]:
     """
     Prepare for executing an operation in the presence of globs.
 
@@ -200,12 +344,13 @@ def _prep_for_globs(source_path_glob: str, dest_path: str) -> typing.List[str]:
     4) Return the resolved source paths.
     """
 
-    source_paths = glob.glob(source_path_glob)
+    source_paths = source_pattern.match(base_dir, scan)
 
     if (len(source_paths) == 0):
-        raise FileNotFoundError(f"No such file or directory: '{source_path_glob}'.")
+        raise FileNotFoundError(f"No such file or directory: '{source_pattern.resolve(base_dir)}'.")
 
     if (len(source_paths) > 1):
         edq.util.dirent.mkdir(dest_path)
+        scan.invalidate(dest_path)
 
     return source_paths
@@ -537,22 +537,61 @@ class TestFileOp(edq.testing.unittest.BaseTest):
 
                 self._run_fileop_exec_test(operation, error_substring, post_check)
 
-    def _run_fileop_exec_test(self,
-            operation: typing.List[str],
-            error_substring: typing.Union[str, None],
-            post_exec: typing.Callable,
-            ) -> None:
-        """ Run a single fileop test case. """
+    @unittest.skipIf(sys.platform.startswith("win"), "fileops require POSIX")
+    def test_fileop_plan(self) -> None:
+        """ Test compiling a list of fileops once and executing it in several dirs. """
+
+        operations: typing.List[typing.Union[None, typing.List[str]]] = [
+            ["mkdir", "out"],
+            ["cp", ALREADY_EXISTS_DIRNAME + "/*.txt", "out"],
+            ["mv", "out/*_alt.txt", STARTING_EMPTY_DIRNAME],
+            ["rm", "out/*"],
+            ["cp", STARTING_EMPTY_DIRNAME + "/*", "out"],
+            ["cp", "*/.hidden", "hidden.txt"],
+        ]
+
+        plan = autograder.fileop.compile_file_operations(operations)
+        self.assertIs(plan, autograder.fileop.compile_file_operations(operations))
+        self.assertEqual(["copy", ALREADY_EXISTS_DIRNAME + "/*.txt", "out"], plan.operations[1])
+        self.assertEqual(["cp", ALREADY_EXISTS_DIRNAME + "/*.txt", "out"], operations[1])
+
+        for i in range(2):
+            with self.subTest(msg = f"Run {i}"):
+                temp_dir = self._make_fileop_dir()
+                edq.util.dirent.write_file(os.path.join(temp_dir, ALREADY_EXISTS_DIRNAME, ".hidden"), "HHH")
+
+                autograder.fileop.exec_file_operations(plan, temp_dir)
+
+                self.assertEqual([ALREADY_EXISTS_FILENAME_ALT], os.listdir(os.path.join(temp_dir, "out")))
+                self.assertEqual([ALREADY_EXISTS_FILENAME_ALT], os.listdir(os.path.join(temp_dir, STARTING_EMPTY_DIRNAME)))
+                self.assertEqual("BBB", edq.util.dirent.read_file(os.path.join(temp_dir, "out", ALREADY_EXISTS_FILENAME_ALT)))
+                self.assertEqual("HHH", edq.util.dirent.read_file(os.path.join(temp_dir, "hidden.txt")))
+
+        with self.assertRaisesRegex(ValueError, "Unknown file operation"):
+            autograder.fileop.compile_file_operations([["mkdir", "a"], ["zzz", "a"]])
+
+    def _make_fileop_dir(self) -> str:
+        """ Make a temp dir with some existing entries. """
 
         temp_dir = edq.util.dirent.get_temp_dir(prefix = "ag-py-testing-fileop-execute-")
 
-        # Make some existing entries.
         edq.util.dirent.mkdir(os.path.join(temp_dir, ALREADY_EXISTS_DIRNAME))
         edq.util.dirent.write_file(os.path.join(temp_dir, ALREADY_EXISTS_FILE_RELPATH), "AAA")
         edq.util.dirent.write_file(os.path.join(temp_dir, ALREADY_EXISTS_FILE_ALT_RELPATH), "BBB")
         edq.util.dirent.write_file(os.path.join(temp_dir, ALREADY_EXISTS_FILENAME), "CCC")
         edq.util.dirent.mkdir(os.path.join(temp_dir, STARTING_EMPTY_DIRNAME))
 
+        return temp_dir
+
+    def _run_fileop_exec_test(self,
+            operation: typing.List[str],
+            error_substring: typing.Union[str, None],
+            post_exec: typing.Callable,
+            ) -> None:
+        """ Run a single fileop test case. """
+
+        temp_dir = self._make_fileop_dir()
+
         try:
             autograder.fileop.execute(operation, temp_dir)
         except Exception as ex:
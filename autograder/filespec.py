@@ -6,19 +6,29 @@ or git repos (git FileSpec).
 """
 
 import os
+import re
 import urllib.parse
 import typing
 
-import edq.net.request
-import edq.util.dirent
 import edq.util.git
 
+import autograder.util.fastcopy
+import autograder.util.filespeccache
+import autograder.util.net
+
 FILESPEC_TYPE_EMPTY: str = "empty"
 FILESPEC_TYPE_NIL: str = "nil"
 FILESPEC_TYPE_PATH: str = "path"
 FILESPEC_TYPE_GIT: str = "git"
 FILESPEC_TYPE_URL: str = "url"
 
+REMOTE_FILESPEC_TYPES: typing.Set[str] = {FILESPEC_TYPE_GIT, FILESPEC_TYPE_URL}
+
+_COMMIT_HASH: typing.Pattern = re.compile(r'^[0-9a-f]{40}$', flags = re.IGNORECASE)
+
+_default_cache: typing.Union[autograder.util.filespeccache.FileSpecCache, None] = None  # pylint: disable=invalid-name
+""" The cache to use for remote filespecs when one is not passed to copy() (see set_default_cache()). """
+
 class FileSpec(typing.Dict[str, str]):
     """ Alias file specs until they are formalized in a more robust class. """
 
@@ -74,7 +84,7 @@ def parse(data: typing.Union[None, str, typing.Dict[str, str], FileSpec]) -> Fil
         if (path == ''):
             raise FileSpecError(f"URL FileSpec must have a non-empty path: '{data}'.")
 
-        return get_url(path, dest = data.get('dest', ''))
+        return get_url(path, dest = data.get('dest', ''), checksum = data.get('checksum', ''))
     else:
         raise FileSpecError(f"FileSpec has unkown type ('{spec_type}'): '{data}'.")
 
@@ -123,66 +133,132 @@ def get_git(path: str, dest: str = '', reference: str = '', username: str = '',
         "token": token,
     })
 
-def get_url(path: str, dest: str = '') -> FileSpec:
-    """ Get a filespec that points to the given URL. """
+def get_url(path: str, dest: str = '', checksum: str = '') -> FileSpec:
+    """
+    Get a filespec that points to the given URL.
+    If a checksum is given (e.g., `sha256:<hex digest>`, see autograder.util.net.parse_checksum()),
+    then the downloaded file must match it.
+    """
 
     if (dest == ''):
         url = urllib.parse.urlparse(path)
         dest = os.path.basename(url.path)
 
-    return FileSpec({
+    checksum = checksum.strip()
+    if (checksum != ''):
+        try:
+            autograder.util.net.parse_checksum(checksum)
+        except ValueError as ex:
+            raise FileSpecError(f"URL FileSpec has an invalid checksum: {ex}") from ex
+
+    filespec = FileSpec({
         "type": FILESPEC_TYPE_URL,
         "path": path,
         "dest": dest,
     })
 
-def copy(filespec: FileSpec, base_dir: str, dest_dir: str, only_contents: bool) -> None:
-    """ Copy the filespec from the source to the given destination dir. """
+    if (checksum != ''):
+        filespec["checksum"] = checksum
+
+    return filespec
+
+def is_pinned(filespec: FileSpec) -> bool:
+    """
+    Check if a remote filespec always refers to the same content,
+    i.e., a git filespec whose reference is a full commit hash or a URL filespec with a checksum.
+    Non-remote filespecs are never pinned.
+    """
+
+    spec_type = filespec['type']
+
+    if (spec_type == FILESPEC_TYPE_GIT):
+        return (_COMMIT_HASH.match(filespec.get('reference', '')) is not None)
+
+    if (spec_type == FILESPEC_TYPE_URL):
+        return (filespec.get('checksum', '') != '')
+
+    return False
+
+def set_default_cache(cache: typing.Union[autograder.util.filespeccache.FileSpecCache, None]) -> None:
+    """
+    Set the cache that remote (git and URL) filespecs will be copied through when a cache is not passed to copy().
+    Pass None to stop caching.
+    """
+
+    global _default_cache  # pylint: disable=global-statement
+    _default_cache = cache
+
+def get_default_cache() -> typing.Union[autograder.util.filespeccache.FileSpecCache, None]:
+    """ Get the cache set with set_default_cache(). """
+
+    return _default_cache
+
+def copy(filespec: FileSpec, base_dir: str, dest_dir: str, only_contents: bool,
+        cache: typing.Union[autograder.util.filespeccache.FileSpecCache, None] = None,
+        link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE,
+        ) -> None:
+    """
+    Copy the filespec from the source to the given destination dir.
+    Path filespecs are copied according to the link mode (see autograder.util.fastcopy).
+    Remote (git and URL) filespecs are copied through the cache (or the default cache, see set_default_cache())
+    when there is one (see autograder.util.filespeccache).
+    """
+
+    if (cache is None):
+        cache = _default_cache
 
     spec_type = filespec['type']
     if (spec_type in [FILESPEC_TYPE_EMPTY, FILESPEC_TYPE_NIL]):
         # noop
         pass
     elif (spec_type == FILESPEC_TYPE_PATH):
-        _copy_path(filespec['path'], filespec['dest'], base_dir, dest_dir, only_contents)
+        _copy_path(filespec['path'], filespec['dest'], base_dir, dest_dir, only_contents, link_mode)
     elif (spec_type == FILESPEC_TYPE_GIT):
         _copy_git(filespec['path'], filespec['dest'], dest_dir,
                 reference = filespec['reference'],
                 username = filespec['username'],
-                token = filespec['token'])
+                token = filespec['token'],
+                cache = cache)
     elif (spec_type == FILESPEC_TYPE_URL):
-        _copy_url(filespec['path'], filespec['dest'], dest_dir)
+        _copy_url(filespec['path'], filespec['dest'], dest_dir, checksum = filespec.get('checksum', ''), cache = cache)
     else:
         raise FileSpecError(f"FileSpec has unkown type ('{spec_type}'): '{filespec}'.")
 
-def _copy_path(path: str, dest: str, base_dir: str, dest_dir: str, only_contents: bool) -> None:
+def get_dest_path(filespec: FileSpec, dest_dir: str, only_contents: bool) -> typing.Union[str, None]:
+    """
+    Get the path that copying the filespec (see copy()) will write to,
+    or None if the filespec does not write anything.
+    """
+
+    spec_type = filespec['type']
+    if (spec_type in [FILESPEC_TYPE_EMPTY, FILESPEC_TYPE_NIL]):
+        return None
+
+    if (spec_type == FILESPEC_TYPE_PATH):
+        return _get_path_dest_path(filespec['path'], filespec['dest'], dest_dir, only_contents)
+
+    return os.path.join(dest_dir, filespec['dest'])
+
+def _copy_path(path: str, dest: str, base_dir: str, dest_dir: str, only_contents: bool,
+        link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE) -> None:
     """ Copy a path filespec. """
 
     source_path = path
     if ((not os.path.isabs(source_path)) and (base_dir != '')):
         source_path = os.path.join(base_dir, path)
 
-    if (only_contents):
-        dest_path = dest_dir
-
-        if (dest != ''):
-            dest_path = os.path.join(dest_dir, dest)
-    else:
-        filename = dest
-        if (filename == ''):
-            filename = os.path.basename(path)
-
-        dest_path = os.path.join(dest_dir, filename)
+    dest_path = _get_path_dest_path(path, dest, dest_dir, only_contents)
 
     if (only_contents):
-        edq.util.dirent.copy_contents(source_path, dest_path)
+        autograder.util.fastcopy.copy_contents(source_path, dest_path, link_mode = link_mode)
     else:
-        edq.util.dirent.copy(source_path, dest_path)
+        autograder.util.fastcopy.copy(source_path, dest_path, link_mode = link_mode)
 
 def _copy_git(path: str, dest: str, dest_dir: str,
         reference: typing.Union[str, None] = None,
         username: typing.Union[str, None] = None,
         token: typing.Union[str, None] = None,
+        cache: typing.Union[autograder.util.filespeccache.FileSpecCache, None] = None,
         ) -> None:
     """ Copy a Git filespec. """
 
@@ -197,15 +273,49 @@ def _copy_git(path: str, dest: str, dest_dir: str,
 
     dest_path = os.path.join(dest_dir, dest)
 
+    # An existing repo is updated in place.
+    if ((cache is not None) and (not os.path.exists(dest_path))):
+        try:
+            cache.copy_git(path, dest_path, reference = reference, username = username, token = token)
+        except ValueError as ex:
+            raise FileSpecError(str(ex)) from ex
+
+        return
+
     edq.util.git.ensure_repo(path, dest_path, update = True,
         ref = reference, username = username, token = token)
 
-def _copy_url(path: str, dest: str, dest_dir: str) -> None:
-    """ Copy a URL filespec. """
+def _copy_url(path: str, dest: str, dest_dir: str,
+        checksum: typing.Union[str, None] = None,
+        cache: typing.Union[autograder.util.filespeccache.FileSpecCache, None] = None,
+        ) -> None:
+    """ Copy a URL filespec (streaming the body straight to disk). """
+
+    if (checksum == ''):
+        checksum = None
 
     dest_path = os.path.join(dest_dir, dest)
-    response, body = edq.net.request.make_get(path)
-    edq.util.dirent.write_file(dest_path, body, encoding = response.encoding, strip = False, newline = False)
+
+    try:
+        if (cache is not None):
+            cache.copy_url(path, dest_path, checksum = checksum)
+        else:
+            autograder.util.net.download(path, dest_path, checksum = checksum)
+    except ValueError as ex:
+        raise FileSpecError(str(ex)) from ex
+
+def _get_path_dest_path(path: str, dest: str, dest_dir: str, only_contents: bool) -> str:
+    if (only_contents):
+        if (dest == ''):
+            return dest_dir
+
+        return os.path.join(dest_dir, dest)
+
+    filename = dest
+    if (filename == ''):
+        filename = os.path.basename(path)
+
+    return os.path.join(dest_dir, filename)
 
 class FileSpecError(ValueError):
     """ Error for the validation and execution of filespecs. """
@@ -3,7 +3,10 @@ A single question (test case) for an assignment.
 """
 
 import abc
+import collections
+import contextlib
 import functools
+import io
 import numbers
 import traceback
 import typing
@@ -13,10 +16,35 @@ import edq.util.time
 
 import autograder.util.invoke
 import autograder.util.math
+import autograder.util.resources
 
 DEFAULT_TIMEOUT_SEC: float = 60
 """ Default timeout for grading a question. """
 
+SERIALIZATION_INCLUDE_RESOURCE_USAGE: str = 'include_resource_usage'
+"""
+When set (to true) in the extra options of a serialization context,
+graded questions will include their resource usage when serialized.
+"""
+
+DEFAULT_MAX_MESSAGE_BYTES: typing.Union[int, None] = None
+"""
+Default max size (in UTF-8 bytes) of a graded question's message (None for no limit).
+Questions may opt in to a limit (with the `max_message_bytes` argument of Question),
+and larger messages keep their beginning and end (see MESSAGE_OMITTED_MARKER).
+"""
+
+MESSAGE_OMITTED_MARKER: str = "\n... [{omitted_bytes} bytes omitted] ...\n"
+""" Replaces the middle of messages that are over their max size. """
+
+MESSAGE_ENCODING: str = 'utf-8'
+
+DEFAULT_MAX_OUTPUT_CHARS: int = 16 * 1024
+""" A reasonable size for capturing output while scoring a question (see Question.max_output_chars). """
+
+OUTPUT_OMITTED_MARKER: str = "... [{omitted_chars} characters omitted] ...\n"
+""" Starts captured output that has had its beginning dropped. """
+
 class AutograderFailError(RuntimeError):
     """
     This error indicates that fail() has been called on a question
@@ -34,6 +62,8 @@ class GradedQuestion(edq.util.serial.DictConverter):
     The result of a question being graded with a submission.
     """
 
+    serialization_skip_fields = {'_message'}
+
     def __init__(self,
             name: str,
             max_points: float,
@@ -43,6 +73,9 @@ class GradedQuestion(edq.util.serial.DictConverter):
             skipped: bool = False,
             grading_start_time: typing.Union[edq.util.time.Timestamp, int, None] = None,
             grading_end_time: typing.Union[edq.util.time.Timestamp, int, None] = None,
+            resource_usage: typing.Union[autograder.util.resources.ResourceUsage, None] = None,
+            max_message_bytes: typing.Union[int, None] = DEFAULT_MAX_MESSAGE_BYTES,
+            output: typing.Union[str, None] = None,
             **kwargs: typing.Any) -> None:
         self.name: str = name
         """ The name of the question. """
@@ -53,8 +86,10 @@ class GradedQuestion(edq.util.serial.DictConverter):
         self.score: float = score
         """ The score earned for this question. """
 
-        self.message: str = message
-        """ A message/feedback for the student. """
+        self._message: _MessageBuffer = _MessageBuffer(max_message_bytes)
+        """ The buffer behind `message`, which is only joined when it is read. """
+
+        self.message = message
 
         self.hard_fail = hard_fail
         """ Whether this question triggered a hard fail during grading. """
@@ -77,6 +112,57 @@ class GradedQuestion(edq.util.serial.DictConverter):
         self.grading_end_time: typing.Any = edq.util.time.Timestamp(grading_end_time)
         """ When grading ended. """
 
+        self.resource_usage: typing.Union[autograder.util.resources.ResourceUsage, None] = resource_usage
+        """
+        The resources used while scoring this question (in the process that scored it).
+        None if scoring did not complete (e.g., on timeout) or usage is not available on this platform.
+        Only serialized when requested (see SERIALIZATION_INCLUDE_RESOURCE_USAGE).
+        """
+
+        self.output: typing.Union[str, None] = output
+        """
+        The end of everything (stdout and stderr) printed while scoring this question,
+        when the question captures its output (see Question.max_output_chars).
+        None if output was not captured or nothing was printed.
+        """
+
+    @property
+    def message(self) -> str:
+        """
+        A message/feedback for the student.
+        Messages over the max size (if one was given, see DEFAULT_MAX_MESSAGE_BYTES) only keep their beginning and end.
+        """
+
+        return self._message.get()
+
+    @message.setter
+    def message(self, message: str) -> None:
+        self._message.set(message)
+
+    def append_message(self, message: str) -> None:
+        """
+        Add a line to the message.
+        Unlike `message += ...`, appending does not copy the existing message,
+        so building a message from many small lines stays linear.
+        """
+
+        if (not self._message.is_empty()):
+            self._message.append("\n")
+
+        self._message.append(message)
+
+    def to_pod(self, context: typing.Union[edq.util.serial.SerializationContext, None] = None) -> edq.util.serial.PODType:
+        data = typing.cast(typing.Dict[str, edq.util.serial.PODType], super().to_pod(context))
+        data['message'] = self.message
+
+        if ((context is None) or (not context.extra.get(SERIALIZATION_INCLUDE_RESOURCE_USAGE, False))):
+            data.pop('resource_usage', None)
+
+        if (self.output is None):
+            data.pop('output', None)
+
+        return data
+
     def scoring_report(self, prefix: str = '', precision: int = 2) -> str:
         """
         Get a string that represents the scoring for this question.
@@ -117,6 +203,185 @@ class GradedQuestion(edq.util.serial.DictConverter):
 
         return self.message == other.message
 
+class _MessageBuffer:
+    """
+    An append-only string that is only joined when it is read, and is bounded in size.
+    Once over the max size (in encoded bytes), only the first and last halves are kept,
+    and the middle is replaced with a marker (see MESSAGE_OMITTED_MARKER).
+    """
+
+    def __init__(self, max_bytes: typing.Union[int, None]) -> None:
+        if ((max_bytes is not None) and (max_bytes < 0)):
+            raise ValueError(f"Max message bytes must be non-negative (or None), got {max_bytes}.")
+
+        self._max_bytes: typing.Union[int, None] = max_bytes
+
+        self._head: typing.List[bytes] = []
+        self._head_bytes: int = 0
+
+        self._tail: typing.Deque[bytes] = collections.deque()
+        self._tail_bytes: int = 0
+        self._tail_offset: int = 0
+        """ How much of the first tail part has already been dropped. """
+
+        self._total_bytes: int = 0
+        self._text: typing.Union[str, None] = ''
+        """ The cached (joined) text, None if something was appended since it was joined. """
+
+    def is_empty(self) -> bool:
+        """ Check if nothing (non-empty) has been added. """
+
+        return (self._total_bytes == 0)
+
+    def set(self, text: str) -> None:
+        """ Replace the contents. """
+
+        self._head = []
+        self._head_bytes = 0
+        self._tail.clear()
+        self._tail_bytes = 0
+        self._tail_offset = 0
+        self._total_bytes = 0
+        self._text = ''
+
+        self.append(text)
+
+    def append(self, text: str) -> None:
+        """ Add to the end (in time proportional to the size of the text). """
+
+        if (text == ''):
+            return
+
+        data = text.encode(MESSAGE_ENCODING)
+        self._total_bytes += len(data)
+        self._text = None
+
+        if (self._max_bytes is None):
+            self._head.append(data)
+            self._head_bytes += len(data)
+            return
+
+        head_budget = self._max_bytes // 2
+        tail_budget = self._max_bytes - head_budget
+
+        if (self._head_bytes < head_budget):
+            head_data = data[:(head_budget - self._head_bytes)]
+            self._head.append(head_data)
+            self._head_bytes += len(head_data)
+
+            data = data[len(head_data):]
+            if (len(data) == 0):
+                return
+
+        self._tail.append(data)
+        self._tail_bytes += len(data)
+
+        # Drop the oldest tail bytes (without copying any parts that are kept).
+        while (self._tail_bytes > tail_budget):
+            extra_bytes = self._tail_bytes - tail_budget
+            first_bytes = len(self._tail[0]) - self._tail_offset
+
+            if (first_bytes <= extra_bytes):
+                self._tail.popleft()
+                self._tail_offset = 0
+                self._tail_bytes -= first_bytes
+            else:
+                self._tail_offset += extra_bytes
+                self._tail_bytes -= extra_bytes
+
+    def get(self) -> str:
+        """ Get the (joined) contents. """
+
+        if (self._text is not None):
+            return self._text
+
+        head = b''.join(self._head)
+        tail = b''.join(self._tail)[self._tail_offset:]
+
+        # Keep the joined parts, so later appends do not have to join them again.
+        self._head = [head]
+        self._tail = collections.deque([tail])
+        self._tail_offset = 0
+
+        omitted_bytes = self._total_bytes - self._head_bytes - self._tail_bytes
+        if (omitted_bytes == 0):
+            self._text = (head + tail).decode(MESSAGE_ENCODING)
+        else:
+            # The cuts may have split characters, which are dropped.
+            self._text = (head.decode(MESSAGE_ENCODING, errors = 'ignore')
+                    + MESSAGE_OMITTED_MARKER.format(omitted_bytes = omitted_bytes)
+                    + tail.decode(MESSAGE_ENCODING, errors = 'ignore'))
+
+        return self._text
+
+class _OutputCapture(io.TextIOBase):
+    """
+    A text stream that only keeps the last characters written to it (a ring buffer),
+    so memory use stays constant no matter how much is written.
+    """
+
+    def __init__(self, max_chars: int) -> None:
+        super().__init__()
+
+        if (max_chars < 0):
+            raise ValueError(f"Max output characters must be non-negative, got {max_chars}.")
+
+        self._max_chars: int = max_chars
+
+        self._chunks: typing.Deque[str] = collections.deque()
+        self._size: int = 0
+        self._offset: int = 0
+        """ How much of the first chunk has already been dropped. """
+
+        self._total_chars: int = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:  # type: ignore[override]
+        size = len(text)
+        self._total_chars += size
+
+        if (size >= self._max_chars):
+            # Only (the end of) this text will be kept.
+            self._chunks.clear()
+            self._offset = 0
+            self._size = 0
+            text = text[(size - self._max_chars):]
+
+        if (text != ''):
+            self._chunks.append(text)
+            self._size += len(text)
+
+        # Drop the oldest characters (without copying any chunks that are kept).
+        while (self._size > self._max_chars):
+            extra_chars = self._size - self._max_chars
+            first_chars = len(self._chunks[0]) - self._offset
+
+            if (first_chars <= extra_chars):
+                self._chunks.popleft()
+                self._offset = 0
+                self._size -= first_chars
+            else:
+                self._offset += extra_chars
+                self._size -= extra_chars
+
+        return size
+
+    def get(self) -> typing.Union[str, None]:
+        """ Get the kept output (noting how much was dropped), or None if nothing was written. """
+
+        if (self._total_chars == 0):
+            return None
+
+        text = ''.join(self._chunks)[self._offset:]
+
+        omitted_chars = self._total_chars - self._size
+        if (omitted_chars > 0):
+            text = OUTPUT_OMITTED_MARKER.format(omitted_chars = omitted_chars) + text
+
+        return text
+
 class Question:
     """
     Questions are grade-able portions of an assignment.
@@ -128,6 +393,13 @@ class Question:
             max_points: float = 0,
             name: typing.Union[str, None] = None,
             timeout: typing.Union[float, None] = DEFAULT_TIMEOUT_SEC,
+            allow_parallel: bool = True,
+            max_memory_mb: typing.Union[float, None] = None,
+            max_cpu_sec: typing.Union[float, None] = None,
+            max_open_files: typing.Union[int, None] = None,
+            cpu_timeout: typing.Union[float, None] = None,
+            max_message_bytes: typing.Union[int, None] = DEFAULT_MAX_MESSAGE_BYTES,
+            max_output_chars: typing.Union[int, None] = None,
             ) -> None:
         if (name is None):
             name = type(self).__name__
@@ -145,10 +417,59 @@ class Question:
         """ The maximum number of points possible for this question (does not include extra credit). """
 
         self._timeout: typing.Union[float, None] = timeout
-        """ The number of seconds allowed when grading this question. """
+        """
+        The number of seconds allowed when grading this question.
+        When a CPU timeout is set, this is only a (wall-clock) backstop.
+        """
+
+        self._cpu_timeout: typing.Union[float, None] = cpu_timeout
+        """
+        The number of seconds of CPU time allowed when grading this question (None to only use the wall-clock timeout).
+        Unlike the wall-clock timeout, CPU time is not affected by other processes competing for the CPU.
+        The wall-clock timeout should generally be set a good deal looser than the CPU timeout when a CPU timeout is used.
+        """
+
+        self.allow_parallel: bool = allow_parallel
+        """
+        Whether this question may be graded at the same time as other questions
+        (when the assignment grades questions in parallel).
+        Questions that touch shared state (like files in the work dir) should set this to false.
+        """
+
+        limits = autograder.util.resources.ResourceLimits(
+                max_memory_mb = max_memory_mb, max_cpu_sec = max_cpu_sec, max_open_files = max_open_files)
+
+        self._limits: typing.Union[autograder.util.resources.ResourceLimits, None] = None
+        """
+        The resources (memory, CPU time, open files) scoring this question may use (see autograder.util.resources.ResourceLimits).
+        Limits are only enforced when the question is scored in its own process (i.e., it has a timeout and is on Linux).
+        """
+
+        if (not limits.is_empty()):
+            self._limits = limits
+
+        self._complete: bool = False
+        """ Whether the last grading of this question ran to completion (see is_complete()). """
+
+        self._max_message_bytes: typing.Union[int, None] = max_message_bytes
+        """
+        The max size (in UTF-8 bytes) of this question's message (None for no limit).
+        Larger messages keep their beginning and end (see MESSAGE_OMITTED_MARKER).
+        """
+
+        self._max_output_chars: typing.Union[int, None] = max_output_chars
+        """
+        When set, everything printed (to stdout and stderr) while scoring this question is captured instead of being passed through,
+        and only the last this many characters are kept (in the result's output, see GradedQuestion.output).
+        When None (the default), output is not captured.
+        Note that only output written through Python's sys.stdout/sys.stderr can be captured
+        (e.g., not output written directly to file descriptors by subprocesses or extensions).
+        See DEFAULT_MAX_OUTPUT_CHARS for a reasonable size.
+        """
 
         # Create the base scoring artifact.
-        self.result: GradedQuestion = GradedQuestion(name = self.name, max_points = self.max_points)
+        self.result: GradedQuestion = GradedQuestion(name = self.name, max_points = self.max_points,
+                max_message_bytes = self._max_message_bytes)
         """
         The result of grading this question.
         A default/empty one is created on construction and is added to during the grading process.
@@ -164,29 +485,79 @@ class Question:
 
     def grade(self, submission: typing.Any,
             additional_data: typing.Union[typing.Dict[str, typing.Any], None] = None,
-            show_exceptions: bool = False) -> GradedQuestion:
+            show_exceptions: bool = False,
+            worker_pool: typing.Union[autograder.util.invoke.WorkerPool, None] = None,
+            ) -> GradedQuestion:
         """
         Invoke the scoring method using a timeout and cleanup.
+        If a worker pool is supplied, the question will be scored on one of its workers.
         Return the graded question.
         """
 
-        if (additional_data is None):
-            additional_data = {}
+        helper = self._get_score_helper(submission, additional_data)
+        self._internal_grade(helper, show_exceptions, worker_pool = worker_pool)
 
-        helper = functools.partial(self._score_helper, submission,
-                additional_data = additional_data)
+        return self.result
 
-        self._internal_grade(helper, show_exceptions)
+    def start_grade(self, submission: typing.Any,
+            worker_pool: autograder.util.invoke.WorkerPool,
+            additional_data: typing.Union[typing.Dict[str, typing.Any], None] = None,
+            show_exceptions: bool = False,
+            ) -> typing.Union[autograder.util.invoke.PoolTask, None]:
+        """
+        Start grading this question on a worker pool without waiting for the result.
+        Pass the returned task to finish_grade() once it is done (see WorkerPool.wait()).
+        If grading could not be started, None is returned and the result is already set.
+        """
+
+        helper = self._get_score_helper(submission, additional_data)
+
+        try:
+            return worker_pool.start(self._timeout, helper, limits = self._limits, cpu_timeout = self._cpu_timeout)
+        except Exception:
+            if (show_exceptions):
+                traceback.print_exc()
+
+            self.set_result(0, "Raised an exception: " + traceback.format_exc())
+            return None
+
+    def finish_grade(self, task: typing.Union[autograder.util.invoke.PoolTask, None]) -> GradedQuestion:
+        """
+        Finish grading a question started with start_grade().
+        Return the graded question.
+        """
+
+        if (task is not None):
+            success, value = task.get_result()
+            self._handle_grade_result(success, value)
 
         return self.result
 
-    def _internal_grade(self, helper: typing.Callable, show_exceptions: bool) -> None:
+    def _get_score_helper(self, submission: typing.Any,
+            additional_data: typing.Union[typing.Dict[str, typing.Any], None] = None,
+            ) -> typing.Callable:
+        """ Get the function that will be invoked to score this question. """
+
+        self._complete = False
+
+        if (additional_data is None):
+            additional_data = {}
+
+        return functools.partial(self._score_helper, submission,
+                additional_data = additional_data)
+
+    def _internal_grade(self,
+            helper: typing.Callable,
+            show_exceptions: bool,
+            worker_pool: typing.Union[autograder.util.invoke.WorkerPool, None] = None,
+            ) -> None:
         """
         Handle the internal process for grading a question.
         """
 
         try:
-            success, value = autograder.util.invoke.with_timeout(self._timeout, helper)
+            success, value = autograder.util.invoke.with_timeout(self._timeout, helper,
+                    pool = worker_pool, limits = self._limits, cpu_timeout = self._cpu_timeout)
         except Exception:
             if (show_exceptions):
                 traceback.print_exc()
@@ -194,9 +565,22 @@ class Question:
             self.set_result(0, "Raised an exception: " + traceback.format_exc())
             return
 
+        self._handle_grade_result(success, value)
+
+    def _handle_grade_result(self, success: bool, value: typing.Any) -> None:
+        """
+        Set the result of this question from the output of autograder.util.invoke.with_timeout().
+        """
+
         if (not success):
-            if (value is None):
+            if ((value is None) and (self._cpu_timeout is not None)):
+                self.set_result(0, f"Timeout ({self._timeout} seconds of wall-clock time).")
+            elif (value is None):
                 self.set_result(0, f"Timeout ({self._timeout} seconds).")
+            elif (isinstance(value, autograder.util.invoke.CPUTimeoutError)):
+                self.set_result(0, f"Timeout ({self._cpu_timeout} seconds of CPU time).")
+            elif (isinstance(value, autograder.util.resources.ResourceLimitError)):
+                self.set_result(0, str(value))
             else:
                 self.set_result(0, f"Error during execution: '{value}'.")
 
@@ -208,6 +592,7 @@ class Question:
             return
 
         self.result = value
+        self._complete = True
 
     def _score_helper(self, submission: typing.Any,
             additional_data: typing.Union[typing.Dict[str, typing.Any], None] = None,
@@ -220,12 +605,23 @@ class Question:
         if (additional_data is None):
             additional_data = {}
 
-        self.result = GradedQuestion(name = self.name, max_points = self.max_points)
+        self.result = GradedQuestion(name = self.name, max_points = self.max_points,
+                max_message_bytes = self._max_message_bytes)
 
         self.result.grading_start_time = edq.util.time.Timestamp.now()
+        usage_tracker = autograder.util.resources.UsageTracker()
+
+        output_capture = None
+        if (self._max_output_chars is not None):
+            output_capture = _OutputCapture(self._max_output_chars)
 
         try:
-            self.score_question(submission, **additional_data)
+            with contextlib.ExitStack() as stack:
+                if (output_capture is not None):
+                    stack.enter_context(contextlib.redirect_stdout(output_capture))
+                    stack.enter_context(contextlib.redirect_stderr(output_capture))
+
+                self.score_question(submission, **additional_data)
         except AutograderFailError:
             # The question has been failed, no additional output is required.
             pass
@@ -234,9 +630,22 @@ class Question:
             self.result.hard_fail = True
 
         self.result.grading_end_time = edq.util.time.Timestamp.now()
+        self.result.resource_usage = usage_tracker.get_usage()
+
+        if (output_capture is not None):
+            self.result.output = output_capture.get()
 
         return self.result
 
+    def is_complete(self) -> bool:
+        """
+        Check if the last grading of this question ran to completion,
+        i.e., it was not stopped by a timeout, resource limit, or unexpected error.
+        Failing a question (see fail() and hard_fail()) still counts as completing it.
+        """
+
+        return self._complete
+
     def get_last_result(self) -> GradedQuestion:
         """ Get the current grading result. """
 
@@ -313,10 +722,7 @@ class Question:
     def add_message(self, message: str, add_score: float = 0) -> None:
         """ Add the given message (and optional score) to the current grading for this question. """
 
-        if (self.result.message != ''):
-            self.result.message += "\n"
-
-        self.result.message += str(message)
+        self.result.append_message(str(message))
         self.result.score += add_score
 
     def cap_score(self) -> None:
@@ -1,4 +1,7 @@
+import sys
+import time
 import typing
+import unittest
 
 import edq.testing.unittest
 import edq.util.time
@@ -208,6 +211,155 @@ class TestQuestion(edq.testing.unittest.BaseTest):
                 if (message_substring is not None):
                     self.assertIn(message_substring, actual_message, 'Message is not as expected.')
 
+    @unittest.skipUnless(sys.platform.startswith("linux"), "resource limits require Linux")
+    def test_grade_limits(self) -> None:
+        """ Test that exceeding a resource limit gets its own message. """
+
+        class _TestQustion(autograder.question.Question):
+            def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+                data = bytearray(512 * 1024 * 1024)
+                self.full_credit(str(len(data)))
+
+        result = _TestQustion(10, max_memory_mb = 64).grade(None)
+
+        self.assertEqual(0, result.score)
+        self.assertEqual('Exceeded memory limit (64 MB).', result.message)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "timeouts require Linux")
+    def test_grade_cpu_timeout(self) -> None:
+        """ Test that timeouts say which limit (CPU or wall-clock) was hit. """
+
+        class _TestQustion(autograder.question.Question):
+            def __init__(self, action: typing.Callable) -> None:
+                super().__init__(10, timeout = 1, cpu_timeout = 0.3)
+
+                self.action = action
+
+            def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+                self.action()
+                self.full_credit()
+
+        def _spin() -> None:
+            while True:
+                pass
+
+        # [(action, expected message), ...]
+        test_cases: typing.List[typing.Tuple[typing.Callable, str]] = [
+            (lambda: time.sleep(0.5), ''),
+            (_spin, 'Timeout (0.3 seconds of CPU time).'),
+            (lambda: time.sleep(10), 'Timeout (1 seconds of wall-clock time).'),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (action, expected_message) = test_case
+
+            with self.subTest(msg = f"Case {i}"):
+                result = _TestQustion(action).grade(None)
+                self.assertEqual(expected_message, result.message)
+
+    def test_message_base(self) -> None:
+        """ Test building messages from many lines. """
+
+        class _TestQustion(autograder.question.Question):
+            def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+                self.add_message('')
+                for i in range(10000):
+                    self.add_message(f"Line {i}.", add_score = 0.001)
+
+                self.add_message('')
+
+        lines = [f"Line {i}." for i in range(10000)]
+
+        result = _TestQustion(10).grade(None)
+        self.assertEqual("\n".join(lines + ['']), result.message)
+        self.assertAlmostEqual(10, result.score)
+
+        loaded_result = autograder.question.GradedQuestion.from_dict(result.to_dict())
+        self.assertEqual(result.message, loaded_result.message)
+        self.assertEqual(result, loaded_result)
+
+    def test_message_max_bytes(self) -> None:
+        """ Test that large messages keep their beginning and end. """
+
+        marker = autograder.question.MESSAGE_OMITTED_MARKER
+
+        # [(max bytes, messages, expected), ...]
+        test_cases: typing.List[typing.Tuple[typing.Union[int, None], typing.List[str], str]] = [
+            (None, ['a' * 100], 'a' * 100),
+            (10, ['0123456789'], '0123456789'),
+            (10, ['0123456789A'], '01234' + marker.format(omitted_bytes = 1) + '6789A'),
+            (10, ['01', '23', '456789ABCDEF'], "01\n23" + marker.format(omitted_bytes = 8) + 'BCDEF'),
+            (10, ['0123456', '7', '8', '9', 'A', 'BCD', 'E', 'F'], '01234' + marker.format(omitted_bytes = 13) + "D\nE\nF"),
+            (0, ['abc'], marker.format(omitted_bytes = 3)),
+
+            # Characters split by a cut are dropped (but still counted as omitted).
+            (4, ['a\u00e9\u00e9b'], 'a' + marker.format(omitted_bytes = 2) + 'b'),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (max_bytes, messages, expected) = test_case
+
+            with self.subTest(msg = f"Case {i}"):
+                result = autograder.question.GradedQuestion(name = 'Test Question', max_points = 10, max_message_bytes = max_bytes)
+                result.message = messages[0]
+
+                for message in messages[1:]:
+                    # Reading (joining) the message between appends should not change the result.
+                    self.assertNotEqual('', result.message)
+                    result.append_message(message)
+
+                self.assertEqual(expected, result.message)
+
+        # Messages are not limited by default.
+        message = 'a' * (2 * 1024 * 1024)
+        result = autograder.question.GradedQuestion(name = 'Test Question', max_points = 10, message = message)
+        self.assertEqual(message, result.message)
+
+    def test_capture_output(self) -> None:
+        """ Test that output printed while scoring is captured (keeping the end) instead of passed through. """
+
+        class _TestQustion(autograder.question.Question):
+            def __init__(self, num_lines: int, **kwargs: typing.Any) -> None:
+                super().__init__(10, **kwargs)
+                self.num_lines = num_lines
+
+            def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+                for i in range(self.num_lines):
+                    print(f"Line {i}.")
+
+                print('Error!', file = sys.stderr)
+                self.full_credit()
+
+        marker = autograder.question.OUTPUT_OMITTED_MARKER
+
+        # [(num lines, max output chars, timeout, expected output), ...]
+        test_cases: typing.List[typing.Tuple[int, typing.Union[int, None], typing.Union[float, None], typing.Union[str, None]]] = [
+            (0, 100, None, "Error!\n"),
+            (2, 100, None, "Line 0.\nLine 1.\nError!\n"),
+            (2, 100, 10, "Line 0.\nLine 1.\nError!\n"),
+            (10000, 16, None, marker.format(omitted_chars = (108897 - 16)) + "ne 9999.\nError!\n"),
+            (10000, 16, 10, marker.format(omitted_chars = (108897 - 16)) + "ne 9999.\nError!\n"),
+            (1, 0, None, marker.format(omitted_chars = 15)),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (num_lines, max_output_chars, timeout, expected) = test_case
+
+            with self.subTest(msg = f"Case {i}"):
+                question = _TestQustion(num_lines, max_output_chars = max_output_chars, timeout = timeout)
+                result = question.grade(None)
+
+                self.assertEqual(10, result.score)
+                self.assertEqual(expected, result.output)
+
+                loaded_result = autograder.question.GradedQuestion.from_dict(result.to_dict())
+                self.assertEqual(expected, loaded_result.output)
+
+        # Without capturing, there is no output (and it is not serialized).
+        result = _TestQustion(0).grade(None)
+        self.assertIsNone(result.output)
+        self.assertNotIn('output', result.to_dict())
+
     def test_scoring_report_base(self) -> None:
         """ Test that output looks correct. """
 
@@ -0,0 +1,605 @@
+"""
+Serve grading requests for a single assignment from a long-running (warm) process.
+
+The server prepares the assignment's static files, loads its grader, and imports any preload modules once.
+Grading requests are then accepted over a local Unix socket,
+and each request is graded in a fresh process forked from the server
+(so requests skip all the startup work, but cannot affect the server or each other).
+
+The protocol is a single line of JSON (UTF-8) in each direction per connection:
+ - Request: `{"submission": <submission dir>, "output": <optional path to also write the result to>}`.
+   Output paths are only allowed when the server has an output root, and must be inside it.
+ - Response: `{"success": <bool>, "message": <why the request failed>, "result": <a GradedAssignment dict or null>}`.
+A request of `{"shutdown": true}` stops the server once any running requests are finished.
+All sockets are handled by a single non-blocking loop, so a client that is slow to send its request or read its response
+never holds up other clients (clients that do not read their response within RESPONSE_TIMEOUT_SEC are dropped).
+The socket is only accessible by the user running the server.
+
+Before each request is started, the assignment is checked for changes (see autograder.submission.get_static_snapshot_key()).
+If it changed (e.g., the grader was edited), the grader is reloaded for new requests,
+while running requests finish with the grader they started with.
+"""
+
+import collections
+import functools
+import json
+import logging
+import math
+import os
+import selectors
+import socket
+import stat
+import tempfile
+import time
+import typing
+
+import edq.util.dirent
+import edq.util.json
+
+import autograder.assignment
+import autograder.submission
+import autograder.util.fastcopy
+import autograder.util.invoke
+
+DEFAULT_SOCKET_PATH: str = os.path.join(tempfile.gettempdir(), 'autograder-py-serve.sock')
+DEFAULT_MAX_CONCURRENT: int = 1
+
+MAX_REQUEST_BYTES: int = 64 * 1024
+""" Requests larger than this are rejected (requests only hold paths). """
+
+RESPONSE_TIMEOUT_SEC: float = 10
+""" The longest a response will wait for its client to read it before the client is dropped. """
+
+RECV_SIZE: int = 4096
+LISTEN_BACKLOG: int = 64
+ENCODING: str = 'utf-8'
+
+SOCKET_UMASK: int = 0o177
+SOCKET_MODE: int = 0o600
+
+_logger = logging.getLogger(__name__)
+
+class GradingServer:
+    """
+    A server that grades submissions for a single assignment (see the module docs for the protocol).
+    At most `max_concurrent` requests are graded at a time, additional requests wait (in the order they arrived).
+    A timeout (in seconds) may be given for each request.
+    Requests may only ask for their result to be written (by the server's user) to paths inside `output_root`
+    (if no output root is given, then output paths are not allowed).
+    """
+
+    def __init__(self,
+            assignment_config_path: str,
+            socket_path: str = DEFAULT_SOCKET_PATH,
+            max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+            timeout: typing.Union[float, None] = None,
+            link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE,
+            preload_modules: typing.Union[typing.List[str], None] = None,
+            output_root: typing.Union[str, None] = None,
+            ) -> None:
+        if (max_concurrent < 1):
+            raise ValueError(f"Max concurrent requests must be positive, got {max_concurrent}.")
+
+        if (timeout is None):
+            timeout = math.inf
+
+        self.assignment_config_path: str = os.path.abspath(assignment_config_path)
+        self.socket_path: str = os.path.abspath(socket_path)
+        self.max_concurrent: int = max_concurrent
+        self.timeout: float = timeout
+        self.link_mode: str = link_mode
+        self.preload_modules: typing.Union[typing.List[str], None] = preload_modules
+
+        self.output_root: typing.Union[str, None] = None
+        if (output_root is not None):
+            self.output_root = os.path.realpath(output_root)
+
+        self.num_requests: int = 0
+        """ The number of grading requests that have been finished (successfully or not). """
+
+        self.num_reloads: int = 0
+        """ The number of times the grader has been reloaded because the assignment changed. """
+
+        self._stopping: bool = False
+        self._grader: typing.Union[_LoadedGrader, None] = None
+        self._old_graders: typing.List[_LoadedGrader] = []
+
+        # Responses that have not been fully written to their clients yet.
+        self._writing: typing.Dict[socket.socket, _PendingResponse] = {}
+
+    def stop(self) -> None:
+        """
+        Stop accepting requests, and return from serve_forever() once running requests are finished.
+        Safe to call from a signal handler.
+        """
+
+        self._stopping = True
+
+    def serve_forever(self) -> None:
+        """ Load the assignment and serve requests until stopped (see stop()). """
+
+        autograder.submission.preload_assignment_modules(self.assignment_config_path, self.preload_modules)
+        self._get_grader()
+
+        listener = self._listen()
+
+        # Connections that have not sent a full request yet.
+        reading: typing.Dict[socket.socket, bytearray] = {}
+
+        # Requests waiting for capacity: [(connection, submission dir, output path), ...].
+        waiting: typing.Deque[typing.Tuple[socket.socket, str, typing.Union[str, None]]] = collections.deque()
+
+        running: typing.Dict[autograder.util.invoke.PoolTask, typing.Tuple[socket.socket, _LoadedGrader]] = {}
+
+        try:
+            with autograder.util.invoke.WorkerPool(size = self.max_concurrent, max_tasks_per_worker = 1) as pool:
+                while ((not self._stopping) or (len(running) > 0) or (len(self._writing) > 0)):
+                    for task in pool.poll(list(running.keys())):
+                        connection, grader = running.pop(task)
+                        self._finish_request(task, connection, grader)
+
+                    while ((not self._stopping) and (len(waiting) > 0) and pool.has_capacity()):
+                        connection, submission_dir, output_path = waiting.popleft()
+                        task_info = self._start_request(pool, connection, submission_dir, output_path)
+                        if (task_info is not None):
+                            running[task_info[0]] = (connection, task_info[1])
+
+                    waitables, wait_time = pool.get_waitables(list(running.keys()))
+                    if (not self._stopping):
+                        waitables += [listener] + list(reading.keys())
+
+                    expire_time = self._expire_responses()
+                    if (expire_time is not None):
+                        wait_time = min(wait_time, expire_time)
+
+                    ready, writable = _wait(waitables, list(self._writing.keys()), wait_time)
+
+                    for connection in writable:
+                        self._write_response(connection)
+
+                    if (listener in ready):
+                        self._accept(listener, reading)
+
+                    for connection in list(reading.keys()):
+                        if (connection not in ready):
+                            continue
+
+                        request = self._read_request(connection, reading)
+                        if (request is not None):
+                            waiting.append((connection, request[0], request[1]))
+        finally:
+            listener.close()
+            if (os.path.lexists(self.socket_path)):
+                os.remove(self.socket_path)
+
+            for connection in list(reading.keys()):
+                connection.close()
+
+            for (connection, _, _) in waiting:
+                self._send_response(connection, False, "Server is shutting down.")
+
+            self._flush_responses()
+
+            for grader in self._old_graders + ([self._grader] if (self._grader is not None) else []):
+                edq.util.dirent.remove(grader.static_dir)
+
+            self._old_graders = []
+            self._grader = None
+
+    def _listen(self) -> socket.socket:
+        """ Bind the server's socket, replacing any stale socket (e.g., from a server that did not exit cleanly). """
+
+        if (os.path.lexists(self.socket_path)):
+            if (not stat.S_ISSOCK(os.lstat(self.socket_path).st_mode)):
+                raise ValueError(f"Socket path exists and is not a socket: '{self.socket_path}'.")
+
+            os.remove(self.socket_path)
+
+        edq.util.dirent.mkdir(os.path.dirname(self.socket_path))
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        # Create the socket with restricted permissions so no other users can connect (even briefly).
+        old_umask = os.umask(SOCKET_UMASK)
+        try:
+            listener.bind(self.socket_path)
+        except Exception:
+            listener.close()
+            raise
+        finally:
+            os.umask(old_umask)
+
+        os.chmod(self.socket_path, SOCKET_MODE)
+        listener.listen(LISTEN_BACKLOG)
+        listener.setblocking(False)
+
+        return listener
+
+    def _accept(self, listener: socket.socket, reading: typing.Dict[socket.socket, bytearray]) -> None:
+        while (True):
+            try:
+                connection, _ = listener.accept()
+            except BlockingIOError:
+                return
+
+            connection.setblocking(False)
+            reading[connection] = bytearray()
+
+    def _read_request(self,
+            connection: socket.socket,
+            reading: typing.Dict[socket.socket, bytearray],
+            ) -> typing.Union[typing.Tuple[str, typing.Union[str, None]], None]:
+        """
+        Read (part of) a request from a ready connection.
+        Returns (submission dir, output path) once a full grading request has been read.
+        Other requests (and bad requests) are handled (and the connection is closed) here.
+        """
+
+        buffer = reading[connection]
+
+        try:
+            data = connection.recv(RECV_SIZE)
+        except BlockingIOError:
+            return None
+        except OSError:
+            data = b''
+
+        if (data == b''):
+            # The client went away before sending a full request.
+            reading.pop(connection)
+            connection.close()
+            return None
+
+        buffer += data
+
+        if (b"\n" not in buffer):
+            if (len(buffer) > MAX_REQUEST_BYTES):
+                reading.pop(connection)
+                self._send_response(connection, False, f"Request is larger than the max size ({MAX_REQUEST_BYTES} bytes).")
+
+            return None
+
+        reading.pop(connection)
+
+        try:
+            request = json.loads(buffer[:buffer.index(b"\n")].decode(ENCODING))
+            if (not isinstance(request, dict)):
+                raise ValueError("Request is not a JSON object.")
+
+            if (request.get('shutdown', False)):
+                self.stop()
+                self._send_response(connection, True, "Shutting down.")
+                return None
+
+            submission_dir = request.get('submission', None)
+            if ((not isinstance(submission_dir, str)) or (not os.path.isdir(submission_dir))):
+                raise ValueError(f"Submission path does not exist or is not a dir: '{submission_dir}'.")
+
+            output_path = request.get('output', None)
+            if ((output_path is not None) and (not isinstance(output_path, str))):
+                raise ValueError(f"Output path is not a string: '{output_path}'.")
+
+            if (output_path is not None):
+                output_path = self._check_output_path(output_path)
+        except Exception as ex:
+            self._send_response(connection, False, f"Bad request: {ex}")
+            return None
+
+        return os.path.abspath(submission_dir), output_path
+
+    def _send_response(self,
+            connection: socket.socket,
+            success: bool,
+            message: str,
+            result: typing.Union[typing.Dict[str, typing.Any], None] = None,
+            ) -> None:
+        """
+        Queue a response for a connection.
+        The response is written as the client is ready for it (see _write_response()),
+        so a slow client never blocks the server.
+        """
+
+        response = {
+            'success': success,
+            'message': message,
+            'result': result,
+        }
+
+        data = (edq.util.json.dumps(response) + "\n").encode(ENCODING)
+
+        connection.setblocking(False)
+        self._writing[connection] = _PendingResponse(data, time.monotonic() + RESPONSE_TIMEOUT_SEC)
+
+        # Most responses fit in the socket's buffer, so try to finish right away.
+        self._write_response(connection)
+
+    def _write_response(self, connection: socket.socket) -> None:
+        """
+        Write as much of a queued response as the connection will take without blocking.
+        The connection is closed once the full response is written (a client that went away is ignored).
+        """
+
+        response = self._writing[connection]
+
+        try:
+            num_sent = connection.send(response.data)
+        except BlockingIOError:
+            return
+        except OSError as ex:
+            _logger.warning("Failed to send response to client: '%s'.", ex)
+            num_sent = len(response.data)
+
+        response.data = response.data[num_sent:]
+        if (len(response.data) > 0):
+            return
+
+        self._writing.pop(connection)
+        connection.close()
+
+    def _expire_responses(self) -> typing.Union[float, None]:
+        """
+        Drop responses whose clients have not read them in time (see RESPONSE_TIMEOUT_SEC).
+        Returns the number of seconds until the next response expires (or None if there are no queued responses).
+        """
+
+        now = time.monotonic()
+        next_deadline = None
+
+        for (connection, response) in list(self._writing.items()):
+            if (response.deadline <= now):
+                _logger.warning("Timed out sending response to client.")
+                self._writing.pop(connection)
+                connection.close()
+            elif ((next_deadline is None) or (response.deadline < next_deadline)):
+                next_deadline = response.deadline
+
+        if (next_deadline is None):
+            return None
+
+        return max(0.0, next_deadline - now)
+
+    def _flush_responses(self) -> None:
+        """ Write all queued responses (waiting at most RESPONSE_TIMEOUT_SEC for any client). """
+
+        while (len(self._writing) > 0):
+            wait_time = self._expire_responses()
+            _, writable = _wait([], list(self._writing.keys()), wait_time)
+
+            for connection in writable:
+                self._write_response(connection)
+
+    def _check_output_path(self, output_path: str) -> str:
+        """ Ensure that an output path is inside the output root, and return the resolved path. """
+
+        if (self.output_root is None):
+            raise ValueError("Server does not allow output paths (no output root was configured).")
+
+        output_path = os.path.realpath(output_path)
+        if ((output_path == self.output_root)
+                or (os.path.commonpath([self.output_root, output_path]) != self.output_root)):
+            raise ValueError(f"Output path is not inside the server's output root ('{self.output_root}'): '{output_path}'.")
+
+        return output_path
+
+    def _start_request(self,
+            pool: autograder.util.invoke.WorkerPool,
+            connection: socket.socket,
+            submission_dir: str,
+            output_path: typing.Union[str, None],
+            ) -> typing.Union[typing.Tuple[autograder.util.invoke.PoolTask, '_LoadedGrader'], None]:
+        """ Start grading a request, or respond with an error if it cannot be started. """
+
+        try:
+            grader = self._get_grader()
+        except Exception as ex:
+            _logger.exception("Failed to load assignment '%s'.", self.assignment_config_path)
+            self._send_response(connection, False, f"Failed to load assignment: '{ex}'.")
+            self.num_requests += 1
+            return None
+
+        grading_dir = edq.util.dirent.get_temp_path(prefix = 'ag-py-serve-')
+        function = functools.partial(_grade_request,
+                self.assignment_config_path, grader.static_dir, self.link_mode, grader.assignment_class,
+                submission_dir, grading_dir, output_path)
+
+        try:
+            task = pool.start(self.timeout, function)
+        except Exception as ex:
+            _logger.exception("Failed to start grading submission '%s'.", submission_dir)
+            edq.util.dirent.remove(grading_dir)
+            self._send_response(connection, False, f"Failed to start grading: '{ex}'.")
+            self.num_requests += 1
+            return None
+
+        grader.num_running += 1
+
+        return task, grader
+
+    def _finish_request(self,
+            task: autograder.util.invoke.PoolTask,
+            connection: socket.socket,
+            grader: '_LoadedGrader',
+            ) -> None:
+        success, value = task.get_result()
+        if (success):
+            self._send_response(connection, True, '', value)
+        elif (value is None):
+            self._send_response(connection, False, f"Timeout ({self.timeout} seconds).")
+        else:
+            self._send_response(connection, False, f"Error during grading: '{value}'.")
+
+        self.num_requests += 1
+
+        grader.num_running -= 1
+        self._remove_old_graders()
+
+    def _get_grader(self) -> '_LoadedGrader':
+        """ Get the current grader, (re)loading it if the assignment has changed. """
+
+        key = autograder.submission.get_static_snapshot_key(self.assignment_config_path)
+        if ((self._grader is not None) and (self._grader.key == key)):
+            return self._grader
+
+        start_time = time.monotonic()
+
+        static_dir = autograder.submission.prep_static_dir(self.assignment_config_path)
+        try:
+            assignment_class = autograder.submission.load_static_assignment_class(static_dir)
+        except Exception:
+            edq.util.dirent.remove(static_dir)
+            raise
+
+        if (self._grader is not None):
+            self._old_graders.append(self._grader)
+            self.num_reloads += 1
+
+        self._grader = _LoadedGrader(key, static_dir, assignment_class)
+        self._remove_old_graders()
+
+        _logger.info("Loaded assignment '%s' in %0.3fs.", self.assignment_config_path, time.monotonic() - start_time)
+
+        return self._grader
+
+    def _remove_old_graders(self) -> None:
+        """ Clean up replaced graders that are no longer being used by any running requests. """
+
+        for grader in list(self._old_graders):
+            if (grader.num_running == 0):
+                edq.util.dirent.remove(grader.static_dir)
+                self._old_graders.remove(grader)
+
+class _LoadedGrader:
+    """ A version of the assignment's grader that has been prepared in the server. """
+
+    def __init__(self,
+            key: str,
+            static_dir: str,
+            assignment_class: typing.Union[typing.Type[autograder.assignment.Assignment], None],
+            ) -> None:
+        self.key: str = key
+        self.static_dir: str = static_dir
+        self.assignment_class: typing.Union[typing.Type[autograder.assignment.Assignment], None] = assignment_class
+
+        self.num_running: int = 0
+        """ The number of running requests using this grader. """
+
+def _grade_request(
+        assignment_config_path: str,
+        static_dir: str,
+        link_mode: str,
+        assignment_class: typing.Union[typing.Type[autograder.assignment.Assignment], None],
+        submission_dir: str,
+        grading_dir: str,
+        output_path: typing.Union[str, None],
+        ) -> typing.Dict[str, typing.Any]:
+    """ Grade a single request (in a forked process) and return the result as a dict. """
+
+    try:
+        autograder.submission.prep_grading_dir(assignment_config_path, submission_dir, grading_dir = grading_dir,
+                static_dir = static_dir, link_mode = link_mode)
+
+        if (assignment_class is not None):
+            result = autograder.submission.run_python_grader(
+                    os.path.join(grading_dir, autograder.submission.WORK_DIRNAME, autograder.submission.GRADER_FILENAME),
+                    grading_dir, assignment_class = assignment_class)
+        else:
+            result = autograder.submission.run_external_grader(assignment_config_path, grading_dir)
+    finally:
+        edq.util.dirent.remove(grading_dir)
+
+    if (result is None):
+        raise ValueError("Failed to grade submission.")
+
+    data = result.to_dict()
+
+    if (output_path is not None):
+        edq.util.json.dump_path(data, output_path, indent = 4)
+
+    return data
+
+class _PendingResponse:
+    """ A response that has not been fully written to its client yet. """
+
+    def __init__(self, data: bytes, deadline: float) -> None:
+        self.data: memoryview = memoryview(data)
+        """ The part of the response that still needs to be written. """
+
+        self.deadline: float = deadline
+        """ When (see time.monotonic()) the client will be dropped if it has not read the response. """
+
+def _wait(
+        readables: typing.List[typing.Any],
+        writables: typing.List[socket.socket],
+        timeout: typing.Union[float, None],
+        ) -> typing.Tuple[typing.List[typing.Any], typing.List[socket.socket]]:
+    """
+    Wait until any of the readables (sockets, connections, or process sentinels) can be read
+    or any of the writables can be written to.
+    Returns the (readable, writable) objects that are ready.
+    """
+
+    with selectors.DefaultSelector() as selector:
+        for readable in readables:
+            selector.register(readable, selectors.EVENT_READ)
+
+        for writable in writables:
+            selector.register(writable, selectors.EVENT_WRITE)
+
+        ready = selector.select(timeout)
+
+    readable_ready = [key.fileobj for (key, events) in ready if (events & selectors.EVENT_READ)]
+    writable_ready = [typing.cast(socket.socket, key.fileobj) for (key, events) in ready if (events & selectors.EVENT_WRITE)]
+
+    return readable_ready, writable_ready
+
+def request_grade(
+        submission_dir: str,
+        socket_path: str = DEFAULT_SOCKET_PATH,
+        output_path: typing.Union[str, None] = None,
+        timeout: typing.Union[float, None] = None,
+        ) -> autograder.assignment.GradedAssignment:
+    """
+    Ask a running server (see GradingServer) to grade a submission, and return the result.
+    Relative paths are resolved from the current directory.
+    Raises a ValueError if the server could not grade the submission.
+    """
+
+    request = {
+        'submission': os.path.abspath(submission_dir),
+        'output': None if (output_path is None) else os.path.abspath(output_path),
+    }
+
+    response = _send_request(request, socket_path, timeout)
+    if (not response.get('success', False)):
+        raise ValueError(f"Server failed to grade submission '{submission_dir}': {response.get('message', '')}")
+
+    return autograder.assignment.GradedAssignment.from_dict(response['result'])
+
+def request_shutdown(socket_path: str = DEFAULT_SOCKET_PATH, timeout: typing.Union[float, None] = None) -> None:
+    """ Ask a running server to stop (once any running requests are finished). """
+
+    _send_request({'shutdown': True}, socket_path, timeout)
+
+def _send_request(
+        request: typing.Dict[str, typing.Any],
+        socket_path: str,
+        timeout: typing.Union[float, None],
+        ) -> typing.Dict[str, typing.Any]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+        connection.sendall((edq.util.json.dumps(request) + "\n").encode(ENCODING))
+
+        buffer = bytearray()
+        while (b"\n" not in buffer):
+            data = connection.recv(RECV_SIZE)
+            if (data == b''):
+                break
+
+            buffer += data
+
+    if (len(buffer) == 0):
+        raise ValueError(f"Server at '{socket_path}' closed the connection without responding.")
+
+    response: typing.Dict[str, typing.Any] = json.loads(buffer.decode(ENCODING))
+    return response
@@ -0,0 +1,172 @@
+import json
+import multiprocessing
+import os
+import socket
+import stat
+import sys
+import time
+import typing
+import unittest
+
+import edq.testing.unittest
+import edq.util.dirent
+import edq.util.json
+
+import autograder.serve
+import autograder.util.invoke
+
+THIS_DIR: str = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+DATA_DIR: str = os.path.join(THIS_DIR, 'testdata')
+
+SERVER_START_TIMEOUT_SEC: float = 10
+
+@unittest.skipUnless(sys.platform.startswith("linux") and hasattr(socket, 'AF_UNIX'), "serving requires Linux")
+class TestServe(edq.testing.unittest.BaseTest):
+    """ Test serving grading requests. """
+
+    def test_serve_base(self) -> None:
+        """ Test grading, bad requests, reloading, and shutting down. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-serve-')
+        assignment_dir = os.path.join(temp_dir, 'assignment')
+        socket_path = os.path.join(temp_dir, 'serve.sock')
+        out_path = os.path.join(temp_dir, 'out', 'result.json')
+
+        edq.util.dirent.copy(os.path.join(DATA_DIR, 'assignment'), assignment_dir)
+        grader_path = os.path.join(assignment_dir, 'grader.py')
+
+        server = autograder.serve.GradingServer(os.path.join(assignment_dir, 'assignment.json'),
+                socket_path = socket_path, max_concurrent = 2, timeout = 30,
+                output_root = os.path.dirname(out_path))
+
+        process = multiprocessing.get_context('fork').Process(target = server.serve_forever)
+        process.start()
+
+        try:
+            start_time = time.monotonic()
+            while (not os.path.exists(socket_path)):
+                self.assertLess(time.monotonic() - start_time, SERVER_START_TIMEOUT_SEC)
+                time.sleep(0.05)
+
+            self.assertEqual(autograder.serve.SOCKET_MODE, stat.S_IMODE(os.stat(socket_path).st_mode))
+
+            correct_dir = os.path.join(assignment_dir, 'submissions', 'correct')
+            incorrect_dir = os.path.join(assignment_dir, 'submissions', 'incorrect')
+
+            result = autograder.serve.request_grade(correct_dir, socket_path = socket_path)
+            self.assertEqual('Test Assignment', result.name)
+            self.assertEqual((2, 2), result.get_score())
+
+            edq.util.dirent.mkdir(os.path.dirname(out_path))
+            result = autograder.serve.request_grade(incorrect_dir, socket_path = socket_path, output_path = out_path)
+            self.assertEqual((1, 2), result.get_score())
+            self.assertEqual([0, 1], [question['score'] for question in edq.util.json.load_path(out_path)['questions']])
+
+            with self.assertRaisesRegex(ValueError, 'not inside the server\'s output root'):
+                autograder.serve.request_grade(correct_dir, socket_path = socket_path,
+                        output_path = os.path.join(temp_dir, 'result.json'))
+
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, 'result.json')))
+
+            with self.assertRaisesRegex(ValueError, 'Submission path does not exist'):
+                autograder.serve.request_grade(os.path.join(temp_dir, 'missing'), socket_path = socket_path)
+
+            # Changing the grader should reload it for new requests.
+            contents = edq.util.dirent.read_file(grader_path, strip = False)
+            edq.util.dirent.write_file(grader_path, contents.replace('self.fail("Wrong sum.")', 'self.full_credit()'))
+
+            result = autograder.serve.request_grade(incorrect_dir, socket_path = socket_path)
+            self.assertEqual((2, 2), result.get_score())
+
+            autograder.serve.request_shutdown(socket_path = socket_path)
+            process.join(SERVER_START_TIMEOUT_SEC)
+
+            self.assertEqual(0, process.exitcode)
+            self.assertFalse(os.path.exists(socket_path))
+        finally:
+            if (process.is_alive()):
+                process.kill()
+                process.join()
+
+    def test_serve_start_failure(self) -> None:
+        """ Test that a request that fails to start gets a failure response (instead of stopping the server). """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-serve-')
+        assignment_dir = os.path.join(temp_dir, 'assignment')
+        edq.util.dirent.copy(os.path.join(DATA_DIR, 'assignment'), assignment_dir)
+
+        server = autograder.serve.GradingServer(os.path.join(assignment_dir, 'assignment.json'),
+                socket_path = os.path.join(temp_dir, 'serve.sock'))
+
+        class BrokenPool:
+            """ A pool that always fails to start tasks. """
+
+            def start(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+                """ Fail to start. """
+
+                raise BrokenPipeError("Broken worker.")
+
+        server_connection, client_connection = socket.socketpair()
+
+        try:
+            task_info = server._start_request(typing.cast(autograder.util.invoke.WorkerPool, BrokenPool()),  # pylint: disable=protected-access
+                    server_connection, os.path.join(assignment_dir, 'submissions', 'correct'), None)
+            self.assertIsNone(task_info)
+            self.assertEqual(1, server.num_requests)
+
+            response = edq.util.json.loads(client_connection.recv(autograder.serve.MAX_REQUEST_BYTES).decode())
+            self.assertFalse(response['success'])
+            self.assertIn('Broken worker.', response['message'])
+        finally:
+            client_connection.close()
+            if (server._grader is not None):  # pylint: disable=protected-access
+                edq.util.dirent.remove(server._grader.static_dir)  # pylint: disable=protected-access
+
+    def test_serve_slow_client(self) -> None:
+        """ Test that responses are queued (instead of blocking the server) when a client is slow to read them. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-serve-')
+        server = autograder.serve.GradingServer(os.path.join(temp_dir, 'assignment.json'),
+                socket_path = os.path.join(temp_dir, 'serve.sock'))
+
+        # Large enough to never fit in the socket's buffer.
+        result = {'data': 'a' * (1024 * 1024)}
+
+        server_connection, client_connection = socket.socketpair()
+
+        try:
+            server._send_response(server_connection, True, '', result)  # pylint: disable=protected-access
+            self.assertIn(server_connection, server._writing)  # pylint: disable=protected-access
+
+            buffer = bytearray()
+            while (server_connection in server._writing):  # pylint: disable=protected-access
+                buffer += client_connection.recv(autograder.serve.MAX_REQUEST_BYTES)
+                server._write_response(server_connection)  # pylint: disable=protected-access
+
+            while (True):
+                data = client_connection.recv(autograder.serve.MAX_REQUEST_BYTES)
+                if (data == b''):
+                    break
+
+                buffer += data
+
+            response = json.loads(buffer.decode())
+            self.assertTrue(response['success'])
+            self.assertEqual(result, response['result'])
+        finally:
+            server_connection.close()
+            client_connection.close()
+
+        # A client that never reads its response is eventually dropped.
+        server_connection, client_connection = socket.socketpair()
+
+        try:
+            server._send_response(server_connection, True, '', result)  # pylint: disable=protected-access
+            self.assertIsNotNone(server._expire_responses())  # pylint: disable=protected-access
+
+            server._writing[server_connection].deadline = time.monotonic()  # pylint: disable=protected-access
+            self.assertIsNone(server._expire_responses())  # pylint: disable=protected-access
+            self.assertEqual(-1, server_connection.fileno())
+        finally:
+            server_connection.close()
+            client_connection.close()
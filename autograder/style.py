@@ -1,19 +1,53 @@
-import contextlib
+import functools
+import importlib.metadata
+import io
 import logging
 import os
 import re
 import sys
 import typing
+import uuid
 
-import edq.util.code
 import edq.util.dirent
+import edq.util.hash
+import edq.util.json
 import flake8.api.legacy
+import flake8.formatting.default
+import flake8.main.options
+import flake8.violation
 
 import autograder.question
+import autograder.util.notebook
+import autograder.util.path
 import autograder.util.prepare_submission
 
 DEFAULT_MAX_LINE_LENGTH: int = 150
 
+DEFAULT_JOBS: int = 1
+""" The default number of processes flake8 will use to check files. """
+
+CACHE_VERSION: int = 1
+""" Bump this to invalidate all existing cached style results (e.g., when the output format changes). """
+
+CACHE_STAT_HITS: str = 'hits'
+CACHE_STAT_MISSES: str = 'misses'
+
+CACHE_PATH_PLACEHOLDER: str = '\0PATH\0'
+""" Stands in for the checked path in cached output (the same code may be checked from many paths). """
+
+CHECKER_PACKAGES: typing.List[str] = ['flake8', 'pycodestyle', 'pyflakes']
+""" The packages whose versions determine style results. """
+
+PATH_DEPENDENT_OPTIONS: typing.List[str] = ['exclude', 'extend_exclude', 'filename', 'per_file_ignores']
+""" flake8 options that match against file names (so results with these options are also keyed by path). """
+
+_cache_stats: typing.Dict[str, int] = {
+    CACHE_STAT_HITS: 0,
+    CACHE_STAT_MISSES: 0,
+}
+
+_logger = logging.getLogger(__name__)
+
 # For codes, see:
 # flake8: https://flake8.pycqa.org/en/latest/user/error-codes.html
 # pycodestyle: https://pycodestyle.pycqa.org/en/latest/intro.html#error-codes
@@ -60,6 +94,17 @@ BASE_STYLE_OPTIONS: typing.Dict[str, typing.Any] = {
     ]
 }
 
+def get_cache_stats() -> typing.Dict[str, int]:
+    """ Get the number of style cache hits and misses (in this process) since the last reset. """
+
+    return dict(_cache_stats)
+
+def reset_cache_stats() -> None:
+    """ Reset the style cache hit/miss counters. """
+
+    for key in _cache_stats:
+        _cache_stats[key] = 0
+
 class Style(autograder.question.Question):
     """
     A question that can be added to assignments that checks style.
@@ -73,6 +118,8 @@ class Style(autograder.question.Question):
             fake_path: typing.Union[str, None] = None,
             shorten_path: bool = True,
             style_overrides: typing.Union[typing.Dict[str, typing.Any], None] = None,
+            jobs: int = DEFAULT_JOBS,
+            cache_dir: typing.Union[str, None] = None,
             **kwargs: typing.Any) -> None:
         super().__init__(max_points)
 
@@ -126,6 +173,15 @@ class Style(autograder.question.Question):
         self._style_overrides = style_overrides
         """ Overrides for options passed directly to flake8. """
 
+        self._jobs: int = jobs
+        """ The number of processes flake8 will use to check files. """
+
+        self._cache_dir: typing.Union[str, None] = cache_dir
+        """
+        If set, style results for each file are cached in this (private) dir (see check_files()),
+        so files that have not changed since they were last graded are not checked again.
+        """
+
     def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
         error_count, style_output = check_paths(
                 self._paths,
@@ -135,6 +191,9 @@ class Style(autograder.question.Question):
                 shorten_path = self._shorten_paths,
                 style_overrides = self._style_overrides,
                 include_clean_paths = False,
+                jobs = self._jobs,
+                use_cache = (self._cache_dir is not None),
+                cache_dir = self._cache_dir,
         )
 
         if (error_count == 0):
@@ -171,6 +230,7 @@ def check_paths(
         **kwargs: typing.Any) -> typing.Tuple[int, typing.List[typing.Tuple[str, typing.List[str]]]]:
     """
     Check the style of all the listed paths (recursively).
+    All the files are checked in a single flake8 run (see check_files() for kwargs).
 
     If `include_clean_paths` is false, then no information is returned on empty files,
     otherwise, these files will be included in the results (with empty description lines).
@@ -198,92 +258,278 @@ def check_paths(
         else:
             clean_ignore_patterns.append(re.compile(pattern))
 
+    file_paths = _collect_paths(paths, ignore_paths, clean_ignore_patterns)
+    results = check_files(file_paths, **kwargs)
+
     total_count = 0
 
     # [(path, lines), ...]
     total_lines = []
 
-    for path in sorted(paths):
-        path = os.path.abspath(path)
+    for (path, (count, lines)) in zip(file_paths, results):
+        if (include_clean_paths or (count > 0)):
+            total_count += count
+            total_lines.append((path, lines))
+
+    return total_count, total_lines
 
-        skip = False
+def _collect_paths(
+        paths: typing.List[str],
+        ignore_paths: typing.List[str],
+        ignore_patterns: typing.List[re.Pattern],
+        ) -> typing.List[str]:
+    """ Recursively collect the (absolute) paths to all the files that should be checked, in the order they should be reported. """
 
-        for ignore_path in ignore_paths:
-            if (path == ignore_path):
-                skip = True
-                break
+    file_paths = []
 
-        for ignore_pattern in clean_ignore_patterns:
-            if (re.search(ignore_pattern, path) is not None):
-                skip = True
-                break
+    for path in sorted(paths):
+        path = os.path.abspath(path)
 
-        if (skip):
+        if (path in ignore_paths):
             continue
 
-        if (os.path.isfile(path)):
-            if (os.path.splitext(path)[1] not in autograder.util.prepare_submission.ALLOWED_EXTENSIONS):
-                continue
+        if (any((re.search(ignore_pattern, path) is not None) for ignore_pattern in ignore_patterns)):
+            continue
 
-            count, raw_lines = check_file(path, **kwargs)
-            lines = [(path, raw_lines)]
+        if (os.path.isfile(path)):
+            if (os.path.splitext(path)[1] in autograder.util.prepare_submission.ALLOWED_EXTENSIONS):
+                file_paths.append(path)
         else:
             dirents = [os.path.join(path, dirent) for dirent in os.listdir(path)]
-            count, lines = check_paths(dirents,
-                    ignore_paths = ignore_paths, ignore_patterns = ignore_patterns, include_clean_paths = include_clean_paths, **kwargs)
-
-        if (include_clean_paths or (count > 0)):
-            total_count += count
-            total_lines += lines
+            file_paths += _collect_paths(dirents, ignore_paths, ignore_patterns)
 
-    return total_count, total_lines
+    return file_paths
 
 def check_file(
         path: str,
         fake_path: typing.Union[str, None] = None,
         shorten_path: bool = False,
         style_overrides: typing.Union[typing.Dict[str, typing.Any], None] = None,
+        use_cache: bool = False,
+        cache_dir: typing.Union[str, None] = None,
         **kwargs: typing.Any) -> typing.Tuple[int, typing.List[str]]:
     """
     Check the style of a file.
+    See check_files() for the arguments.
     Return a two-item tuple of:
         - The number of style violations.
         - A list of strings that describe the style issues.
     """
 
+    return check_files([path],
+            fake_path = fake_path,
+            shorten_path = shorten_path,
+            style_overrides = style_overrides,
+            use_cache = use_cache,
+            cache_dir = cache_dir,
+            **kwargs)[0]
+
+def check_files(
+        paths: typing.List[str],
+        fake_path: typing.Union[str, None] = None,
+        shorten_path: bool = False,
+        style_overrides: typing.Union[typing.Dict[str, typing.Any], None] = None,
+        jobs: int = DEFAULT_JOBS,
+        use_cache: bool = False,
+        cache_dir: typing.Union[str, None] = None,
+        **kwargs: typing.Any) -> typing.List[typing.Tuple[int, typing.List[str]]]:
+    """
+    Check the style of several files in a single flake8 run (using `jobs` processes).
+    Return a two-item tuple for each path (in the same order) of:
+        - The number of style violations.
+        - A list of strings that describe the style issues.
+
+    If use_cache is True, the results for each file will be cached on disk
+    (in cache_dir, which is required) and keyed by the file's (extracted) code,
+    the style options, and the version of flake8 (and its checkers),
+    so unchanged files do not need to be checked again (see get_cache_stats()).
+    Cached results are trusted, so the cache dir must be private to the grading user
+    (see autograder.util.path.ensure_private_dir()).
+    If the cache dir cannot be created, is not private, or cannot be written to, files are checked without the cache.
+    """
+
     if (style_overrides is None):
         style_overrides = {}
 
-    if (not os.path.isfile(path)):
-        raise ValueError(f"Can only check style on a file, got a directory: '{path}'.")
+    if (jobs < 1):
+        raise ValueError(f"The number of style jobs must be positive, got {jobs}.")
+
+    if (not use_cache):
+        cache_dir = None
+    elif (cache_dir is None):
+        raise ValueError("A cache dir must be given to use the style cache.")
+    else:
+        try:
+            cache_dir = autograder.util.path.ensure_private_dir(cache_dir)
+        except (OSError, ValueError) as ex:
+            _logger.warning("Could not use the style cache dir '%s', not using the cache: '%s'.", cache_dir, ex)
+            cache_dir = None
+
+    style_options = BASE_STYLE_OPTIONS.copy()
+    style_options.update(style_overrides)
+
+    # [(checked path, replacement path, cache key), ...]
+    check_paths_info = []
+
+    # {checked path: (count, lines), ...}
+    results: typing.Dict[str, typing.Tuple[int, typing.List[str]]] = {}
 
+    # [checked path, ...]
+    miss_paths = []
     cleanup_paths = []
 
-    if (path.endswith('.py')):
-        pass
-    elif (path.endswith('.ipynb')):
-        contents = edq.util.code.extract_notebook_code(path)
+    try:
+        for path in paths:
+            if (not os.path.isfile(path)):
+                raise ValueError(f"Can only check style on a file, got a directory: '{path}'.")
+
+            if (path.endswith('.py')):
+                contents = None
+                checked_path = path
+            elif (path.endswith('.ipynb')):
+                # flake8 only reads code from disk, so the notebook's code needs its own file (only written when checked).
+                contents = autograder.util.notebook.extract_notebook_code(path)
+                checked_path = edq.util.dirent.get_temp_path(prefix = 'style_', suffix = '_notebook')
+            else:
+                raise ValueError(f"Can only check style on .py or .ipynb files, got '{path}'.")
+
+            key = None
+            if (cache_dir is not None):
+                key = _get_cache_key(path, contents, style_options)
+
+            checked_path = os.path.realpath(checked_path)
+
+            replacement_path = checked_path
+
+            if (fake_path is not None):
+                replacement_path = fake_path
+
+            if (shorten_path):
+                replacement_path = os.path.basename(replacement_path)
+
+            check_paths_info.append((checked_path, replacement_path, key))
+
+            if ((checked_path in results) or (checked_path in miss_paths)):
+                # The same file was listed more than once.
+                continue
+
+            result = None
+            if ((cache_dir is not None) and (key is not None)):
+                result = _read_cache(cache_dir, key, checked_path)
+
+            if (result is not None):
+                results[checked_path] = result
+                continue
+
+            if (contents is not None):
+                cleanup_paths.append(checked_path)
+                edq.util.dirent.write_file(checked_path, contents, strip = False, newline = False)
+
+            miss_paths.append(checked_path)
+
+        if (len(miss_paths) > 0):
+            formatter = _run_flake8(miss_paths, style_options, jobs)
+            for checked_path in miss_paths:
+                results[checked_path] = (formatter.counts.get(checked_path, 0), formatter.get_lines(checked_path))
+    finally:
+        for cleanup_path in cleanup_paths:
+            edq.util.dirent.remove(cleanup_path)
+
+    output = []
+    for (checked_path, replacement_path, key) in check_paths_info:
+        count, lines = results[checked_path]
+
+        if ((cache_dir is not None) and (key is not None) and (checked_path in miss_paths)):
+            _write_cache(cache_dir, key, checked_path, count, lines)
+            miss_paths.remove(checked_path)
+
+        if (checked_path != replacement_path):
+            lines = [line.replace(checked_path, replacement_path) for line in lines]
+
+        output.append((count, lines))
 
-        temp_path = edq.util.dirent.get_temp_path(prefix = 'style_', suffix = '_notebook')
-        cleanup_paths.append(temp_path)
-        edq.util.dirent.write_file(temp_path, contents, strip = False, newline = False)
+    return output
 
-        path = temp_path
+def _get_cache_key(path: str, contents: typing.Union[str, None], style_options: typing.Dict[str, typing.Any]) -> str:
+    """ Get the style cache key for a file (and its extracted code, if it is a notebook). """
+
+    if (contents is None):
+        with open(path, 'rb') as file:
+            content_hash = edq.util.hash.sha256_hex(file.read())
     else:
-        raise ValueError(f"Can only check style on .py or .ipynb files, got '{path}'.")
+        content_hash = edq.util.hash.sha256_hex(contents.encode(edq.util.dirent.DEFAULT_ENCODING))
+
+    parts = [
+        str(CACHE_VERSION),
+        _get_checker_versions(),
+        edq.util.json.dumps(style_options),
+        content_hash,
+    ]
+
+    # Some options match against file names, so the results may depend on the path.
+    if (any((option in style_options) for option in PATH_DEPENDENT_OPTIONS)):
+        parts.append(os.path.abspath(path))
+
+    return edq.util.hash.sha256_hex("\n".join(parts))
+
+@functools.lru_cache(maxsize = None)
+def _get_checker_versions() -> str:
+    """ Get the versions of flake8 and the checkers it runs (which determine the results). """
+
+    versions = []
+    for package in CHECKER_PACKAGES:
+        try:
+            versions.append(f"{package}=={importlib.metadata.version(package)}")
+        except importlib.metadata.PackageNotFoundError:
+            versions.append(f"{package}==unknown")
+
+    return ';'.join(versions)
+
+def _read_cache(cache_dir: str, key: str, checked_path: str) -> typing.Union[typing.Tuple[int, typing.List[str]], None]:
+    """ Read a cached result (or None) and point it at the path being checked. """
+
+    cache_path = os.path.join(cache_dir, key + '.json')
+    if (not os.path.isfile(cache_path)):
+        _cache_stats[CACHE_STAT_MISSES] += 1
+        return None
+
+    try:
+        data = edq.util.json.load_path(cache_path)
+        count = int(data['count'])
+        lines = [str(line).replace(CACHE_PATH_PLACEHOLDER, checked_path) for line in data['lines']]
+    except (ValueError, TypeError, KeyError, OSError):
+        # A bad cache entry is just a miss.
+        _cache_stats[CACHE_STAT_MISSES] += 1
+        return None
+
+    _cache_stats[CACHE_STAT_HITS] += 1
+    return (count, lines)
 
-    path = os.path.realpath(path)
+def _write_cache(cache_dir: str, key: str, checked_path: str, count: int, lines: typing.List[str]) -> None:
+    """
+    Atomically write a result to the cache, so concurrent graders never see partial files.
+    Caching is best-effort, a failed write (e.g., a full disk) just means a miss next time.
+    """
 
-    replacement_path = path
+    data = {
+        'count': count,
+        'lines': [line.replace(checked_path, CACHE_PATH_PLACEHOLDER) for line in lines],
+    }
 
-    if (fake_path is not None):
-        replacement_path = fake_path
+    cache_path = os.path.join(cache_dir, key + '.json')
+    temp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
 
-    if (shorten_path):
-        replacement_path = os.path.basename(replacement_path)
+    try:
+        edq.util.json.dump_path(data, temp_path)
+        os.replace(temp_path, cache_path)
+    except OSError as ex:
+        _logger.warning("Failed to write to the style cache '%s': '%s'.", cache_dir, ex)
+    finally:
+        if (os.path.exists(temp_path)):
+            os.remove(temp_path)
 
-    output_path = edq.util.dirent.get_temp_path(prefix = 'style_', suffix = '_output')
-    cleanup_paths.append(output_path)
+def _run_flake8(paths: typing.List[str], style_options: typing.Dict[str, typing.Any], jobs: int) -> '_CollectingFormatter':
+    """ Check files with a single flake8 style guide and return the formatter holding the output. """
 
     # Ignore most flake8 logging.
     logging.getLogger("flake8").setLevel(logging.WARNING)
@@ -292,24 +538,46 @@ def check_file(
     if (len(sys.argv) == 0):
         sys.argv = ['']
 
-    style_options = BASE_STYLE_OPTIONS.copy()
-    style_options.update(style_overrides)
+    options: typing.Dict[str, typing.Any] = {'jobs': flake8.main.options.JobsArgument(str(jobs))}
+    options.update(style_options)
+
+    style_guide = flake8.api.legacy.get_style_guide(**options)
+    style_guide.init_report(_CollectingFormatter)
+
+    if (len(paths) > 0):
+        style_guide.check_files(paths)
+
+    return typing.cast(_CollectingFormatter, style_guide._application.formatter)  # pylint: disable=protected-access
+
+class _CollectingFormatter(flake8.formatting.default.Default):
+    """
+    A flake8 formatter that keeps the output for each file in memory (instead of writing it to stdout).
+    The output is the same as flake8's default formatter.
+    """
+
+    def __init__(self, options: typing.Any) -> None:
+        self.output: typing.Dict[str, typing.List[str]] = {}
+        """ The output chunks for each file. """
+
+        self.counts: typing.Dict[str, int] = {}
+        """ The number of violations reported for each file. """
 
-    style_guide = flake8.api.legacy.get_style_guide(**style_options)
+        self._current_path: str = ''
+        """ The file that the violation currently being handled is in. """
 
-    with open(output_path, 'w', encoding = edq.util.dirent.DEFAULT_ENCODING) as file:
-        with contextlib.redirect_stdout(file):
-            report = style_guide.check_files([path])
+        super().__init__(options)
 
-    with open(output_path, 'r', encoding = edq.util.dirent.DEFAULT_ENCODING) as file:
-        lines = file.readlines()
+    def handle(self, error: flake8.violation.Violation) -> None:
+        self._current_path = error.filename
+        self.counts[error.filename] = self.counts.get(error.filename, 0) + 1
 
-    lines = [line.rstrip() for line in lines]
+        super().handle(error)
 
-    if (path != replacement_path):
-        lines = [line.replace(path, replacement_path) for line in lines]
+    def _write(self, output: str) -> None:
+        self.output.setdefault(self._current_path, []).append(output + self.newline)
 
-    for cleanup_path in cleanup_paths:
-        edq.util.dirent.remove(cleanup_path)
+    def get_lines(self, path: str) -> typing.List[str]:
+        """ Get the output lines for a file (split and stripped the same as reading flake8's output back from a file). """
 
-    return (report._application.result_count, lines)
+        text = ''.join(self.output.get(path, []))
+        return [line.rstrip() for line in io.StringIO(text, newline = None).readlines()]
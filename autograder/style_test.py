@@ -241,3 +241,117 @@ class TestStyle(edq.testing.unittest.BaseTest):
         style_overrides = {'max_line_length': 100000}
         count, _ = autograder.style.check_file(path, style_overrides = style_overrides)
         self.assertEqual(count, 0, 'Final style should be clean.')
+
+    def test_check_paths_jobs(self) -> None:
+        """ Test that checking files in parallel gives the same output as checking them one at a time. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-style-')
+        edq.util.dirent.copy_contents(TESTDATA_DIR, temp_dir)
+
+        for name in ['a.py', 'b.py', 'c.py']:
+            edq.util.dirent.write_file(os.path.join(temp_dir, name), f"import os\n{name[0]}=1\n")
+
+        expected_count, expected_lines = autograder.style.check_paths([temp_dir], include_clean_paths = True)
+        self.assertEqual(6, expected_count)
+
+        for (path, lines) in expected_lines:
+            if (path.endswith(('a.py', 'b.py', 'c.py'))):
+                self.assertIn(f"{path}:2:2: E225 missing whitespace around operator", lines)
+
+            individual_count, individual_lines = autograder.style.check_file(path)
+            self.assertEqual(len([line for line in lines if line.startswith(path)]), individual_count)
+            self.assertEqual(lines, individual_lines)
+
+        actual_count, actual_lines = autograder.style.check_paths([temp_dir], include_clean_paths = True, jobs = 2)
+        self.assertEqual(expected_count, actual_count)
+        self.assertJSONListEqual(expected_lines, actual_lines)
+
+    def test_check_file_cache(self) -> None:
+        """ Test that unchanged files reuse their cached style results. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-style-')
+        cache_dir = os.path.join(temp_dir, 'cache')
+
+        path = os.path.join(temp_dir, 'a', 'test.py')
+        other_path = os.path.join(temp_dir, 'b', 'test.py')
+        notebook_path = os.path.join(temp_dir, 'a', 'test.ipynb')
+
+        edq.util.dirent.mkdir(os.path.dirname(path))
+        edq.util.dirent.write_file(path, "import os\nx=1\n")
+        edq.util.dirent.copy(path, other_path)
+        edq.util.dirent.copy(os.path.join(TESTDATA_DIR, 'base.ipynb'), notebook_path)
+
+        # [(path, kwargs, expected (hits, misses)), ...]
+        test_cases: typing.List[typing.Tuple[str, typing.Dict[str, typing.Any], typing.Tuple[int, int]]] = [
+            (path, {}, (0, 1)),
+            (path, {}, (1, 0)),
+            (path, {'shorten_path': True}, (1, 0)),
+            (path, {'fake_path': 'fake.py'}, (1, 0)),
+            (other_path, {}, (1, 0)),
+            (path, {'style_overrides': {'max_line_length': 100}}, (0, 1)),
+            (path, {'use_cache': False}, (0, 0)),
+            (notebook_path, {}, (0, 1)),
+            (notebook_path, {}, (1, 0)),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (test_path, kwargs, (expected_hits, expected_misses)) = test_case
+
+            with self.subTest(i = i, path = test_path, kwargs = kwargs):
+                expected = autograder.style.check_file(test_path, use_cache = False,
+                        **{key: value for (key, value) in kwargs.items() if (key != 'use_cache')})
+
+                autograder.style.reset_cache_stats()
+                actual = autograder.style.check_file(test_path, **{'use_cache': True, 'cache_dir': cache_dir, **kwargs})
+                stats = autograder.style.get_cache_stats()
+
+                self.assertEqual(expected_hits, stats[autograder.style.CACHE_STAT_HITS])
+                self.assertEqual(expected_misses, stats[autograder.style.CACHE_STAT_MISSES])
+
+                if (test_path.endswith('.ipynb')):
+                    # Notebooks are checked from a temp file with a new name each time.
+                    self.assertEqual(expected[0], actual[0])
+                else:
+                    self.assertEqual(expected, actual)
+
+        # The cache is opt-in.
+        autograder.style.reset_cache_stats()
+        autograder.style.check_file(path)
+        self.assertEqual({'hits': 0, 'misses': 0}, autograder.style.get_cache_stats())
+
+        with self.assertRaisesRegex(ValueError, 'cache dir must be given'):
+            autograder.style.check_file(path, use_cache = True)
+
+        # A cache dir that is not private is not used.
+        os.chmod(cache_dir, 0o777)
+        autograder.style.reset_cache_stats()
+        count, _ = autograder.style.check_file(path, use_cache = True, cache_dir = cache_dir)
+        self.assertEqual(2, count)
+        self.assertEqual({'hits': 0, 'misses': 0}, autograder.style.get_cache_stats())
+
+        # Positional arguments.
+        count, lines = autograder.style.check_file(path, os.path.join('fake', 'fake.py'), True)
+        self.assertEqual(2, count)
+        self.assertTrue(lines[0].startswith('fake.py:1:1: F401'))
+
+    def test_style_question_cache(self) -> None:
+        """ Test that grading a style question twice reuses the cached results. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-style-')
+        cache_dir = os.path.join(temp_dir, 'cache')
+        path = os.path.join(temp_dir, 'test.py')
+        edq.util.dirent.write_file(path, "import os\nx=1\n")
+
+        question = autograder.style.Style(path, max_points = 5, cache_dir = cache_dir)
+
+        # Score in this process, so the cache stats can be seen.
+        question._timeout = None  # pylint: disable=protected-access
+
+        # [(expected hits, expected misses), ...]
+        for (i, (expected_hits, expected_misses)) in enumerate([(0, 1), (1, 0)]):
+            with self.subTest(i = i):
+                autograder.style.reset_cache_stats()
+                result = question.grade(None)
+
+                self.assertEqual(3, result.score)
+                self.assertEqual({'hits': expected_hits, 'misses': expected_misses}, autograder.style.get_cache_stats())
@@ -1,11 +1,21 @@
+import concurrent.futures
+import contextlib
+import functools
 import glob
+import io
+import logging
+import math
 import os
 import subprocess
 import sys
+import tempfile
+import time
 import traceback
 import typing
+import uuid
 
 import edq.util.dirent
+import edq.util.hash
 import edq.util.json
 import edq.util.serial
 import edq.util.time
@@ -13,20 +23,41 @@ import edq.util.time
 import autograder.assignment
 import autograder.fileop
 import autograder.filespec
+import autograder.util.fastcopy
+import autograder.util.invoke
+import autograder.util.preload
 
 TEST_SUBMISSION_FILENAME: str = 'test-submission.json'
 GRADER_FILENAME: str = 'grader.py'
-GRADING_RESULT_FILENAME: str = 'result.json'
+GRADING_RESULT_FILENAME: str = autograder.assignment.RESULT_FILENAME
 
 CONFIG_KEY_STATIC_FILES: str = 'static-files'
 CONFIG_KEY_PRE_STATIC_OPS: str = 'pre-static-file-ops'
 CONFIG_KEY_POST_STATIC_OPS: str = 'post-static-file-ops'
 CONFIG_KEY_POST_SUB_OPS: str = 'post-submission-file-ops'
+CONFIG_KEY_PRELOAD_MODULES: str = 'preload-modules'
+
+DEFAULT_SNAPSHOT_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), 'autograder-py-snapshots')
+SNAPSHOT_VERSION: int = 1
+""" Bump this to invalidate all existing static snapshots. """
+
+DEFAULT_SNAPSHOT_MAX_AGE_SEC: float = 7 * 24 * 60 * 60
+""" Snapshots that have not been used for this long are removed (see evict_static_snapshots()). """
+
+DEFAULT_SNAPSHOT_MAX_COUNT: int = 32
+""" The most snapshots a cache dir will hold (see evict_static_snapshots()). """
+
+SNAPSHOT_TEMP_EXTENSION: str = '.tmp'
+
+DEFAULT_MAX_COPY_WORKERS: int = 8
+""" The default number of filespecs to copy at the same time (see copy_assignment_files()). """
 
 INPUT_DIRNAME: str = 'input'
 OUTPUT_DIRNAME: str = 'output'
 WORK_DIRNAME: str = 'work'
 
+_logger = logging.getLogger(__name__)
+
 def copy_assignment_files(
         source_dir: str,
         dest_dir: str,
@@ -35,6 +66,8 @@ def copy_assignment_files(
         only_contents: bool = False,
         pre_ops: typing.Union[typing.List[autograder.fileop.FileOp], None] = None,
         post_ops: typing.Union[typing.List[autograder.fileop.FileOp], None] = None,
+        max_workers: int = DEFAULT_MAX_COPY_WORKERS,
+        link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE,
         ) -> None:
     """
     Copy over assignment files.
@@ -43,6 +76,12 @@ def copy_assignment_files(
     1) Do pre-copy operations.
     2) Copy.
     3) Do post-copy operations.
+
+    Filespecs are copied (fetched) concurrently on up to `max_workers` threads,
+    so remote filespecs wait on the slowest fetch instead of the sum of all of them.
+    A filespec whose destination overlaps with an earlier filespec's is only copied after that filespec,
+    so the result is the same as copying them all in order.
+    Local files (from both filespecs and fileops) are copied according to the link mode (see autograder.util.fastcopy).
     """
 
     if (pre_ops is None):
@@ -52,15 +91,27 @@ def copy_assignment_files(
         post_ops = []
 
     # Do pre operations.
-    autograder.fileop.exec_file_operations(pre_ops, op_dir)
+    autograder.fileop.exec_file_operations(pre_ops, op_dir, link_mode = link_mode)
 
     # Copy over the assignment's files.
-    for filespec_text in files:
-        spec = autograder.filespec.parse(filespec_text)
-        autograder.filespec.copy(spec, source_dir, dest_dir, only_contents)
+    specs = [autograder.filespec.parse(filespec_text) for filespec_text in files]
+    for stage in _get_copy_stages(specs, dest_dir, only_contents):
+        if ((max_workers <= 1) or (len(stage) == 1)):
+            for spec in stage:
+                autograder.filespec.copy(spec, source_dir, dest_dir, only_contents, link_mode = link_mode)
+
+            continue
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers = min(max_workers, len(stage))) as executor:
+            futures = [executor.submit(autograder.filespec.copy, spec, source_dir, dest_dir, only_contents, link_mode = link_mode)
+                    for spec in stage]
+
+            # Raise the first error (in filespec order).
+            for future in futures:
+                future.result()
 
     # Do post operations.
-    autograder.fileop.exec_file_operations(post_ops, op_dir)
+    autograder.fileop.exec_file_operations(post_ops, op_dir, link_mode = link_mode)
 
 def fetch_test_submissions(path: str) -> typing.List[str]:
     """
@@ -87,6 +138,10 @@ def prep_grading_dir(
         submission_dir: str,
         grading_dir: typing.Union[str, None] = None,
         skip_static: bool = False,
+        static_dir: typing.Union[str, None] = None,
+        use_snapshot: bool = False,
+        snapshot_cache_dir: typing.Union[str, None] = None,
+        link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE,
         ) -> str:
     """
     Create and return a directory for grading a submission.
@@ -95,6 +150,9 @@ def prep_grading_dir(
     1) If the base out dir is None, create a temp dir.
     2) Create the three core directories (input/output/work) in the base dir.
     3) Copy over the static files (includng pre/post operations).
+       If a static dir (see prep_static_dir()) is supplied, its contents are copied instead.
+       If `use_snapshot` is true, a cached static dir is used when possible (see get_static_snapshot()).
+       Static files (from a static dir or the assignment) are copied according to the link mode (see autograder.util.fastcopy).
     4) Copy over the submission files (includng pre/post operations).
     5) Return the dirs.
     """
@@ -104,24 +162,18 @@ def prep_grading_dir(
 
     edq.util.dirent.mkdir(grading_dir)
 
-    input_dir, _, work_dir = make_core_dirs(grading_dir)
+    if ((static_dir is None) and use_snapshot and (not skip_static)):
+        static_dir = get_static_snapshot(assignment_config_path, cache_dir = snapshot_cache_dir)
 
-    # Load the assignment config.
+    if (static_dir is not None):
+        autograder.util.fastcopy.copy_contents(static_dir, grading_dir, link_mode = link_mode)
 
-    assignment_config_path = os.path.abspath(assignment_config_path)
-    assignment_base_dir = os.path.dirname(assignment_config_path)
+    input_dir, _, _ = make_core_dirs(grading_dir)
 
-    try:
-        assignment_config = edq.util.json.load_path(assignment_config_path)
-    except Exception as ex:
-        raise ValueError("Failed to load assignment config: " + assignment_config_path) from ex
+    assignment_config = _load_assignment_config(assignment_config_path)
 
-    if (not skip_static):
-        # Copy static files.
-        copy_assignment_files(assignment_base_dir, work_dir, grading_dir,
-                assignment_config.get(CONFIG_KEY_STATIC_FILES, []),
-                pre_ops = assignment_config.get(CONFIG_KEY_PRE_STATIC_OPS, []),
-                post_ops = assignment_config.get(CONFIG_KEY_POST_STATIC_OPS, []))
+    if ((not skip_static) and (static_dir is None)):
+        _copy_static_files(assignment_config_path, assignment_config, grading_dir, link_mode = link_mode)
 
     # Copy submission files.
     copy_assignment_files(submission_dir, input_dir, grading_dir,
@@ -131,6 +183,277 @@ def prep_grading_dir(
 
     return grading_dir
 
+def prep_static_dir(
+        assignment_config_path: str,
+        static_dir: typing.Union[str, None] = None,
+        ) -> str:
+    """
+    Create and return a grading directory that only has the static portion of the assignment
+    (the core directories and the static files, includng pre/post operations).
+    The result can be passed to prep_grading_dir() to prepare many submissions without redoing the static work.
+    """
+
+    if (static_dir is None):
+        static_dir = edq.util.dirent.get_temp_path(prefix = 'ag-py-static-')
+
+    edq.util.dirent.mkdir(static_dir)
+    make_core_dirs(static_dir)
+
+    assignment_config = _load_assignment_config(assignment_config_path)
+    _copy_static_files(assignment_config_path, assignment_config, static_dir)
+
+    return static_dir
+
+def get_static_snapshot(
+        assignment_config_path: str,
+        cache_dir: typing.Union[str, None] = None,
+        max_age_sec: float = DEFAULT_SNAPSHOT_MAX_AGE_SEC,
+        max_count: int = DEFAULT_SNAPSHOT_MAX_COUNT,
+        ) -> typing.Union[str, None]:
+    """
+    Get a cached static dir (see prep_static_dir()) for an assignment, building it if necessary.
+
+    Snapshots are stored in the cache dir (DEFAULT_SNAPSHOT_CACHE_DIR by default) and keyed by
+    a hash of the assignment config and its static sources (see get_static_snapshot_key()).
+    Snapshots should never be modified, copy them with prep_grading_dir().
+    After a new snapshot is built, old snapshots are removed (see evict_static_snapshots()).
+
+    The key cannot see changes to remote (git and URL) static files,
+    so an assignment with a remote static file that is not pinned (see autograder.filespec.is_pinned())
+    is never snapshotted and None is returned (the static files should be copied normally).
+    """
+
+    if (cache_dir is None):
+        cache_dir = DEFAULT_SNAPSHOT_CACHE_DIR
+
+    unpinned = _get_unpinned_static_files(assignment_config_path)
+    if (len(unpinned) > 0):
+        _logger.debug("Not using a static snapshot for '%s', static files are not pinned: %s.", assignment_config_path, unpinned)
+        return None
+
+    key = get_static_snapshot_key(assignment_config_path)
+    snapshot_dir = os.path.join(cache_dir, key)
+
+    if (os.path.isdir(snapshot_dir)):
+        # Mark this snapshot as recently used.
+        try:
+            os.utime(snapshot_dir)
+        except OSError:
+            pass
+
+        return snapshot_dir
+
+    edq.util.dirent.mkdir(cache_dir)
+
+    # Build in a temp location and move the snapshot into place once it is complete,
+    # so other graders never see a partial snapshot.
+    temp_dir = os.path.join(cache_dir, f"{key}.{uuid.uuid4().hex}{SNAPSHOT_TEMP_EXTENSION}")
+
+    try:
+        prep_static_dir(assignment_config_path, static_dir = temp_dir)
+        os.rename(temp_dir, snapshot_dir)
+    except OSError:
+        # Someone else may have finished the same snapshot first.
+        if (not os.path.isdir(snapshot_dir)):
+            raise
+    finally:
+        edq.util.dirent.remove(temp_dir)
+
+    evict_static_snapshots(cache_dir, max_age_sec = max_age_sec, max_count = max_count, keep = [key])
+
+    return snapshot_dir
+
+def evict_static_snapshots(
+        cache_dir: typing.Union[str, None] = None,
+        max_age_sec: float = DEFAULT_SNAPSHOT_MAX_AGE_SEC,
+        max_count: int = DEFAULT_SNAPSHOT_MAX_COUNT,
+        keep: typing.Union[typing.List[str], None] = None,
+        ) -> None:
+    """
+    Remove static snapshots (and abandoned partial snapshots) that have not been used in `max_age_sec`,
+    and then the least recently used snapshots until at most `max_count` remain.
+    Snapshots whose key is in `keep` are never removed.
+    """
+
+    if (cache_dir is None):
+        cache_dir = DEFAULT_SNAPSHOT_CACHE_DIR
+
+    if (max_count < 1):
+        raise ValueError(f"Snapshot max count must be positive, got {max_count}.")
+
+    if (not os.path.isdir(cache_dir)):
+        return
+
+    if (keep is None):
+        keep = []
+
+    now = time.time()
+
+    # [(last used, path), ...]
+    snapshots = []
+
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+
+        try:
+            last_used = os.path.getmtime(path)
+        except OSError:
+            # Another grader may have already removed this snapshot.
+            continue
+
+        if (name in keep):
+            continue
+
+        if ((now - last_used) > max_age_sec):
+            edq.util.dirent.remove(path)
+        elif (not name.endswith(SNAPSHOT_TEMP_EXTENSION)):
+            snapshots.append((last_used, path))
+
+    snapshots.sort()
+
+    num_snapshots = len(snapshots) + len([name for name in keep if os.path.isdir(os.path.join(cache_dir, name))])
+    while ((num_snapshots > max_count) and (len(snapshots) > 0)):
+        _, path = snapshots.pop(0)
+        edq.util.dirent.remove(path)
+        num_snapshots -= 1
+
+def _get_unpinned_static_files(assignment_config_path: str) -> typing.List[str]:
+    """ Get the static files for an assignment that are remote but not pinned (see autograder.filespec.is_pinned()). """
+
+    assignment_config = _load_assignment_config(assignment_config_path)
+
+    unpinned = []
+    for filespec_text in assignment_config.get(CONFIG_KEY_STATIC_FILES, []):
+        spec = autograder.filespec.parse(filespec_text)
+        if ((spec['type'] in autograder.filespec.REMOTE_FILESPEC_TYPES) and (not autograder.filespec.is_pinned(spec))):
+            unpinned.append(spec['path'])
+
+    return unpinned
+
+def get_static_snapshot_key(assignment_config_path: str) -> str:
+    """
+    Compute the key for an assignment's static snapshot.
+    The key covers the assignment config's contents and the static files' sources.
+    Local (path) sources are identified by the path, size, and modification time of every file in them.
+    Remote (git and URL) sources are only identified by their filespec,
+    so get_static_snapshot() will only use this key when they are pinned (see autograder.filespec.is_pinned()).
+    """
+
+    assignment_config_path = os.path.abspath(assignment_config_path)
+    assignment_base_dir = os.path.dirname(assignment_config_path)
+
+    assignment_config = _load_assignment_config(assignment_config_path)
+
+    parts: typing.List[typing.Any] = [
+        SNAPSHOT_VERSION,
+        assignment_config_path,
+        edq.util.dirent.read_file(assignment_config_path, strip = False),
+    ]
+
+    for filespec_text in assignment_config.get(CONFIG_KEY_STATIC_FILES, []):
+        spec = autograder.filespec.parse(filespec_text)
+        parts.append(dict(spec))
+
+        if (spec['type'] != autograder.filespec.FILESPEC_TYPE_PATH):
+            continue
+
+        source_path = spec['path']
+        if (not os.path.isabs(source_path)):
+            source_path = os.path.join(assignment_base_dir, source_path)
+
+        parts.append(_stat_tree(source_path))
+
+    return edq.util.hash.sha256_hex(edq.util.json.dumps(parts))
+
+def _stat_tree(path: str) -> typing.List[typing.Any]:
+    """ Get a list of (relative path, size, modification time) for every dirent in a tree. """
+
+    if (not edq.util.dirent.exists(path)):
+        return []
+
+    stats = []
+
+    paths = [path]
+    if (os.path.isdir(path)):
+        for (dirpath, dirnames, filenames) in os.walk(path):
+            dirnames.sort()
+            paths += [os.path.join(dirpath, name) for name in (dirnames + sorted(filenames))]
+
+    for child_path in paths:
+        stat = os.lstat(child_path)
+        stats.append([os.path.relpath(child_path, path), stat.st_size, stat.st_mtime_ns])
+
+    return stats
+
+def _load_assignment_config(assignment_config_path: str) -> typing.Dict[str, typing.Any]:
+    """ Load an assignment config. """
+
+    assignment_config_path = os.path.abspath(assignment_config_path)
+
+    try:
+        assignment_config: typing.Dict[str, typing.Any] = edq.util.json.load_path(assignment_config_path)
+    except Exception as ex:
+        raise ValueError("Failed to load assignment config: " + assignment_config_path) from ex
+
+    # Validate (and compile) file operations once, so every grading dir reuses the same plans.
+    for key in [CONFIG_KEY_PRE_STATIC_OPS, CONFIG_KEY_POST_STATIC_OPS, CONFIG_KEY_POST_SUB_OPS]:
+        try:
+            autograder.fileop.compile_file_operations(assignment_config.get(key, []))
+        except Exception as ex:
+            raise ValueError(f"Invalid file operations ('{key}') in assignment config: {assignment_config_path}") from ex
+
+    return assignment_config
+
+def _get_copy_stages(
+        specs: typing.List[autograder.filespec.FileSpec],
+        dest_dir: str,
+        only_contents: bool,
+        ) -> typing.List[typing.List[autograder.filespec.FileSpec]]:
+    """
+    Split filespecs (in order) into stages that can each be copied concurrently.
+    A new stage is started whenever a filespec's destination overlaps (is the same as, inside of, or contains)
+    the destination of a filespec in the current stage.
+    """
+
+    stages: typing.List[typing.List[autograder.filespec.FileSpec]] = []
+    stage_paths: typing.List[str] = []
+
+    for spec in specs:
+        dest_path = autograder.filespec.get_dest_path(spec, dest_dir, only_contents)
+        if (dest_path is None):
+            continue
+
+        dest_path = os.path.normpath(os.path.abspath(dest_path))
+
+        if ((len(stages) == 0) or any(_paths_overlap(dest_path, stage_path) for stage_path in stage_paths)):
+            stages.append([])
+            stage_paths = []
+
+        stages[-1].append(spec)
+        stage_paths.append(dest_path)
+
+    return stages
+
+def _paths_overlap(a: str, b: str) -> bool:
+    return ((a == b) or a.startswith(b.rstrip(os.sep) + os.sep) or b.startswith(a.rstrip(os.sep) + os.sep))
+
+def _copy_static_files(
+        assignment_config_path: str,
+        assignment_config: typing.Dict[str, typing.Any],
+        grading_dir: str,
+        link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE,
+        ) -> None:
+    """ Copy over an assignment's static files (including pre/post operations) into a grading dir. """
+
+    assignment_base_dir = os.path.dirname(os.path.abspath(assignment_config_path))
+    work_dir = os.path.join(grading_dir, WORK_DIRNAME)
+
+    copy_assignment_files(assignment_base_dir, work_dir, grading_dir,
+            assignment_config.get(CONFIG_KEY_STATIC_FILES, []),
+            pre_ops = assignment_config.get(CONFIG_KEY_PRE_STATIC_OPS, []),
+            post_ops = assignment_config.get(CONFIG_KEY_POST_STATIC_OPS, []),
+            link_mode = link_mode)
+
 def make_core_dirs(base_dir: str) -> typing.Tuple[str, str, str]:
     """
     Create and return the three core grading directories (input, output, work).
@@ -154,14 +477,25 @@ def run_test_submission(assignment_config_path: str, submission_config_path: str
 
     grading_dir = prep_grading_dir(assignment_config_path, os.path.dirname(submission_config_path))
 
-    old_module_keys = set()
-    try:
-        # Keep track of new top-level keys in sys.modules (imports) after the submission runs.
-        # This is to prevent any import of submission code that gets cached.
-        # This is in no way a complete solution, but also does not matter when run in Docker.
-        old_module_keys = set(sys.modules.keys())
-
+    with _remove_new_modules():
         actual_result = run_submission(grading_dir, assignment_config_path = assignment_config_path)
+
+    if (actual_result is None):
+        return False
+
+    return compare_test_submission(submission_config_path, actual_result)
+
+@contextlib.contextmanager
+def _remove_new_modules() -> typing.Iterator[None]:
+    """
+    Remove any new top-level keys in sys.modules (imports) after the context exits.
+    This is to prevent any import of submission code that gets cached.
+    This is in no way a complete solution, but also does not matter when run in Docker (or a separate process).
+    """
+
+    old_module_keys = set(sys.modules.keys())
+    try:
+        yield
     finally:
         new_module_keys = set(sys.modules.keys())
         for new_module_key in (new_module_keys - old_module_keys):
@@ -174,11 +508,6 @@ def run_test_submission(assignment_config_path: str, submission_config_path: str
             if (new_module_key in sys.modules):
                 del sys.modules[new_module_key]
 
-    if (actual_result is None):
-        return False
-
-    return compare_test_submission(submission_config_path, actual_result)
-
 def compare_test_submission(
         test_config_path: str,
         actual_result: typing.Union[autograder.assignment.GradedAssignment, None],
@@ -211,6 +540,323 @@ def compare_test_submission(
 
     return match
 
+def run_test_submissions(
+        assignment_config_path: str,
+        test_submission_paths: typing.List[str],
+        num_workers: int = 1,
+        timeout: typing.Union[float, None] = None,
+        link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE,
+        preload_modules: typing.Union[typing.List[str], None] = None,
+        ) -> typing.List['TestSubmissionResult']:
+    """
+    Run many test submissions (see run_test_submission()) and return a result for each (in the same order).
+
+    The static portion of the grading directory is only prepared once (see prep_static_dir()),
+    and a Python grader (along with everything it imports) is only loaded once (in this process).
+    Each test submission is then run in a fresh process (forked from this one), with up to `num_workers` running at a time,
+    so nothing a submission imports or changes can leak into other test submissions.
+    On platforms that cannot fork (see autograder.util.invoke.runs_in_process()),
+    each test submission is instead run in this process and any modules it imported are removed afterwards
+    (like run_test_submission()).
+    A timeout (in seconds) may be given for each test submission.
+
+    Modules listed in the assignment config (CONFIG_KEY_PRELOAD_MODULES) or `preload_modules`
+    are imported before any processes are forked (see autograder.util.preload).
+
+    Output from each test submission (e.g., differences from the expected result) is captured in its result.
+    """
+
+    assignment_config_path = os.path.abspath(assignment_config_path)
+    test_submission_paths = [os.path.abspath(path) for path in test_submission_paths]
+
+    preload_assignment_modules(assignment_config_path, preload_modules)
+
+    static_dir = prep_static_dir(assignment_config_path)
+
+    assignment_class = load_static_assignment_class(static_dir)
+
+    if (timeout is None):
+        timeout = math.inf
+
+    results: typing.List[typing.Union[TestSubmissionResult, None]] = [None] * len(test_submission_paths)
+    running: typing.Dict[autograder.util.invoke.PoolTask, typing.Tuple[int, float]] = {}
+
+    def wait_for_test_submission() -> None:
+        """ Wait for a running test submission to finish and record its result. """
+
+        task = pool.wait(list(running.keys()))
+        index, start_time = running.pop(task)
+        path = test_submission_paths[index]
+        duration = time.monotonic() - start_time
+
+        success, value = task.get_result()
+        if (success):
+            value.duration_sec = duration
+            results[index] = value
+        elif (value is None):
+            results[index] = TestSubmissionResult(path = path, duration_sec = duration, message = f"Timeout ({timeout} seconds).")
+        else:
+            results[index] = TestSubmissionResult(path = path, duration_sec = duration, message = f"'{value}'.")
+
+    try:
+        with autograder.util.invoke.WorkerPool(size = num_workers, max_tasks_per_worker = 1) as pool:
+            for (i, path) in enumerate(test_submission_paths):
+                while (not pool.has_capacity()):
+                    wait_for_test_submission()
+
+                grading_dir = edq.util.dirent.get_temp_path(prefix = 'ag-py-test-submission-')
+                function = functools.partial(_run_isolated_test_submission,
+                        assignment_config_path, static_dir, link_mode, assignment_class, path, grading_dir,
+                        remove_new_modules = autograder.util.invoke.runs_in_process(timeout))
+
+                running[pool.start(timeout, function)] = (i, time.monotonic())
+
+            while (len(running) > 0):
+                wait_for_test_submission()
+    finally:
+        edq.util.dirent.remove(static_dir)
+
+    return typing.cast(typing.List[TestSubmissionResult], results)
+
+def _run_isolated_test_submission(
+        assignment_config_path: str,
+        static_dir: str,
+        link_mode: str,
+        assignment_class: typing.Union[typing.Type[autograder.assignment.Assignment], None],
+        test_submission_path: str,
+        grading_dir: str,
+        remove_new_modules: bool = False,
+        ) -> 'TestSubmissionResult':
+    """
+    Run a single test submission for run_test_submissions().
+    If `remove_new_modules` is true, any modules imported while testing are removed afterwards
+    (needed when the test submission is not run in its own process).
+    Errors while testing are reported in the result's message (along with any output up to the error),
+    and their stack traces are printed to stderr.
+    """
+
+    output = io.StringIO()
+    message = ''
+    success = False
+
+    with contextlib.redirect_stdout(output):
+        print(f"Testing assignment '{assignment_config_path}' and submission '{test_submission_path}'.")
+
+        try:
+            with (_remove_new_modules() if remove_new_modules else contextlib.nullcontext()):
+                prep_grading_dir(assignment_config_path, os.path.dirname(test_submission_path), grading_dir = grading_dir,
+                        static_dir = static_dir, link_mode = link_mode)
+
+                if (assignment_class is not None):
+                    actual_result = run_python_grader(os.path.join(grading_dir, WORK_DIRNAME, GRADER_FILENAME), grading_dir,
+                            assignment_class = assignment_class)
+                else:
+                    actual_result = run_external_grader(assignment_config_path, grading_dir)
+
+                success = compare_test_submission(test_submission_path, actual_result)
+        except Exception as ex:
+            # Like run_test_submission(), the stack trace goes to stderr (not the captured output).
+            traceback.print_exc(file = sys.stderr)
+            message = f"'{ex}'."
+        finally:
+            edq.util.dirent.remove(grading_dir)
+
+    return TestSubmissionResult(path = test_submission_path, success = success, output = output.getvalue(), message = message)
+
+def report_test_submissions(results: typing.List['TestSubmissionResult']) -> str:
+    """ Get a summary (a table of each test submission and a total) for the results of run_test_submissions(). """
+
+    lines = []
+    for result in results:
+        status = 'PASS' if result.success else 'FAIL'
+
+        line = f"{status}  {result.duration_sec:8.3f}s  {result.path}"
+        if (result.message != ''):
+            line += f" ({result.message})"
+
+        lines.append(line)
+
+    passed = len([result for result in results if result.success])
+    total_duration = sum(result.duration_sec for result in results)
+    lines.append(f"Passed {passed} / {len(results)} test submissions (total time: {total_duration:.3f}s).")
+
+    return "\n".join(lines)
+
+def grade_submissions(
+        assignment_config_path: str,
+        submissions_dir: str,
+        out_dir: str,
+        num_workers: int = 1,
+        timeout: typing.Union[float, None] = None,
+        use_snapshot: bool = False,
+        snapshot_cache_dir: typing.Union[str, None] = None,
+        link_mode: str = autograder.util.fastcopy.DEFAULT_LINK_MODE,
+        include_resource_usage: bool = False,
+        preload_modules: typing.Union[typing.List[str], None] = None,
+        ) -> typing.List['SubmissionSummary']:
+    """
+    Grade every submission (each child directory) in a directory
+    and write each result to `<out_dir>/<submission name>.json`.
+
+    The static portion of the grading directory is only prepared once (see prep_static_dir()),
+    and a Python grader is only loaded once.
+    If `use_snapshot` is true, the static portion is reused across calls (see get_static_snapshot()).
+    The static portion is copied into each grading dir according to the link mode (see autograder.util.fastcopy).
+    If `include_resource_usage` is true, results will include the resources used by each question.
+    Each submission is graded in a fresh process (forked from this one), with up to `num_workers` running at a time.
+    Modules listed in the assignment config (CONFIG_KEY_PRELOAD_MODULES) or `preload_modules`
+    are imported before any processes are forked (see autograder.util.preload).
+    A timeout (in seconds) may be given for each submission.
+
+    Returns a summary for each submission (in the order of the submission names).
+    A summary's message will be empty if the submission was successfully graded.
+    """
+
+    assignment_config_path = os.path.abspath(assignment_config_path)
+    submissions_dir = os.path.abspath(submissions_dir)
+    out_dir = os.path.abspath(out_dir)
+
+    if (not os.path.isdir(submissions_dir)):
+        raise ValueError(f"Submissions path does not exist or is not a dir: '{submissions_dir}'.")
+
+    edq.util.dirent.mkdir(out_dir)
+
+    preload_assignment_modules(assignment_config_path, preload_modules)
+
+    static_dir = None
+    if (use_snapshot):
+        static_dir = get_static_snapshot(assignment_config_path, cache_dir = snapshot_cache_dir)
+
+    # Snapshots are kept, but a static dir just for this call is not.
+    remove_static_dir = (static_dir is None)
+    if (static_dir is None):
+        static_dir = prep_static_dir(assignment_config_path)
+
+    names = sorted([dirent for dirent in os.listdir(submissions_dir) if os.path.isdir(os.path.join(submissions_dir, dirent))])
+
+    if (timeout is None):
+        timeout = math.inf
+
+    summaries: typing.List[typing.Union[SubmissionSummary, None]] = [None] * len(names)
+
+    # {task: (index, grading dir), ...}
+    running: typing.Dict[autograder.util.invoke.PoolTask, typing.Tuple[int, str]] = {}
+
+    def wait_for_submission() -> None:
+        """ Wait for a running submission to finish and record its summary. """
+
+        task = pool.wait(list(running.keys()))
+        index, grading_dir = running.pop(task)
+
+        success, value = task.get_result()
+        if (success):
+            summaries[index] = value
+            return
+
+        # A worker that timed out (or died) may not have cleaned up after itself.
+        edq.util.dirent.remove(grading_dir)
+
+        if (value is None):
+            summaries[index] = SubmissionSummary(id = names[index], message = f"Timeout ({timeout} seconds).")
+        else:
+            summaries[index] = SubmissionSummary(id = names[index], message = f"Error during grading: '{value}'.")
+
+    try:
+        assignment_class = load_static_assignment_class(static_dir)
+
+        with autograder.util.invoke.WorkerPool(size = num_workers, max_tasks_per_worker = 1) as pool:
+            for (i, name) in enumerate(names):
+                while (not pool.has_capacity()):
+                    wait_for_submission()
+
+                grading_dir = edq.util.dirent.get_temp_path(prefix = 'ag-py-submission-')
+                function = functools.partial(_grade_batch_submission,
+                        assignment_config_path, static_dir, link_mode, assignment_class,
+                        name, os.path.join(submissions_dir, name), grading_dir, out_dir, include_resource_usage)
+
+                running[pool.start(timeout, function)] = (i, grading_dir)
+
+            while (len(running) > 0):
+                wait_for_submission()
+    finally:
+        if (remove_static_dir):
+            edq.util.dirent.remove(static_dir)
+
+    return typing.cast(typing.List[SubmissionSummary], summaries)
+
+def _grade_batch_submission(
+        assignment_config_path: str,
+        static_dir: str,
+        link_mode: str,
+        assignment_class: typing.Union[typing.Type[autograder.assignment.Assignment], None],
+        name: str,
+        submission_dir: str,
+        grading_dir: str,
+        out_dir: str,
+        include_resource_usage: bool,
+        ) -> 'SubmissionSummary':
+    """ Grade a single submission for grade_submissions(). """
+
+    try:
+        prep_grading_dir(assignment_config_path, submission_dir, grading_dir = grading_dir,
+                static_dir = static_dir, link_mode = link_mode)
+
+        if (assignment_class is not None):
+            result = run_python_grader(os.path.join(grading_dir, WORK_DIRNAME, GRADER_FILENAME), grading_dir,
+                    assignment_class = assignment_class)
+        else:
+            result = run_external_grader(assignment_config_path, grading_dir)
+    finally:
+        edq.util.dirent.remove(grading_dir)
+
+    if (result is None):
+        return SubmissionSummary(id = name, message = "Failed to grade submission.")
+
+    edq.util.json.dump_path(result.to_dict(include_resource_usage = include_resource_usage),
+            os.path.join(out_dir, f"{name}.json"), indent = 4)
+
+    score, max_points = result.get_score()
+    return SubmissionSummary(id = name, score = score, max_points = max_points, grading_start_time = result.grading_start_time)
+
+def preload_assignment_modules(
+        assignment_config_path: str,
+        preload_modules: typing.Union[typing.List[str], None] = None,
+        ) -> autograder.util.preload.PreloadReport:
+    """ Preload the modules listed in an assignment config (and any additional modules). """
+
+    assignment_config = _load_assignment_config(assignment_config_path)
+
+    names = list(assignment_config.get(CONFIG_KEY_PRELOAD_MODULES, []))
+    if (preload_modules is not None):
+        names += preload_modules
+
+    return autograder.util.preload.preload_modules(names)
+
+def load_static_assignment_class(static_dir: str) -> typing.Union[typing.Type[autograder.assignment.Assignment], None]:
+    """
+    Load the Python grader's assignment class from a static dir (see prep_static_dir()).
+    Returns None if the assignment does not use a Python grader.
+    """
+
+    grader_path = os.path.join(static_dir, WORK_DIRNAME, GRADER_FILENAME)
+    if (not os.path.exists(grader_path)):
+        return None
+
+    return _load_assignment_class(grader_path, os.path.join(static_dir, WORK_DIRNAME))
+
+def _load_assignment_class(grader_path: str, work_dir: str) -> typing.Type[autograder.assignment.Assignment]:
+    """ Load an assignment class the same way run_python_grader() would. """
+
+    sys.path.insert(0, '.')
+    start_dir = os.getcwd()
+
+    try:
+        os.chdir(work_dir)
+        return autograder.assignment.fetch_assignment_class(grader_path)
+    finally:
+        os.chdir(start_dir)
+        sys.path.pop(0)
+
 def run_submission(
         grading_dir: str,
         assignment_config_path: typing.Union[str, None] = None,
@@ -234,9 +880,14 @@ def run_submission(
 
     return run_external_grader(assignment_config_path, grading_dir)
 
-def run_python_grader(grader_path: str, grading_dir: str) -> typing.Union[autograder.assignment.GradedAssignment, None]:
+def run_python_grader(
+        grader_path: str,
+        grading_dir: str,
+        assignment_class: typing.Union[typing.Type[autograder.assignment.Assignment], None] = None,
+        ) -> typing.Union[autograder.assignment.GradedAssignment, None]:
     """
     Run a standard Python-based grader.
+    If an assignment class is supplied, it will be used instead of loading one from the grader path.
     Returns None on grading failure.
     """
 
@@ -255,7 +906,9 @@ def run_python_grader(grader_path: str, grading_dir: str) -> typing.Union[autogr
     try:
         os.chdir(work_dir)
 
-        assignment_class = autograder.assignment.fetch_assignment_class(grader_path)
+        if (assignment_class is None):
+            assignment_class = autograder.assignment.fetch_assignment_class(grader_path)
+
         if (assignment_class is None):
             print("Failed to fetch assignment class from '{grader_path}'.")
             return None
@@ -347,3 +1000,30 @@ class SubmissionSummary(edq.util.serial.DictConverter):
             message = f", Message: '{self.message}'."
 
         return f"Submission ID: {self.short_id()}, Score: {self.score} / {self.max_points}, Time: {self.grading_start_time.pretty()}{message}"
+
+class TestSubmissionResult(edq.util.serial.DictConverter):
+    """
+    The result of running a test submission (see run_test_submissions()).
+    """
+
+    def __init__(self,
+            path: str = '',
+            success: bool = False,
+            duration_sec: float = 0.0,
+            output: str = '',
+            message: str = '',
+            **kwargs: typing.Any):
+        self.path: str = path
+        """ The path to the test submission's config. """
+
+        self.success: bool = success
+        """ Whether the grading result matched the expected result. """
+
+        self.duration_sec: float = duration_sec
+        """ How long (wall time, in seconds) the test submission took to run. """
+
+        self.output: str = output
+        """ Everything the test submission printed while running (including any differences from the expected result). """
+
+        self.message: str = message
+        """ Why the test submission could not be run (empty if it ran). """
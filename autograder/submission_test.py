@@ -1,8 +1,19 @@
+import glob
 import os
+import sys
+import tempfile
+import time
 import typing
+import unittest
 
 import edq.testing.unittest
+import edq.util.dirent
+import edq.util.json
 
+import autograder.assignment
+import autograder.filespec
+import autograder.submission
+import autograder.util.fastcopy
 import autograder.util.prepare_submission
 
 THIS_DIR: str = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
@@ -43,3 +54,416 @@ class TestSubmission(edq.testing.unittest.BaseTest):
         self.assertIn('nested', dir(submission.nested1.nested2))
         self.assertIn('SOME_CONSTANT', dir(submission.nested1.nested2.nested))
         self.assertEqual(submission.nested1.nested2.nested.SOME_CONSTANT, 1)
+
+    def test_prepare_lazy(self) -> None:
+        """ Test that lazy submissions only import the files that are used. """
+
+        cache_dir = edq.util.dirent.get_temp_dir('autograder-test-code-cache-')
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-lazy-')
+
+        edq.util.dirent.copy_contents(os.path.join(DATA_DIR, 'submission', 'nested'), temp_dir)
+        edq.util.dirent.write_file(os.path.join(temp_dir, 'unused.py'), 'OTHER_CONSTANT = 2')
+        edq.util.dirent.write_file(os.path.join(temp_dir, 'broken.py'), 'def broken(')
+
+        submission: typing.Any = autograder.util.prepare_submission.prepare(temp_dir, use_cache = True, cache_dir = cache_dir, lazy = True)
+
+        autograder.util.prepare_submission.reset_cache_stats()
+
+        self.assertEqual(submission.nested1.nested2.nested.SOME_CONSTANT, 1)
+        self.assertEqual({'hits': 0, 'misses': 2}, autograder.util.prepare_submission.get_cache_stats())
+
+        self.assertEqual(submission.unused.OTHER_CONSTANT, 2)
+        self.assertEqual({'hits': 0, 'misses': 3}, autograder.util.prepare_submission.get_cache_stats())
+
+        self.assertIn('nested', dir(submission.nested1.nested2))
+        self.assertIn('__all__', dir(submission))
+
+        with self.assertRaises(AttributeError):
+            submission.nested1.missing  # pylint: disable=pointless-statement
+
+        # Listing all entries requires importing everything.
+        with self.assertRaises(SyntaxError):
+            dir(submission.__all__)
+
+    def test_prepare_lazy_matches_eager(self) -> None:
+        """ Test that lazy submissions convert entries and report collisions like eager ones. """
+
+        # [(files, raise on collision, function that reads the submission), ...]
+        test_cases: typing.List[typing.Tuple[typing.Dict[str, str], bool, typing.Callable]] = [
+            ({'data.py': 'DATA = {"a": {"b": 1}}'}, False, lambda submission: type(submission.data.DATA.a).__name__),
+            ({'data.py': 'DATA = {"a": {"b": 1}}'}, False, lambda submission: submission.__all__.DATA.a.b),
+            ({'A.py': 'B = 1', 'B.py': 'X = 2'}, True, lambda submission: [name for name in dir(submission.__all__) if (not name.startswith('_'))]),
+            ({'A.py': 'B = 1', 'B.py': 'X = 2'}, False, lambda submission: (submission.__all__.B, submission.B.X)),
+            ({'A.py': 'C = 1', os.path.join('A', 'C.py'): 'Y = 3'}, False, lambda submission: getattr(submission.A.C, 'Y', submission.A.C)),
+        ]
+
+        for (i, (files, raise_on_collision, read)) in enumerate(test_cases):
+            with self.subTest(i = i):
+                temp_dir = edq.util.dirent.get_temp_dir('autograder-test-lazy-')
+                for (relpath, contents) in files.items():
+                    edq.util.dirent.mkdir(os.path.dirname(os.path.join(temp_dir, relpath)))
+                    edq.util.dirent.write_file(os.path.join(temp_dir, relpath), contents)
+
+                outcomes = []
+                for lazy in [False, True]:
+                    try:
+                        submission = autograder.util.prepare_submission.prepare(temp_dir,
+                                raise_on_collision = raise_on_collision, lazy = lazy)
+                        outcomes.append(('value', read(submission)))
+                    except ValueError as ex:
+                        outcomes.append(('error', str(ex).split("'")[1]))
+
+                self.assertEqual(outcomes[0], outcomes[1])
+
+    def test_prepare_lazy_preload(self) -> None:
+        """ Test that preloading a lazy submission imports everything once, but only raises errors on access. """
+
+        cache_dir = edq.util.dirent.get_temp_dir('autograder-test-code-cache-')
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-lazy-')
+
+        edq.util.dirent.write_file(os.path.join(temp_dir, 'used.py'), 'SOME_CONSTANT = 1')
+        edq.util.dirent.write_file(os.path.join(temp_dir, 'broken.py'), 'def broken(')
+
+        submission: typing.Any = autograder.util.prepare_submission.prepare(temp_dir, use_cache = True, cache_dir = cache_dir, lazy = True)
+
+        autograder.util.prepare_submission.reset_cache_stats()
+        autograder.util.prepare_submission.preload(submission)
+        self.assertEqual({'hits': 0, 'misses': 2}, autograder.util.prepare_submission.get_cache_stats())
+
+        self.assertEqual(1, submission.used.SOME_CONSTANT)
+        self.assertEqual({'hits': 0, 'misses': 2}, autograder.util.prepare_submission.get_cache_stats())
+
+        with self.assertRaises(SyntaxError):
+            submission.broken.broken  # pylint: disable=pointless-statement
+
+        # Eager submissions are left alone.
+        autograder.util.prepare_submission.preload(autograder.util.prepare_submission.prepare(os.path.join(temp_dir, 'used.py')))
+
+    def test_prepare_cache(self) -> None:
+        """ Test that preparing unchanged files uses cached code. """
+
+        cache_dir = edq.util.dirent.get_temp_dir('autograder-test-code-cache-')
+        # This submission has two files (a Python file and a notebook).
+        path = os.path.join(DATA_DIR, 'submission', 'nested')
+
+        autograder.util.prepare_submission.reset_cache_stats()
+
+        for expected_stats in [{'hits': 0, 'misses': 2}, {'hits': 2, 'misses': 2}]:
+            submission: typing.Any = autograder.util.prepare_submission.prepare(path, use_cache = True, cache_dir = cache_dir)
+
+            self.assertEqual(submission.nested1.nested2.nested.SOME_CONSTANT, 1)
+            self.assertEqual(expected_stats, autograder.util.prepare_submission.get_cache_stats())
+
+        # The same contents at a different path should still hit, but report the new path.
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-code-cache-')
+        edq.util.dirent.copy_contents(path, temp_dir)
+
+        submission = autograder.util.prepare_submission.prepare(temp_dir, use_cache = True, cache_dir = cache_dir)
+
+        self.assertEqual(submission.nested1.nested2.nested.SOME_CONSTANT, 1)
+        self.assertEqual({'hits': 4, 'misses': 2}, autograder.util.prepare_submission.get_cache_stats())
+
+        # The cache is opt-in.
+        autograder.util.prepare_submission.prepare(path)
+        self.assertEqual({'hits': 4, 'misses': 2}, autograder.util.prepare_submission.get_cache_stats())
+
+        with self.assertRaisesRegex(ValueError, 'cache dir must be given'):
+            autograder.util.prepare_submission.prepare(path, use_cache = True)
+
+        # Assignments can use the cache.
+        assignment = autograder.assignment.Assignment(input_dir = path, code_cache_dir = cache_dir)
+        submission = assignment._prepare_submission()  # pylint: disable=protected-access
+
+        self.assertEqual(submission.nested1.nested2.nested.SOME_CONSTANT, 1)
+        self.assertEqual({'hits': 6, 'misses': 2}, autograder.util.prepare_submission.get_cache_stats())
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), "private dirs are only checked on POSIX")
+    def test_prepare_cache_private(self) -> None:
+        """ Test that the code cache refuses dirs that other users can write to. """
+
+        cache_dir = edq.util.dirent.get_temp_dir('autograder-test-code-cache-')
+        os.chmod(cache_dir, 0o777)
+
+        path = os.path.join(DATA_DIR, 'submission', 'nested')
+        # The submission is still prepared (without the cache).
+        autograder.util.prepare_submission.reset_cache_stats()
+        with self.assertLogs('autograder.util.prepare_submission', level = 'WARNING') as logs:
+            submission: typing.Any = autograder.util.prepare_submission.prepare(path, use_cache = True, cache_dir = cache_dir)
+
+        self.assertIn('can be written to by other users', logs.output[0])
+        self.assertEqual(submission.nested1.nested2.nested.SOME_CONSTANT, 1)
+        self.assertEqual({'hits': 0, 'misses': 0}, autograder.util.prepare_submission.get_cache_stats())
+
+        # New dirs are created privately.
+        cache_dir = os.path.join(cache_dir, 'private')
+        autograder.util.prepare_submission.prepare(path, use_cache = True, cache_dir = cache_dir)
+        self.assertEqual(0o700, os.stat(cache_dir).st_mode & 0o777)
+
+    def test_grade_submissions_base(self) -> None:
+        """ Test grading a directory of submissions. """
+
+        assignment_dir = os.path.join(DATA_DIR, 'assignment')
+        out_dir = edq.util.dirent.get_temp_dir('autograder-test-batch-')
+
+        summaries = autograder.submission.grade_submissions(
+                os.path.join(assignment_dir, 'assignment.json'),
+                os.path.join(assignment_dir, 'submissions'),
+                out_dir,
+                num_workers = 2)
+
+        self.assertEqual(['correct', 'incorrect'], [summary.id for summary in summaries])
+        self.assertEqual([2, 1], [summary.score for summary in summaries])
+        self.assertEqual([2, 2], [summary.max_points for summary in summaries])
+        self.assertEqual(['', ''], [summary.message for summary in summaries])
+
+        result = edq.util.json.load_path(os.path.join(out_dir, 'incorrect.json'))
+        self.assertEqual('Test Assignment', result['name'])
+        self.assertEqual([0, 1], [question['score'] for question in result['questions']])
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "timeouts require Linux")
+    def test_grade_submissions_timeout(self) -> None:
+        """ Test that the grading dirs of submissions that time out are cleaned up. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-batch-')
+        assignment_dir = os.path.join(temp_dir, 'assignment')
+        submissions_dir = os.path.join(temp_dir, 'submissions')
+
+        edq.util.dirent.copy(os.path.join(DATA_DIR, 'assignment'), assignment_dir)
+        edq.util.dirent.copy(os.path.join(assignment_dir, 'submissions', 'correct'), os.path.join(submissions_dir, 'correct'))
+
+        slow_dir = os.path.join(submissions_dir, 'slow')
+        edq.util.dirent.mkdir(slow_dir)
+        edq.util.dirent.write_file(os.path.join(slow_dir, 'submission.py'), "import time\n\ndef add(a, b):\n    time.sleep(30)\n")
+
+        grading_dirs_pattern = os.path.join(tempfile.gettempdir(), 'ag-py-submission-*')
+        old_grading_dirs = set(glob.glob(grading_dirs_pattern))
+
+        summaries = autograder.submission.grade_submissions(os.path.join(assignment_dir, 'assignment.json'),
+                submissions_dir, os.path.join(temp_dir, 'out'), num_workers = 2, timeout = 2)
+
+        self.assertEqual(['correct', 'slow'], [summary.id for summary in summaries])
+        self.assertEqual('', summaries[0].message)
+        self.assertTrue(summaries[1].message.startswith('Timeout'), summaries[1].message)
+
+        self.assertEqual(set(), set(glob.glob(grading_dirs_pattern)) - old_grading_dirs)
+
+    def test_run_test_submissions(self) -> None:
+        """ Test running test submissions in isolated processes. """
+
+        assignment_dir = os.path.join(DATA_DIR, 'assignment')
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-test-submissions-')
+
+        # [(name, submission, expected scores), ...]
+        cases = [
+            ('correct', 'correct', [1, 1]),
+            ('incorrect', 'incorrect', [0, 1]),
+            ('wrong-expected', 'correct', [0, 0]),
+        ]
+
+        for (name, submission, scores) in cases:
+            submission_dir = os.path.join(temp_dir, name)
+            edq.util.dirent.copy(os.path.join(assignment_dir, 'submissions', submission), submission_dir)
+
+            edq.util.json.dump_path({
+                'ignore_messages': True,
+                'result': {
+                    'name': 'Test Assignment',
+                    'questions': [
+                        {'name': 'Q1', 'max_points': 1, 'score': scores[0]},
+                        {'name': 'Q2', 'max_points': 1, 'score': scores[1]},
+                    ],
+                },
+            }, os.path.join(submission_dir, autograder.submission.TEST_SUBMISSION_FILENAME))
+
+        paths = sorted(autograder.submission.fetch_test_submissions(temp_dir))
+        results = autograder.submission.run_test_submissions(os.path.join(assignment_dir, 'assignment.json'), paths, num_workers = 2)
+
+        self.assertEqual(paths, [result.path for result in results])
+        self.assertEqual([True, True, False], [result.success for result in results])
+        self.assertEqual(['', '', ''], [result.message for result in results])
+
+        self.assertNotIn('does not match', results[0].output)
+        self.assertIn('does not match', results[2].output)
+
+        report = autograder.submission.report_test_submissions(results)
+        self.assertIn('Passed 2 / 3 test submissions', report)
+        self.assertTrue(report.splitlines()[2].startswith("FAIL"))
+
+    def test_run_isolated_test_submission(self) -> None:
+        """ Test running a single test submission in this process (as done on platforms that cannot fork). """
+
+        assignment_config_path = os.path.join(DATA_DIR, 'assignment', 'assignment.json')
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-test-submissions-')
+
+        submission_dir = os.path.join(temp_dir, 'correct')
+        edq.util.dirent.copy(os.path.join(DATA_DIR, 'assignment', 'submissions', 'correct'), submission_dir)
+        test_path = os.path.join(submission_dir, autograder.submission.TEST_SUBMISSION_FILENAME)
+
+        edq.util.json.dump_path({
+            'ignore_messages': True,
+            'result': {
+                'name': 'Test Assignment',
+                'questions': [
+                    {'name': 'Q1', 'max_points': 1, 'score': 1},
+                    {'name': 'Q2', 'max_points': 1, 'score': 1},
+                ],
+            },
+        }, test_path)
+
+        static_dir = autograder.submission.prep_static_dir(assignment_config_path)
+        try:
+            assignment_class = autograder.submission.load_static_assignment_class(static_dir)
+
+            old_module_keys = set(sys.modules.keys())
+            result = autograder.submission._run_isolated_test_submission(  # pylint: disable=protected-access
+                    assignment_config_path, static_dir, autograder.util.fastcopy.DEFAULT_LINK_MODE, assignment_class,
+                    test_path, edq.util.dirent.get_temp_path(prefix = 'autograder-test-grading-'), remove_new_modules = True)
+
+            self.assertTrue(result.success, result.output)
+            self.assertEqual('', result.message)
+            self.assertEqual(set(), set(sys.modules.keys()) - old_module_keys)
+
+            # Errors are reported in the result, along with any output.
+            result = autograder.submission._run_isolated_test_submission(  # pylint: disable=protected-access
+                    assignment_config_path, static_dir, autograder.util.fastcopy.DEFAULT_LINK_MODE, assignment_class,
+                    os.path.join(temp_dir, 'missing', autograder.submission.TEST_SUBMISSION_FILENAME),
+                    edq.util.dirent.get_temp_path(prefix = 'autograder-test-grading-'), remove_new_modules = True)
+
+            self.assertFalse(result.success)
+            self.assertTrue(result.message.startswith("'"), result.message)
+            self.assertIn('Testing assignment', result.output)
+            self.assertNotIn('Traceback', result.output)
+        finally:
+            edq.util.dirent.remove(static_dir)
+
+    def test_static_snapshot(self) -> None:
+        """ Test that static snapshots are reused until the assignment changes. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-snapshot-')
+        assignment_dir = os.path.join(temp_dir, 'assignment')
+        cache_dir = os.path.join(temp_dir, 'cache')
+
+        edq.util.dirent.copy(os.path.join(DATA_DIR, 'assignment'), assignment_dir)
+        assignment_config_path = os.path.join(assignment_dir, 'assignment.json')
+        grader_path = os.path.join(assignment_dir, 'grader.py')
+
+        first_snapshot = autograder.submission.get_static_snapshot(assignment_config_path, cache_dir = cache_dir)
+        second_snapshot = autograder.submission.get_static_snapshot(assignment_config_path, cache_dir = cache_dir)
+
+        self.assertIsNotNone(first_snapshot)
+        first_snapshot = typing.cast(str, first_snapshot)
+
+        self.assertEqual(first_snapshot, second_snapshot)
+        self.assertTrue(os.path.isfile(os.path.join(first_snapshot, autograder.submission.WORK_DIRNAME, 'grader.py')))
+
+        # Changing a static file should result in a new snapshot.
+        edq.util.dirent.write_file(grader_path, edq.util.dirent.read_file(grader_path, strip = False) + "\n# Changed.\n")
+
+        third_snapshot = autograder.submission.get_static_snapshot(assignment_config_path, cache_dir = cache_dir)
+        self.assertNotEqual(first_snapshot, third_snapshot)
+        self.assertEqual(2, len(os.listdir(cache_dir)))
+
+        # Grading dirs built from a snapshot should match normal grading dirs.
+        submission_dir = os.path.join(assignment_dir, 'submissions', 'correct')
+        expected_dir = autograder.submission.prep_grading_dir(assignment_config_path, submission_dir)
+
+        for link_mode in autograder.util.fastcopy.LINK_MODES:
+            with self.subTest(msg = link_mode):
+                grading_dir = autograder.submission.prep_grading_dir(assignment_config_path, submission_dir,
+                        use_snapshot = True, snapshot_cache_dir = cache_dir, link_mode = link_mode)
+
+                self.assertEqual(_list_tree(expected_dir), _list_tree(grading_dir))
+
+        # Only the most recently used snapshots are kept.
+        old_time = time.time() - 60
+        os.utime(first_snapshot, (old_time, old_time))
+
+        autograder.submission.evict_static_snapshots(cache_dir, max_count = 1)
+        self.assertEqual([os.path.basename(typing.cast(str, third_snapshot))], os.listdir(cache_dir))
+
+        # Snapshots (and abandoned partial snapshots) that have not been used recently are removed.
+        edq.util.dirent.mkdir(os.path.join(cache_dir, 'abandoned.tmp'))
+        autograder.submission.evict_static_snapshots(cache_dir, max_age_sec = -1)
+        self.assertEqual([], os.listdir(cache_dir))
+
+    def test_static_snapshot_unpinned(self) -> None:
+        """ Test that assignments with remote static files are only snapshotted when those files are pinned. """
+
+        commit = '0123456789abcdef0123456789abcdef01234567'
+
+        # [(filespec, pinned), ...]
+        test_cases = [
+            (autograder.filespec.get_path('grader.py'), False),
+            (autograder.filespec.get_git('https://example.com/repo.git'), False),
+            (autograder.filespec.get_git('https://example.com/repo.git', reference = 'main'), False),
+            (autograder.filespec.get_git('https://example.com/repo.git', reference = commit), True),
+            (autograder.filespec.get_url('https://example.com/data.txt'), False),
+            (autograder.filespec.get_url('https://example.com/data.txt', checksum = 'sha256:' + ('0' * 64)), True),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (spec, expected) = test_case
+
+            with self.subTest(i = i, spec = spec):
+                self.assertEqual(expected, autograder.filespec.is_pinned(spec))
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-snapshot-unpinned-')
+        cache_dir = os.path.join(temp_dir, 'cache')
+        assignment_config_path = os.path.join(temp_dir, 'assignment.json')
+
+        for spec in [test_cases[2][0], test_cases[4][0]]:
+            with self.subTest(spec = spec):
+                edq.util.json.dump_path({'static-files': [spec]}, assignment_config_path)
+                self.assertIsNone(autograder.submission.get_static_snapshot(assignment_config_path, cache_dir = cache_dir))
+                self.assertFalse(os.path.exists(cache_dir))
+
+    def test_copy_assignment_files_parallel(self) -> None:
+        """ Test that copying filespecs concurrently matches copying them in order. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-copy-files-')
+        source_dir = os.path.join(temp_dir, 'source')
+
+        edq.util.dirent.mkdir(os.path.join(source_dir, 'dir'))
+        for (path, contents) in [('a.txt', 'A'), ('b.txt', 'B'), ('c.txt', 'C'), ('dir/a.txt', 'dir-A')]:
+            edq.util.dirent.write_file(os.path.join(source_dir, path), contents)
+
+        # Later filespecs that write into (or over) earlier ones must win.
+        files: typing.List[typing.Any] = [
+            'a.txt',
+            'dir',
+            {'type': 'path', 'path': 'b.txt', 'dest': 'a.txt'},
+            'c.txt',
+            {'type': 'path', 'path': 'c.txt', 'dest': 'dir/a.txt'},
+            {'type': 'empty'},
+        ]
+
+        specs = [autograder.filespec.parse(spec) for spec in files]
+        stages = autograder.submission._get_copy_stages(specs, os.path.join(temp_dir, 'dest'), False)
+        self.assertEqual([['a.txt', 'dir'], ['b.txt', 'c.txt', 'c.txt']], [[spec['path'] for spec in stage] for stage in stages])
+
+        expected_dir = os.path.join(temp_dir, 'expected')
+        autograder.submission.copy_assignment_files(source_dir, expected_dir, temp_dir, files, max_workers = 1)
+
+        for max_workers in [2, 8]:
+            with self.subTest(max_workers = max_workers):
+                dest_dir = os.path.join(temp_dir, f"dest-{max_workers}")
+                autograder.submission.copy_assignment_files(source_dir, dest_dir, temp_dir, files, max_workers = max_workers)
+
+                self.assertEqual(_list_tree(expected_dir), _list_tree(dest_dir))
+                self.assertEqual('B', edq.util.dirent.read_file(os.path.join(dest_dir, 'a.txt')))
+                self.assertEqual('C', edq.util.dirent.read_file(os.path.join(dest_dir, 'dir', 'a.txt')))
+
+def _list_tree(base_dir: str) -> typing.List[typing.Tuple[str, bytes]]:
+    """ Get the relative path and contents (empty for dirs) of every dirent in a tree. """
+
+    entries = []
+    for (dirpath, dirnames, filenames) in os.walk(base_dir):
+        for name in dirnames:
+            entries.append((os.path.relpath(os.path.join(dirpath, name), base_dir), b''))
+
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as file:
+                entries.append((os.path.relpath(path, base_dir), file.read()))
+
+    return sorted(entries)
@@ -0,0 +1,25 @@
+import typing
+
+import autograder.assignment
+import autograder.question
+
+class Q1(autograder.question.Question):
+    def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+        if (submission.__all__.add(1, 2) == 3):
+            self.full_credit()
+        else:
+            self.fail("Wrong sum.")
+
+class Q2(autograder.question.Question):
+    def score_question(self, submission: typing.Any, **kwargs: typing.Any) -> None:
+        if (submission.__all__.add(0, 0) == 0):
+            self.full_credit()
+        else:
+            self.fail("Wrong sum.")
+
+class BatchAssignment(autograder.assignment.Assignment):
+    def __init__(self, **kwargs: typing.Any) -> None:
+        super().__init__(name = 'Test Assignment', questions = [
+            Q1(1),
+            Q2(1),
+        ], **kwargs)
@@ -0,0 +1,236 @@
+"""
+Copy directory trees as cheaply as the file system allows.
+
+Files can be copied normally, cloned as reflinks (copy-on-write copies that share data until modified),
+or hard linked (which shares the file itself, so it should only be used for files that will not be modified).
+When a reflink or hard link cannot be made (e.g., the file system does not support it),
+a normal copy is made instead.
+Normal copies are done in the kernel (with copy_file_range(2)) when possible,
+which some file systems (e.g., NFS, Btrfs, XFS) can also turn into a server-side copy or reflink.
+
+The directory structure of a tree is created first,
+and then the files are copied (on a thread pool when there are many of them).
+"""
+
+import concurrent.futures
+import os
+import shutil
+import sys
+import typing
+
+import edq.util.dirent
+
+LINK_MODE_COPY: str = 'copy'
+LINK_MODE_REFLINK: str = 'reflink'
+LINK_MODE_HARDLINK: str = 'hardlink'
+
+LINK_MODES: typing.List[str] = [LINK_MODE_COPY, LINK_MODE_REFLINK, LINK_MODE_HARDLINK]
+DEFAULT_LINK_MODE: str = LINK_MODE_REFLINK
+
+DEFAULT_MAX_WORKERS: int = 8
+""" The default number of files to copy at the same time. """
+
+MIN_PARALLEL_FILES: int = 16
+""" Trees with fewer files than this are copied on the calling thread. """
+
+FICLONE: int = 0x40049409
+""" The Linux ioctl request for cloning a file (see ioctl_ficlone(2)). """
+
+COPY_FILE_RANGE_CHUNK_SIZE: int = 1024 * 1024 * 1024
+""" The maximum number of bytes to request in a single copy_file_range(2) call. """
+
+_reflink_devices: typing.Dict[typing.Tuple[int, int], bool] = {}
+""" Pairs of devices (source and dest st_dev) that we have tried to reflink between, and if it worked. """
+
+def copy_contents(source: str, dest: str,
+        link_mode: str = DEFAULT_LINK_MODE,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        ) -> None:
+    """
+    Copy a file or the contents of a directory (excluding the top-level directory itself) into a destination.
+    Works like edq.util.dirent.copy_contents(), but files are copied according to the link mode.
+    """
+
+    _check_link_mode(link_mode)
+
+    if (edq.util.dirent.same(source, dest)):
+        raise ValueError(f"Source and destination of contents copy cannot be the same: '{source}'.")
+
+    if (edq.util.dirent.exists(dest) and (not os.path.isdir(dest))):
+        raise ValueError(f"Destination of contents copy exists and is not a dir: '{dest}'.")
+
+    if (os.path.isfile(source) or os.path.islink(source)):
+        pairs = [(source, os.path.join(dest, os.path.basename(source)))]
+    elif (os.path.isdir(source)):
+        pairs = [(os.path.join(source, child), os.path.join(dest, child)) for child in sorted(os.listdir(source))]
+    else:
+        raise ValueError(f"Source of contents copy is not a dir, file, or link: '{source}'.")
+
+    edq.util.dirent.mkdir(dest)
+
+    _copy_all(pairs, link_mode, max_workers)
+
+def copy(source: str, dest: str,
+        link_mode: str = DEFAULT_LINK_MODE,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        ) -> None:
+    """
+    Copy a dirent to a destination (which will be overwritten).
+    Works like edq.util.dirent.copy(), but files are copied according to the link mode.
+    """
+
+    _check_link_mode(link_mode)
+    _copy_all([(source, dest)], link_mode, max_workers)
+
+def _check_link_mode(link_mode: str) -> None:
+    if (link_mode not in LINK_MODES):
+        raise ValueError(f"Unknown link mode '{link_mode}', expected one of: {LINK_MODES}.")
+
+def _copy_all(pairs: typing.List[typing.Tuple[str, str]], link_mode: str, max_workers: int) -> None:
+    """
+    Copy each (source, dest) pair (see copy()).
+    All dirs and links are created first, then all files are copied, and finally dir metadata is copied.
+    """
+
+    files: typing.List[typing.Tuple[str, str]] = []
+    dirs: typing.List[typing.Tuple[str, str]] = []
+
+    for (source, dest) in pairs:
+        source = os.path.abspath(source)
+        dest = os.path.abspath(dest)
+
+        if (edq.util.dirent.same(source, dest)):
+            continue
+
+        if (not edq.util.dirent.exists(source)):
+            raise ValueError(f"Source of copy does not exist: '{source}'.")
+
+        if (edq.util.dirent.contains_path(source, dest)):
+            raise ValueError(f"Source of copy cannot contain the destination. Source: '{source}', Destination: '{dest}'.")
+
+        if (edq.util.dirent.contains_path(dest, source)):
+            raise ValueError(f"Destination of copy cannot contain the source. Destination: '{dest}', Source: '{source}'.")
+
+        edq.util.dirent.remove(dest)
+        edq.util.dirent.mkdir(os.path.dirname(dest))
+
+        _copy_structure(source, dest, files, dirs)
+
+    if ((max_workers > 1) and (len(files) >= MIN_PARALLEL_FILES)):
+        with concurrent.futures.ThreadPoolExecutor(max_workers = max_workers) as executor:
+            futures = [executor.submit(_copy_file, source, dest, link_mode) for (source, dest) in files]
+
+            for future in futures:
+                future.result()
+    else:
+        for (source, dest) in files:
+            _copy_file(source, dest, link_mode)
+
+    # Children are done, so dir times will not change again.
+    for (source, dest) in reversed(dirs):
+        shutil.copystat(source, dest)
+
+def _copy_structure(
+        source: str,
+        dest: str,
+        files: typing.List[typing.Tuple[str, str]],
+        dirs: typing.List[typing.Tuple[str, str]],
+        ) -> None:
+    """
+    Recursively create the dirs and links of a dirent at a destination that does not exist,
+    and collect the files (and dirs) that still need to be copied.
+    """
+
+    if (os.path.islink(source)):
+        os.symlink(os.readlink(source), dest)
+    elif (os.path.isfile(source)):
+        files.append((source, dest))
+    elif (os.path.isdir(source)):
+        os.mkdir(dest)
+        dirs.append((source, dest))
+
+        for child in sorted(os.listdir(source)):
+            _copy_structure(os.path.join(source, child), os.path.join(dest, child), files, dirs)
+    else:
+        raise ValueError(f"Source of copy is not a dir, file, or link: '{source}'.")
+
+def _copy_file(source: str, dest: str, link_mode: str) -> None:
+    """ Copy a single file to a destination that does not exist. """
+
+    if (link_mode == LINK_MODE_HARDLINK):
+        try:
+            os.link(source, dest)
+            return
+        except OSError:
+            pass
+    elif (link_mode == LINK_MODE_REFLINK):
+        if (_reflink(source, dest)):
+            shutil.copystat(source, dest)
+            return
+
+    if (_copy_file_range(source, dest)):
+        shutil.copystat(source, dest)
+        return
+
+    shutil.copy2(source, dest, follow_symlinks = False)
+
+def _copy_file_range(source: str, dest: str) -> bool:
+    """
+    Try to copy a file's data inside the kernel.
+    Return true on success.
+    On failure, no file will be left at the destination.
+    """
+
+    if (not hasattr(os, 'copy_file_range')):
+        return False
+
+    try:
+        with open(source, 'rb') as source_file:
+            with open(dest, 'wb') as dest_file:
+                size = os.fstat(source_file.fileno()).st_size
+                copied = 0
+
+                while (copied < size):
+                    count = os.copy_file_range(source_file.fileno(), dest_file.fileno(), min(size - copied, COPY_FILE_RANGE_CHUNK_SIZE))
+                    if (count == 0):
+                        break
+
+                    copied += count
+    except OSError:
+        edq.util.dirent.remove(dest)
+        return False
+
+    # Some file systems (e.g., procfs) report the wrong size or copy nothing, so let a normal copy handle them.
+    if (copied != size):
+        edq.util.dirent.remove(dest)
+        return False
+
+    return True
+
+def _reflink(source: str, dest: str) -> bool:
+    """
+    Try to clone a file as a reflink.
+    Return true on success.
+    On failure, no file will be left at the destination.
+    """
+
+    if (not sys.platform.startswith('linux')):
+        return False
+
+    device = (os.stat(source).st_dev, os.stat(os.path.dirname(os.path.abspath(dest))).st_dev)
+    if (not _reflink_devices.get(device, True)):
+        return False
+
+    import fcntl  # pylint: disable=import-outside-toplevel
+
+    try:
+        with open(source, 'rb') as source_file:
+            with open(dest, 'wb') as dest_file:
+                fcntl.ioctl(dest_file.fileno(), FICLONE, source_file.fileno())
+    except OSError:
+        edq.util.dirent.remove(dest)
+        _reflink_devices[device] = False
+        return False
+
+    _reflink_devices[device] = True
+    return True
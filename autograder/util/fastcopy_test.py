@@ -0,0 +1,117 @@
+import os
+
+import edq.testing.unittest
+import edq.util.dirent
+
+import autograder.util.fastcopy
+
+class TestFastCopy(edq.testing.unittest.BaseTest):
+    """ Test copying dirents with different link modes. """
+
+    def _make_source(self, base_dir: str) -> str:
+        source_dir = os.path.join(base_dir, 'source')
+
+        edq.util.dirent.mkdir(os.path.join(source_dir, 'nested', 'empty'))
+        edq.util.dirent.write_file(os.path.join(source_dir, 'a.txt'), 'A')
+        edq.util.dirent.write_file(os.path.join(source_dir, 'nested', 'b.txt'), 'B')
+        os.symlink('a.txt', os.path.join(source_dir, 'link.txt'))
+
+        return source_dir
+
+    def test_copy_contents_base(self) -> None:
+        """ Test that every link mode produces the same tree. """
+
+        for link_mode in autograder.util.fastcopy.LINK_MODES:
+            with self.subTest(msg = link_mode):
+                temp_dir = edq.util.dirent.get_temp_dir('autograder-test-fastcopy-')
+                source_dir = self._make_source(temp_dir)
+                dest_dir = os.path.join(temp_dir, 'dest')
+
+                autograder.util.fastcopy.copy_contents(source_dir, dest_dir, link_mode = link_mode)
+
+                self.assertEqual('A', edq.util.dirent.read_file(os.path.join(dest_dir, 'a.txt')))
+                self.assertEqual('B', edq.util.dirent.read_file(os.path.join(dest_dir, 'nested', 'b.txt')))
+                self.assertTrue(os.path.isdir(os.path.join(dest_dir, 'nested', 'empty')))
+                self.assertEqual('a.txt', os.readlink(os.path.join(dest_dir, 'link.txt')))
+
+                is_hardlink = os.path.samefile(os.path.join(source_dir, 'a.txt'), os.path.join(dest_dir, 'a.txt'))
+                self.assertEqual((link_mode == autograder.util.fastcopy.LINK_MODE_HARDLINK), is_hardlink)
+
+    def test_copy_independent(self) -> None:
+        """ Test that copies (and reflinks) can be modified without changing the source. """
+
+        for link_mode in [autograder.util.fastcopy.LINK_MODE_COPY, autograder.util.fastcopy.LINK_MODE_REFLINK]:
+            with self.subTest(msg = link_mode):
+                temp_dir = edq.util.dirent.get_temp_dir('autograder-test-fastcopy-')
+                source_path = os.path.join(self._make_source(temp_dir), 'a.txt')
+                dest_path = os.path.join(temp_dir, 'a.txt')
+
+                autograder.util.fastcopy.copy(source_path, dest_path, link_mode = link_mode)
+                edq.util.dirent.write_file(dest_path, 'Z')
+
+                self.assertEqual('A', edq.util.dirent.read_file(source_path))
+                self.assertEqual('Z', edq.util.dirent.read_file(dest_path))
+
+    def test_copy_errors(self) -> None:
+        """ Test bad copies. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-fastcopy-')
+
+        with self.assertRaisesRegex(ValueError, 'Unknown link mode'):
+            autograder.util.fastcopy.copy(temp_dir, os.path.join(temp_dir, 'dest'), link_mode = 'zzz')
+
+        with self.assertRaisesRegex(ValueError, 'does not exist'):
+            autograder.util.fastcopy.copy(os.path.join(temp_dir, 'missing'), os.path.join(temp_dir, 'dest'))
+
+        with self.assertRaisesRegex(ValueError, 'cannot contain the destination'):
+            autograder.util.fastcopy.copy(temp_dir, os.path.join(temp_dir, 'dest'))
+
+        with self.assertRaisesRegex(ValueError, 'cannot be the same'):
+            autograder.util.fastcopy.copy_contents(temp_dir, temp_dir)
+
+    def test_copy_many_files(self) -> None:
+        """ Test copying trees with enough files to copy them in parallel. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-fastcopy-')
+        source_dir = os.path.join(temp_dir, 'source')
+
+        for i in range(3):
+            edq.util.dirent.mkdir(os.path.join(source_dir, f"dir-{i}"))
+
+        expected = {}
+        for i in range(autograder.util.fastcopy.MIN_PARALLEL_FILES * 2):
+            path = os.path.join(f"dir-{i % 3}", f"{i:03d}.txt")
+            expected[path] = str(i) * (i + 1)
+            edq.util.dirent.write_file(os.path.join(source_dir, path), expected[path])
+
+        os.chmod(os.path.join(source_dir, 'dir-0', '000.txt'), 0o755)
+
+        for link_mode in autograder.util.fastcopy.LINK_MODES:
+            for max_workers in [1, 4]:
+                with self.subTest(link_mode = link_mode, max_workers = max_workers):
+                    dest_dir = os.path.join(temp_dir, f"dest-{link_mode}-{max_workers}")
+                    autograder.util.fastcopy.copy(source_dir, dest_dir, link_mode = link_mode, max_workers = max_workers)
+
+                    for (path, contents) in expected.items():
+                        self.assertEqual(contents, edq.util.dirent.read_file(os.path.join(dest_dir, path)))
+
+                    self.assertEqual(0o755, os.stat(os.path.join(dest_dir, 'dir-0', '000.txt')).st_mode & 0o777)
+
+    def test_copy_file_range(self) -> None:
+        """ Test copying a file's data in the kernel. """
+
+        if (not hasattr(os, 'copy_file_range')):
+            self.skipTest('copy_file_range() is not available.')
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-fastcopy-')
+        source_path = os.path.join(temp_dir, 'source.bin')
+        dest_path = os.path.join(temp_dir, 'dest.bin')
+
+        content = os.urandom(1024 * 1024 + 7)
+        with open(source_path, 'wb') as file:
+            file.write(content)
+
+        self.assertTrue(autograder.util.fastcopy._copy_file_range(source_path, dest_path))
+
+        with open(dest_path, 'rb') as file:
+            self.assertEqual(content, file.read())
@@ -0,0 +1,378 @@
+"""
+A local cache for remote (git and URL) filespecs, so preparing a grading dir does not have to hit the network every time.
+
+Git repos are kept as bare mirrors (one per repo URL).
+Each copy is a cheap local clone of the mirror (objects are hard linked when possible) checked out at the requested reference.
+A reference that is a full commit hash is served straight from the mirror once the mirror has it.
+
+URL bodies are stored by the hash of their content (so identical files are only stored once),
+and are indexed by URL along with the validators (ETag and Last-Modified) needed to cheaply revalidate them.
+
+Entries are trusted for `refresh_sec` after they were last fetched/revalidated, after which they are refreshed on their next use.
+If a refresh fails (e.g., the network is down), the stale entry is used.
+In cache-only mode, nothing is ever fetched (e.g., for offline grading nodes) and only existing entries are used.
+
+Entries that have not been used in `max_age_sec` are evicted,
+and the least recently used entries are evicted while the cache is larger than `max_bytes`.
+"""
+
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import typing
+import uuid
+
+import edq.util.dirent
+import edq.util.hash
+import edq.util.json
+import git
+
+import autograder.util.net
+
+DEFAULT_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), 'autograder-py-filespecs')
+DEFAULT_REFRESH_SEC: float = 5 * 60
+DEFAULT_MAX_AGE_SEC: float = 7 * 24 * 60 * 60
+DEFAULT_MAX_BYTES: int = 4 * 1024 * 1024 * 1024
+
+CACHE_VERSION: int = 1
+
+GIT_DIRNAME: str = 'git'
+URL_DIRNAME: str = 'url'
+BLOB_DIRNAME: str = 'blobs'
+META_EXTENSION: str = '.json'
+
+_COMMIT_HASH: typing.Pattern = re.compile(r'^[0-9a-f]{40}$', flags = re.IGNORECASE)
+
+_logger = logging.getLogger(__name__)
+
+class FileSpecCache:
+    """ A local cache for git and URL filespecs (see the module docs). """
+
+    def __init__(self,
+            cache_dir: str = DEFAULT_CACHE_DIR,
+            refresh_sec: float = DEFAULT_REFRESH_SEC,
+            max_age_sec: float = DEFAULT_MAX_AGE_SEC,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+            cache_only: bool = False,
+            ) -> None:
+        self.cache_dir: str = os.path.abspath(cache_dir)
+        """ Where cached entries are stored. """
+
+        self.refresh_sec: float = refresh_sec
+        """ How long after an entry was fetched/revalidated it is used without checking the remote. """
+
+        self.max_age_sec: float = max_age_sec
+        """ Entries that have not been used for this long are evicted. """
+
+        self.max_bytes: int = max_bytes
+        """ The least recently used entries are evicted while the cache is larger than this. """
+
+        self.cache_only: bool = cache_only
+        """ Never fetch anything, only use entries that are already cached. """
+
+    def copy_git(self,
+            url: str,
+            dest_path: str,
+            reference: typing.Union[str, None] = None,
+            username: typing.Union[str, None] = None,
+            token: typing.Union[str, None] = None,
+            ) -> None:
+        """
+        Clone a repo (from its mirror) into the destination, and check out the reference (or the default branch).
+        The clone's origin will point to the original repo URL.
+        """
+
+        key = _get_key(url)
+        mirror_path = os.path.join(self.cache_dir, GIT_DIRNAME, key + '.git')
+        meta_path = os.path.join(self.cache_dir, GIT_DIRNAME, key + META_EXTENSION)
+        auth_url = _get_auth_url(url, username, token)
+
+        meta = _read_meta(meta_path)
+        is_new = False
+
+        if ((meta is None) or (not os.path.isdir(mirror_path))):
+            if (self.cache_only):
+                raise ValueError(f"Git repo is not cached (and the cache is in cache-only mode): '{url}'.")
+
+            self._create_mirror(auth_url, mirror_path)
+            meta = {'version': CACHE_VERSION, 'url': url, 'fetch_time': time.time()}
+            is_new = True
+        elif (self._needs_refresh(meta) and (not _has_commit(mirror_path, reference))):
+            try:
+                git.Repo(mirror_path).git.remote('update', '--prune')
+                meta['fetch_time'] = time.time()
+            except Exception as ex:
+                _logger.warning("Failed to update git mirror for '%s', using the cached copy: '%s'.", url, ex)
+
+        _write_meta(meta_path, meta)
+
+        repo = git.Repo.clone_from(mirror_path, dest_path)
+        repo.remotes.origin.set_url(auth_url)
+
+        if (reference is not None):
+            repo.git.checkout(reference)
+
+        if (is_new):
+            self.evict()
+
+    def copy_url(self, url: str, dest_path: str, checksum: typing.Union[str, None] = None) -> None:
+        """
+        Copy the body of a URL into the destination (as the exact bytes that were served).
+        If a checksum is given (see autograder.util.net.parse_checksum()),
+        then a cached body that does not match it is fetched again, and a fetched body must match it.
+        """
+
+        key = _get_key(url)
+        meta_path = os.path.join(self.cache_dir, URL_DIRNAME, key + META_EXTENSION)
+
+        meta = _read_meta(meta_path)
+        if ((meta is not None) and (not os.path.isfile(self._get_blob_path(meta['blob'])))):
+            meta = None
+
+        if ((meta is not None) and (checksum is not None) and (not self._matches_checksum(meta['blob'], checksum))):
+            if (self.cache_only):
+                raise ValueError(f"Cached URL does not match its checksum (and the cache is in cache-only mode): '{url}'.")
+
+            meta = None
+
+        is_new = False
+
+        if (meta is None):
+            if (self.cache_only):
+                raise ValueError(f"URL is not cached (and the cache is in cache-only mode): '{url}'.")
+
+            meta = self._fetch_url(url, None, checksum)
+            is_new = True
+        elif (self._needs_refresh(meta)):
+            try:
+                new_meta = self._fetch_url(url, meta, checksum)
+                is_new = (new_meta['blob'] != meta['blob'])
+                meta = new_meta
+            except Exception as ex:
+                _logger.warning("Failed to revalidate '%s', using the cached copy: '%s'.", url, ex)
+
+        _write_meta(meta_path, meta)
+
+        edq.util.dirent.mkdir(os.path.dirname(dest_path))
+        shutil.copyfile(self._get_blob_path(meta['blob']), dest_path)
+
+        if (is_new):
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove entries that have not been used recently enough (see max_age_sec),
+        and then the least recently used entries until the cache fits (see max_bytes).
+        """
+
+        # [(last used, size, [paths, ...]), ...]
+        entries: typing.List[typing.Tuple[float, int, typing.List[str]]] = []
+
+        # {blob: size, ...}
+        blob_sizes: typing.Dict[str, int] = {}
+        blob_dir = os.path.join(self.cache_dir, BLOB_DIRNAME)
+        if (os.path.isdir(blob_dir)):
+            for blob in os.listdir(blob_dir):
+                blob_sizes[blob] = _get_size(os.path.join(blob_dir, blob))
+
+        git_dir = os.path.join(self.cache_dir, GIT_DIRNAME)
+        for meta_path in _list_meta_paths(git_dir):
+            mirror_path = meta_path[:-len(META_EXTENSION)] + '.git'
+            entries.append((os.path.getmtime(meta_path), _get_size(mirror_path), [meta_path, mirror_path]))
+
+        # Blobs are removed once no URL uses them, so they count against the first URL that uses them.
+        url_blobs: typing.Dict[str, str] = {}
+        counted_blobs = set()
+
+        url_dir = os.path.join(self.cache_dir, URL_DIRNAME)
+        for meta_path in _list_meta_paths(url_dir):
+            meta = _read_meta(meta_path)
+            blob = '' if (meta is None) else meta.get('blob', '')
+
+            size = 0
+            if (blob not in counted_blobs):
+                size = blob_sizes.get(blob, 0)
+                counted_blobs.add(blob)
+
+            url_blobs[meta_path] = blob
+            entries.append((os.path.getmtime(meta_path), size, [meta_path]))
+
+        entries.sort()
+        total_bytes = sum(entry[1] for entry in entries)
+        now = time.time()
+
+        kept_meta_paths = set()
+        for (last_used, size, paths) in entries:
+            if (((now - last_used) > self.max_age_sec) or (total_bytes > self.max_bytes)):
+                for path in paths:
+                    edq.util.dirent.remove(path)
+
+                total_bytes -= size
+            else:
+                kept_meta_paths.add(paths[0])
+
+        used_blobs = {blob for (meta_path, blob) in url_blobs.items() if (meta_path in kept_meta_paths)}
+        for blob in blob_sizes:
+            if (blob not in used_blobs):
+                edq.util.dirent.remove(os.path.join(blob_dir, blob))
+
+    def _needs_refresh(self, meta: typing.Dict[str, typing.Any]) -> bool:
+        if (self.cache_only):
+            return False
+
+        return ((time.time() - meta.get('fetch_time', 0)) > self.refresh_sec)
+
+    def _create_mirror(self, auth_url: str, mirror_path: str) -> None:
+        """ Create a mirror in a temp location and move it into place once it is complete. """
+
+        edq.util.dirent.mkdir(os.path.dirname(mirror_path))
+
+        temp_path = f"{mirror_path}.{uuid.uuid4().hex}.tmp"
+
+        try:
+            git.Repo.clone_from(auth_url, temp_path, mirror = True)
+            os.rename(temp_path, mirror_path)
+        except OSError:
+            # Someone else may have finished the same mirror first.
+            if (not os.path.isdir(mirror_path)):
+                raise
+        finally:
+            edq.util.dirent.remove(temp_path)
+
+    def _fetch_url(self,
+            url: str,
+            meta: typing.Union[typing.Dict[str, typing.Any], None],
+            checksum: typing.Union[str, None] = None,
+            ) -> typing.Dict[str, typing.Any]:
+        """
+        Fetch a URL (conditionally, if there is an existing entry) and return the new entry's metadata.
+        The body is streamed into the blob dir and stored (by content) before the metadata is returned.
+        """
+
+        headers = {}
+        if (meta is not None):
+            if (meta.get('etag') is not None):
+                headers['If-None-Match'] = meta['etag']
+
+            if (meta.get('last_modified') is not None):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        blob_dir = os.path.join(self.cache_dir, BLOB_DIRNAME)
+        temp_path = os.path.join(blob_dir, f"{uuid.uuid4().hex}.tmp")
+
+        try:
+            response, blob = autograder.util.net.download(url, temp_path,
+                    checksum = checksum, headers = headers, raise_for_status = False)
+
+            if ((meta is not None) and (response.status_code == 304)):
+                meta = dict(meta)
+                meta['fetch_time'] = time.time()
+                return meta
+
+            response.raise_for_status()
+            if (blob is None):
+                raise ValueError(f"Unexpected response ({response.status_code}) when fetching URL: '{url}'.")
+
+            blob_path = self._get_blob_path(blob)
+            if (not os.path.isfile(blob_path)):
+                os.replace(temp_path, blob_path)
+        finally:
+            if (os.path.exists(temp_path)):
+                os.remove(temp_path)
+
+        return {
+            'version': CACHE_VERSION,
+            'url': url,
+            'blob': blob,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetch_time': time.time(),
+        }
+
+    def _matches_checksum(self, blob: str, checksum: str) -> bool:
+        algorithm, digest = autograder.util.net.parse_checksum(checksum)
+
+        # Blobs are already named by their sha256.
+        if (algorithm == 'sha256'):
+            return (blob == digest)
+
+        return (autograder.util.net.compute_checksum(self._get_blob_path(blob), algorithm) == digest)
+
+    def _get_blob_path(self, blob: str) -> str:
+        return os.path.join(self.cache_dir, BLOB_DIRNAME, blob)
+
+def _get_key(url: str) -> str:
+    return edq.util.hash.sha256_hex(url)
+
+def _get_auth_url(url: str, username: typing.Union[str, None], token: typing.Union[str, None]) -> str:
+    """ Add credentials to a repo URL (the same way edq.util.git.clone() does). """
+
+    if (username is None):
+        return url
+
+    if (token is None):
+        raise ValueError("If username is specified, a token must also be specified.")
+
+    return re.sub(r'(http(s?)://)', rf"\1{username}:{token}@", url)
+
+def _has_commit(mirror_path: str, reference: typing.Union[str, None]) -> bool:
+    """ Check if a reference is a full commit hash that the mirror already has (commits never change). """
+
+    if ((reference is None) or (_COMMIT_HASH.match(reference) is None)):
+        return False
+
+    try:
+        git.Repo(mirror_path).git.cat_file('-e', f"{reference}^{{commit}}")
+    except git.GitCommandError:
+        return False
+
+    return True
+
+def _read_meta(path: str) -> typing.Union[typing.Dict[str, typing.Any], None]:
+    """ Read an entry's metadata, None if the entry does not exist or is from an older version of the cache. """
+
+    if (not os.path.isfile(path)):
+        return None
+
+    try:
+        meta: typing.Dict[str, typing.Any] = edq.util.json.load_path(path)
+    except Exception:
+        return None
+
+    if (meta.get('version') != CACHE_VERSION):
+        return None
+
+    return meta
+
+def _write_meta(path: str, meta: typing.Dict[str, typing.Any]) -> None:
+    """ Atomically write an entry's metadata (which also marks the entry as just used). """
+
+    edq.util.dirent.mkdir(os.path.dirname(path))
+
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    edq.util.json.dump_path(meta, temp_path)
+    os.replace(temp_path, path)
+
+def _list_meta_paths(dirpath: str) -> typing.List[str]:
+    if (not os.path.isdir(dirpath)):
+        return []
+
+    return [os.path.join(dirpath, name) for name in sorted(os.listdir(dirpath)) if name.endswith(META_EXTENSION)]
+
+def _get_size(path: str) -> int:
+    """ Get the total size of a file or dir. """
+
+    if (not os.path.isdir(path)):
+        return os.path.getsize(path) if os.path.isfile(path) else 0
+
+    size = 0
+    for (dirpath, _, filenames) in os.walk(path):
+        for filename in filenames:
+            child_path = os.path.join(dirpath, filename)
+            if (not os.path.islink(child_path)):
+                size += os.path.getsize(child_path)
+
+    return size
@@ -0,0 +1,145 @@
+import functools
+import http.server
+import os
+import threading
+import typing
+
+import edq.testing.unittest
+import edq.util.dirent
+import git
+
+import autograder.filespec
+import autograder.util.filespeccache
+
+class TestFileSpecCache(edq.testing.unittest.BaseTest):
+    """ Test caching remote filespecs. """
+
+    def test_git_base(self) -> None:
+        """ Test serving git filespecs from a mirror. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-filespec-cache-')
+        source_path = os.path.join(temp_dir, 'source')
+        cache_dir = os.path.join(temp_dir, 'cache')
+
+        source = git.Repo.init(source_path)
+        first_commit = _commit(source, 'a.txt', 'A')
+
+        cache = autograder.util.filespeccache.FileSpecCache(cache_dir)
+        spec = autograder.filespec.get_git(source_path, dest = 'repo')
+
+        dest_dir = os.path.join(temp_dir, 'dest-1')
+        autograder.filespec.copy(spec, '', dest_dir, False, cache = cache)
+        self.assertEqual('A', edq.util.dirent.read_file(os.path.join(dest_dir, 'repo', 'a.txt')))
+        self.assertEqual(source_path, git.Repo(os.path.join(dest_dir, 'repo')).remotes.origin.url)
+
+        second_commit = _commit(source, 'a.txt', 'B')
+
+        # The mirror is trusted until it needs a refresh.
+        dest_dir = os.path.join(temp_dir, 'dest-2')
+        autograder.filespec.copy(spec, '', dest_dir, False, cache = cache)
+        self.assertEqual('A', edq.util.dirent.read_file(os.path.join(dest_dir, 'repo', 'a.txt')))
+
+        cache.refresh_sec = 0
+
+        dest_dir = os.path.join(temp_dir, 'dest-3')
+        autograder.filespec.copy(spec, '', dest_dir, False, cache = cache)
+        self.assertEqual('B', edq.util.dirent.read_file(os.path.join(dest_dir, 'repo', 'a.txt')))
+
+        # Pinned references.
+        for (reference, expected) in [(first_commit, 'A'), (second_commit, 'B')]:
+            with self.subTest(reference = reference):
+                dest_dir = edq.util.dirent.get_temp_path(prefix = 'autograder-test-filespec-cache-dest-')
+                spec = autograder.filespec.get_git(source_path, dest = 'repo', reference = reference)
+                autograder.filespec.copy(spec, '', dest_dir, False, cache = cache)
+
+                self.assertEqual(expected, edq.util.dirent.read_file(os.path.join(dest_dir, 'repo', 'a.txt')))
+                self.assertEqual(reference, git.Repo(os.path.join(dest_dir, 'repo')).head.commit.hexsha)
+
+        # Offline.
+        offline_cache = autograder.util.filespeccache.FileSpecCache(cache_dir, cache_only = True)
+        edq.util.dirent.remove(source_path)
+
+        dest_dir = os.path.join(temp_dir, 'dest-4')
+        autograder.filespec.copy(autograder.filespec.get_git(source_path, dest = 'repo'), '', dest_dir, False, cache = offline_cache)
+        self.assertEqual('B', edq.util.dirent.read_file(os.path.join(dest_dir, 'repo', 'a.txt')))
+
+        with self.assertRaisesRegex(autograder.filespec.FileSpecError, 'not cached'):
+            autograder.filespec.copy(autograder.filespec.get_git(source_path + '-missing'), '', dest_dir, False, cache = offline_cache)
+
+    def test_url_base(self) -> None:
+        """ Test storing and revalidating URL filespecs. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-filespec-cache-')
+        serve_dir = os.path.join(temp_dir, 'serve')
+        cache_dir = os.path.join(temp_dir, 'cache')
+
+        edq.util.dirent.mkdir(serve_dir)
+        edq.util.dirent.write_file(os.path.join(serve_dir, 'a.txt'), 'A')
+        edq.util.dirent.write_file(os.path.join(serve_dir, 'b.txt'), 'A')
+
+        requests: typing.List[str] = []
+        server = _start_server(serve_dir, requests)
+
+        try:
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            cache = autograder.util.filespeccache.FileSpecCache(cache_dir)
+
+            def fetch(name: str, test_cache: autograder.util.filespeccache.FileSpecCache = cache) -> str:
+                dest_dir = edq.util.dirent.get_temp_path(prefix = 'autograder-test-filespec-cache-dest-')
+                autograder.filespec.copy(autograder.filespec.get_url(f"{base_url}/{name}"), '', dest_dir, False, cache = test_cache)
+                return edq.util.dirent.read_file(os.path.join(dest_dir, name))
+
+            self.assertEqual('A', fetch('a.txt'))
+            self.assertEqual(['200'], requests)
+
+            # Fresh entries are not checked.
+            self.assertEqual('A', fetch('a.txt'))
+            self.assertEqual(['200'], requests)
+
+            # Stale entries are revalidated.
+            cache.refresh_sec = -1
+            self.assertEqual('A', fetch('a.txt'))
+            self.assertEqual(['200', '304'], requests)
+
+            # Identical bodies are only stored once.
+            self.assertEqual('A', fetch('b.txt'))
+            self.assertEqual(1, len(os.listdir(os.path.join(cache_dir, autograder.util.filespeccache.BLOB_DIRNAME))))
+
+            # Offline.
+            offline_cache = autograder.util.filespeccache.FileSpecCache(cache_dir, cache_only = True)
+            self.assertEqual('A', fetch('a.txt', offline_cache))
+            self.assertEqual(['200', '304', '200'], requests)
+
+            with self.assertRaisesRegex(autograder.filespec.FileSpecError, 'not cached'):
+                fetch('missing.txt', offline_cache)
+
+            # Evict everything (by age).
+            cache.max_age_sec = -1
+            cache.evict()
+
+            self.assertEqual([], os.listdir(os.path.join(cache_dir, autograder.util.filespeccache.URL_DIRNAME)))
+            self.assertEqual([], os.listdir(os.path.join(cache_dir, autograder.util.filespeccache.BLOB_DIRNAME)))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+def _commit(repo: git.Repo, filename: str, contents: str) -> str:
+    edq.util.dirent.write_file(os.path.join(str(repo.working_dir), filename), contents)
+    repo.index.add([filename])
+
+    author = git.Actor('Test', 'test@example.com')
+    return str(repo.index.commit(f"Set {filename}.", author = author, committer = author).hexsha)
+
+def _start_server(serve_dir: str, requests: typing.List[str]) -> http.server.ThreadingHTTPServer:
+    """ Serve a dir (with Last-Modified support) and record the status of each response. """
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        """ A quiet handler that records statuses. """
+
+        def log_request(self, code: typing.Any = '-', size: typing.Any = '-') -> None:
+            requests.append(str(int(code)))
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory = serve_dir))
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    return server
@@ -1,13 +1,46 @@
+import io
 import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import signal
 import sys
 import time
 import traceback
 import typing
 
+import autograder.util.resources
+
 REAP_TIME_SEC: float = 5
 
+POLL_INTERVAL_SEC: float = 0.1
+""" The longest a pool will wait before checking on its busy workers again. """
+
+CLOSE_TIME_SEC: float = 1
+""" How long a pool will wait for an idle worker to exit on its own before killing it. """
+
+EXPLICIT_EXIT_MESSAGE: str = 'Code explicitly exited (like via sys.exit()).'
+KILLED_MESSAGE: str = 'Code was killed by a signal ({signal}).'
+
+DEFAULT_POOL_SIZE: int = 1
+DEFAULT_POOL_MAX_TASKS: typing.Union[int, None] = None
+
 _multiprocessing_initialized: bool = False  # pylint: disable=invalid-name
 
+class CPUTimeoutError(RuntimeError):
+    """
+    This error indicates that a function used more CPU time than it was allowed (see with_timeout()).
+    """
+
+    def __init__(self, cpu_timeout: float) -> None:
+        self.cpu_timeout: float = cpu_timeout
+        """ The CPU time (in seconds) that was allowed. """
+
+        super().__init__(cpu_timeout)
+
+    def __str__(self) -> str:
+        return f"Used more than {self.cpu_timeout:g} seconds of CPU time."
+
 def _init_multiprocessing() -> None:
     """
     Initialize Python multiprocessing.
@@ -19,78 +52,700 @@ def _init_multiprocessing() -> None:
     if (_multiprocessing_initialized):
         return
 
-    multiprocessing.set_start_method('fork')
+    # Processes started by multiprocessing (e.g., a server running in a child process) already have a start method.
+    if (multiprocessing.get_start_method(allow_none = True) != 'fork'):
+        multiprocessing.set_start_method('fork')
+
     _multiprocessing_initialized = True
 
-def with_timeout(timeout: typing.Union[float, None], function: typing.Callable) -> typing.Tuple[bool, typing.Any]:
+def runs_in_process(timeout: typing.Union[float, None]) -> bool:
+    """
+    Check if functions run with this timeout (see with_timeout() and WorkerPool.start())
+    will be run on the calling process (instead of in a separate process).
+    """
+
+    return ((timeout is None) or (not sys.platform.startswith('linux')))
+
+def with_timeout(
+        timeout: typing.Union[float, None],
+        function: typing.Callable,
+        pool: typing.Union['WorkerPool', None] = None,
+        limits: typing.Union[autograder.util.resources.ResourceLimits, None] = None,
+        cpu_timeout: typing.Union[float, None] = None,
+        ) -> typing.Tuple[bool, typing.Any]:
     """
     Run the given function in a different process with the given timeout.
     If the timeout is None, then no timeout will be checked (and the code will be run on the same process).
+    If a pool is given, then the function will be run on one of the pool's (possibly reused) workers
+    instead of a brand new process.
+    If limits are given, they will be applied to the process before the function is run
+    (limits are ignored when the function is run on the same process).
+    If a CPU timeout is given, the function will also be stopped once its process has used that much CPU time
+    (the normal timeout still applies as a wall-clock backstop).
+    Only the CPU time of the process running the function is counted (not any processes it starts).
 
     Return: (success, function return value)
     On timeout, success will be false and the value will be None.
+    On CPU timeout, success will be false and the value will be a CPUTimeoutError.
+    On exceeding a limit, success will be false and the value will be an autograder.util.resources.ResourceLimitError.
     On error, success will be false and value will be the string stacktrace.
     On successful completion, success will be true and value may be None (if nothing was returned).
     """
 
-    if ((timeout is None) or (not sys.platform.startswith('linux'))):
+    if (runs_in_process(timeout)):
         # Mac and Windows have some pickling issues with multiprocessing.
         # Just run them without a timeout.
         # Any autograder will be run on a Linux machine and will be safe.
         start_time = time.time()
+        start_cpu_time = time.process_time()
         value = function()
         runtime = time.time() - start_time
+        cpu_time = time.process_time() - start_cpu_time
 
         if ((timeout is not None) and (runtime > timeout)):
             return (False, None)
 
+        if ((cpu_timeout is not None) and (cpu_time > cpu_timeout)):
+            return (False, CPUTimeoutError(cpu_timeout))
+
         return (True, value)
 
+    if (pool is not None):
+        return pool.run(timeout, function, limits = limits, cpu_timeout = cpu_timeout)
+
     _init_multiprocessing()
 
-    result: multiprocessing.Queue = multiprocessing.Queue(1)
+    # The result is sent back over a pipe that we drain while waiting,
+    # so a large result cannot block the child (and look like a timeout).
+    parent_connection, child_connection = multiprocessing.Pipe(duplex = False)
 
     # Note that we use processes instead of threads so they can be more completely killed.
-    process = multiprocessing.Process(target = _invoke_helper, args = (result, function))
+    process = multiprocessing.Process(target = _invoke_helper, args = (child_connection, function, limits))
     process.start()
 
-    # Wait for at most the timeout.
-    process.join(timeout)
+    # Close the child's end in this process so a dead child will be seen as EOF.
+    child_connection.close()
+
+    try:
+        return _receive_result(process, parent_connection, typing.cast(float, timeout), limits, cpu_timeout)
+    finally:
+        parent_connection.close()
+
+def _receive_result(
+        process: multiprocessing.Process,
+        connection: multiprocessing.connection.Connection,
+        timeout: float,
+        limits: typing.Union[autograder.util.resources.ResourceLimits, None],
+        cpu_timeout: typing.Union[float, None],
+        ) -> typing.Tuple[bool, typing.Any]:
+    """ Wait (for at most the timeout) for a process started by with_timeout() to send its result. """
+
+    deadline = time.monotonic() + timeout
+    cpu_deadline = None
+    if (cpu_timeout is not None):
+        cpu_deadline = _get_cpu_time(process.pid) + cpu_timeout
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if (remaining <= 0):
+            _stop_process(process)
+            return (False, None)
+
+        if ((cpu_deadline is not None) and (_get_cpu_time(process.pid) >= cpu_deadline)):
+            _stop_process(process)
+            return (False, CPUTimeoutError(typing.cast(float, cpu_timeout)))
+
+        wait_time = remaining
+        if (cpu_deadline is not None):
+            wait_time = min(wait_time, POLL_INTERVAL_SEC)
 
-    # Check to see if the process is still running.
-    if (process.is_alive()):
-        # Kill the long-running process.
-        process.terminate()
+        ready = multiprocessing.connection.wait([connection, process.sentinel], timeout = wait_time)
+        if (len(ready) == 0):
+            continue
+
+        if (connection not in ready):
+            # The process ended without sending anything, check one last time for a result.
+            if (not connection.poll(0)):
+                return (False, _get_exit_value(process, limits))
+
+        try:
+            value, error = connection.recv()
+        except EOFError:
+            # The process explicitly existed (like via sys.exit()) or was killed for exceeding a limit.
+            return (False, _get_exit_value(process, limits))
 
-        # Try to reap the process once before just giving up on it.
         process.join(REAP_TIME_SEC)
 
-        return (False, None)
+        if (error is not None):
+            return (False, error)
+
+        return (True, value)
+
+def _stop_process(process: multiprocessing.Process) -> None:
+    """ Kill a long-running process. """
+
+    process.terminate()
 
-    # Check to see if the process explicitly existed (like via sys.exit()).
-    if (result.empty()):
-        return (False, 'Code explicitly exited (like via sys.exit()).')
+    # Try to reap the process once before just giving up on it.
+    process.join(REAP_TIME_SEC)
 
-    value, error = result.get()
+def _get_cpu_time(pid: typing.Union[int, None]) -> float:
+    """
+    Get the CPU time (user and system, in seconds) used so far by a (Linux) process, see proc_pid_stat(5).
+    Returns zero if the time cannot be found (e.g., the process has already exited).
+    """
 
-    if (error is not None):
-        _, stacktrace = error
-        return (False, stacktrace)
+    try:
+        with open(f"/proc/{pid}/stat", 'r', encoding = 'utf-8') as file:
+            stat = file.read()
+    except OSError:
+        return 0.0
 
-    return (True, value)
+    # The process name (field 2) may contain spaces, so skip past it.
+    # utime and stime are fields 14 and 15.
+    fields = stat[(stat.rfind(')') + 2):].split()
+    ticks = int(fields[11]) + int(fields[12])
 
-def _invoke_helper(result: multiprocessing.Queue, function: typing.Callable) -> None:
+    return ticks / os.sysconf('SC_CLK_TCK')
+
+def _get_exit_value(process: multiprocessing.Process, limits: typing.Union[autograder.util.resources.ResourceLimits, None]) -> typing.Any:
+    """
+    Reap a process that exited without sending a result and get the value to return for it.
+    The process' CPU time and limits are checked before it is reaped (while they can still be read).
+    """
+
+    cpu_time = None
+    hard_cpu_limit = None
+    if ((limits is not None) and (limits.max_cpu_sec is not None)):
+        cpu_time = _get_cpu_time(process.pid)
+        hard_cpu_limit = autograder.util.resources.get_hard_cpu_limit(process.pid)
+
+    process.join(REAP_TIME_SEC)
+    exitcode = process.exitcode
+
+    limit_error = autograder.util.resources.get_exit_error(exitcode, limits,
+            cpu_time = cpu_time, hard_cpu_limit = hard_cpu_limit)
+    if (limit_error is not None):
+        return limit_error
+
+    if ((exitcode is not None) and (exitcode < 0)):
+        try:
+            name = signal.Signals(-exitcode).name
+        except ValueError:
+            name = str(-exitcode)
+
+        return KILLED_MESSAGE.format(signal = name)
+
+    return EXPLICIT_EXIT_MESSAGE
+
+def _invoke_helper(
+        connection: multiprocessing.connection.Connection,
+        function: typing.Callable,
+        limits: typing.Union[autograder.util.resources.ResourceLimits, None],
+        ) -> None:
     """ A helper function for running the given function. """
 
-    value = None
-    error = None
+    value, error = _run_limited(function, limits)
+
+    _send_result(connection, value, error)
+    connection.close()
+
+def _run_limited(
+        function: typing.Callable,
+        limits: typing.Union[autograder.util.resources.ResourceLimits, None],
+        ) -> typing.Tuple[typing.Any, typing.Any]:
+    """
+    Apply the limits (if any) and run a function (in a child process).
+    Returns (value, error), where the error is None on success, a ResourceLimitError, or a string stacktrace.
+    """
 
     try:
-        value = function()
+        if (limits is not None):
+            limits.apply()
+
+        return (function(), None)
     except Exception as ex:
-        error = (ex, traceback.format_exc())
+        limit_error = None
+        if (limits is not None):
+            limit_error = limits.get_error(ex)
+
+        if (limit_error is not None):
+            return (None, limit_error)
+
+        return (None, traceback.format_exc())
+
+def _send_result(connection: multiprocessing.connection.Connection, value: typing.Any, error: typing.Any) -> None:
+    """
+    Send a result (or the error from trying to send it) to the parent process.
+    Results are fully pickled before anything is written, so the parent never sees a partial result.
+    """
 
     sys.stdout.flush()
 
-    result.put((value, error))
-    result.close()
+    try:
+        connection.send((value, error))
+    except Exception:
+        connection.send((None, traceback.format_exc()))
+
+class WorkerPool:
+    """
+    A bounded pool of pre-forked worker processes that with_timeout() can run functions on.
+
+    Workers are forked lazily (the first time they are needed) and reused between calls.
+    A worker is only replaced after it has been killed (on timeout), has exited (e.g., via sys.exit()),
+    or has become dirty (its task raised an exception or it has hit the max number of tasks).
+
+    Functions are sent to workers by pickling them.
+    Objects registered with share() are never pickled,
+    instead they are sent by reference and resolved against the worker's (forked) copy of the object.
+    If a function still cannot be pickled, then a fresh worker will be forked with the function already loaded.
+
+    Functions can be run one at a time (run()),
+    or up to `size` at a time by using start() and wait().
+
+    Resource limits cannot be lifted once applied,
+    so a worker that runs a function with limits is always replaced afterwards.
+
+    A pool is only useful on Linux (see with_timeout()),
+    and should be closed when it is no longer needed.
+    """
+
+    def __init__(self,
+            size: int = DEFAULT_POOL_SIZE,
+            max_tasks_per_worker: typing.Union[int, None] = DEFAULT_POOL_MAX_TASKS,
+            recycle_on_error: bool = True,
+            ) -> None:
+        if (size < 1):
+            raise ValueError(f"Worker pool size must be positive, got {size}.")
+
+        if ((max_tasks_per_worker is not None) and (max_tasks_per_worker < 1)):
+            raise ValueError(f"Worker pool max tasks must be positive (or None), got {max_tasks_per_worker}.")
+
+        self.size: int = size
+        """ The maximum number of live workers. """
+
+        self.max_tasks_per_worker: typing.Union[int, None] = max_tasks_per_worker
+        """ The number of tasks a worker may run before it is replaced (None for no limit). """
+
+        self.recycle_on_error: bool = recycle_on_error
+        """ Replace a worker after its task raises an exception. """
+
+        self._shared: typing.Dict[int, typing.Any] = {}
+        """ Objects that can be sent to workers by reference, keyed by id(). """
+
+        self._idle: typing.List[_Worker] = []
+        self._num_busy: int = 0
+        self._closed: bool = False
+
+    def share(self, *objects: typing.Any) -> None:
+        """
+        Register objects that will be sent to workers by reference instead of being pickled.
+        Only workers forked after this call will know about these objects.
+        Shared objects should not be modified while the pool is open.
+        """
+
+        for obj in objects:
+            self._shared[id(obj)] = obj
+
+    def has_capacity(self) -> bool:
+        """ Check if another task can be started right now. """
+
+        return ((not self._closed) and (self._num_busy < self.size))
+
+    def run(self,
+            timeout: typing.Union[float, None],
+            function: typing.Callable,
+            limits: typing.Union[autograder.util.resources.ResourceLimits, None] = None,
+            cpu_timeout: typing.Union[float, None] = None,
+            ) -> typing.Tuple[bool, typing.Any]:
+        """
+        Run a function on a worker and wait for it to complete.
+        Returns the same values as with_timeout().
+        """
+
+        return self.wait([self.start(timeout, function, limits = limits, cpu_timeout = cpu_timeout)]).get_result()
+
+    def start(self,
+            timeout: typing.Union[float, None],
+            function: typing.Callable,
+            limits: typing.Union[autograder.util.resources.ResourceLimits, None] = None,
+            cpu_timeout: typing.Union[float, None] = None,
+            ) -> 'PoolTask':
+        """
+        Start running a function on a worker and return the running task without waiting for it.
+        Use wait() to get the result.
+        If the function cannot be run in another process (see with_timeout()),
+        then it will be run to completion before returning.
+
+        There must be capacity in the pool (see has_capacity()) to start a task.
+        """
+
+        if (self._closed):
+            raise ValueError("Worker pool is closed.")
+
+        if (runs_in_process(timeout)):
+            task = PoolTask(None, timeout)
+            task.result = with_timeout(timeout, function, limits = limits, cpu_timeout = cpu_timeout)
+            return task
+
+        if (self._num_busy >= self.size):
+            raise ValueError(f"Worker pool is already running the max number of tasks ({self.size}).")
+
+        _init_multiprocessing()
+
+        if (len(self._idle) > 0):
+            worker = self._idle.pop()
+        else:
+            worker = _Worker(self._shared)
+
+        self._num_busy += 1
+
+        try:
+            self._send(worker, function, limits)
+        except BaseException:
+            self._release(worker, False)
+            raise
+
+        task = PoolTask(worker, timeout, limits = limits)
+
+        if (cpu_timeout is not None):
+            task.cpu_timeout = cpu_timeout
+            task.cpu_deadline = _get_cpu_time(typing.cast(multiprocessing.Process, worker.process).pid) + cpu_timeout
+
+        return task
+
+    def wait(self, tasks: typing.Sequence['PoolTask']) -> 'PoolTask':
+        """
+        Wait until at least one of the given tasks is done (completed, failed, or timed out),
+        and return the first such task.
+        """
+
+        if (len(tasks) == 0):
+            raise ValueError("No tasks to wait on.")
+
+        while True:
+            done = self.poll(tasks)
+            if (len(done) > 0):
+                return done[0]
+
+            waitables, wait_time = self.get_waitables(tasks)
+            multiprocessing.connection.wait(waitables, timeout = wait_time)
+
+    def poll(self, tasks: typing.Sequence['PoolTask']) -> typing.List['PoolTask']:
+        """
+        Check on the given tasks without blocking,
+        and return the ones that are done (in the same order).
+        """
+
+        done = []
+
+        for task in tasks:
+            if (task.result is None):
+                self._check(task)
+
+            if (task.result is not None):
+                done.append(task)
+
+        return done
+
+    def get_waitables(self, tasks: typing.Sequence['PoolTask']) -> typing.Tuple[typing.List[typing.Any], float]:
+        """
+        Get the objects that will become ready (see multiprocessing.connection.wait()) when the given tasks make progress,
+        and the longest time (in seconds) to wait on them before the tasks should be polled again (see poll()).
+        This allows waiting on tasks along with other objects (e.g., sockets).
+        """
+
+        waitables: typing.List[typing.Any] = []
+        wait_time = POLL_INTERVAL_SEC
+        now = time.monotonic()
+
+        for task in tasks:
+            if (task.worker is None):
+                continue
+
+            waitables.append(task.worker.connection)
+            waitables.append(task.worker.sentinel)
+
+            if (task.deadline is not None):
+                wait_time = min(wait_time, max(0, task.deadline - now))
+
+        return waitables, wait_time
+
+    def close(self) -> None:
+        """ Stop all the idle workers and refuse any new work. """
+
+        self._closed = True
+
+        workers = self._idle
+        self._idle = []
+
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self) -> 'WorkerPool':
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
+
+    def _send(self,
+            worker: '_Worker',
+            function: typing.Callable,
+            limits: typing.Union[autograder.util.resources.ResourceLimits, None],
+            ) -> None:
+        """ Give a function to a worker. """
+
+        payload = None
+        if (worker.process is not None):
+            try:
+                payload = worker.dumps((function, limits))
+            except Exception:
+                # The function cannot be sent to this worker, so it must be loaded into a fresh one.
+                worker.kill()
+
+        if (payload is None):
+            worker.start(self._shared, (function, limits))
+        else:
+            worker.connection.send_bytes(payload)
+
+        worker.num_tasks += 1
+
+    def _check(self, task: 'PoolTask') -> None:
+        """ Check on a running task and finish it if it is done. """
+
+        worker = task.worker
+        if ((worker is None) or (worker.process is None)):
+            return
+
+        # Limits cannot be lifted, so a limited worker cannot be reused.
+        reusable = (task.limits is None)
+
+        if (worker.connection.poll(0)):
+            try:
+                value, error = worker.connection.recv()
+            except EOFError:
+                self._finish(task, False, _get_exit_value(worker.process, task.limits), False)
+                return
+
+            if (error is not None):
+                self._finish(task, False, error, (reusable and (not self.recycle_on_error)))
+            else:
+                self._finish(task, True, value, reusable)
+
+            return
+
+        # Check the sentinel instead of is_alive() so the process is not reaped before its exit is examined.
+        if (len(multiprocessing.connection.wait([worker.sentinel], timeout = 0)) > 0):
+            # Check one last time for a result that was sent right before the exit.
+            if (worker.connection.poll(0)):
+                self._check(task)
+                return
+
+            self._finish(task, False, _get_exit_value(worker.process, task.limits), False)
+            return
+
+        if ((task.deadline is not None) and (time.monotonic() >= task.deadline)):
+            self._finish(task, False, None, False)
+            return
+
+        if ((task.cpu_deadline is not None) and (_get_cpu_time(worker.process.pid) >= task.cpu_deadline)):
+            self._finish(task, False, CPUTimeoutError(typing.cast(float, task.cpu_timeout)), False)
+
+    def _finish(self, task: 'PoolTask', success: bool, value: typing.Any, keep: bool) -> None:
+        """ Record a task's result and release its worker. """
+
+        task.result = (success, value)
+
+        if (task.worker is not None):
+            self._release(task.worker, keep)
+            task.worker = None
+
+    def _release(self, worker: '_Worker', keep: bool) -> None:
+        """ Return a worker to the pool, or retire it. """
+
+        self._num_busy -= 1
+
+        if (keep and (self.max_tasks_per_worker is not None) and (worker.num_tasks >= self.max_tasks_per_worker)):
+            keep = False
+
+        if (not keep):
+            worker.kill()
+        elif (self._closed):
+            worker.stop()
+        else:
+            self._idle.append(worker)
+
+_WorkerTask = typing.Tuple[typing.Callable, typing.Union[autograder.util.resources.ResourceLimits, None]]
+""" A function (and the limits to run it under) for a pool worker to run. """
+
+class PoolTask:
+    """ A function that has been started on a WorkerPool. """
+
+    def __init__(self,
+            worker: typing.Union['_Worker', None],
+            timeout: typing.Union[float, None],
+            limits: typing.Union[autograder.util.resources.ResourceLimits, None] = None,
+            ) -> None:
+        self.worker: typing.Union[_Worker, None] = worker
+        """ The worker running this task (None once the task is done). """
+
+        self.limits: typing.Union[autograder.util.resources.ResourceLimits, None] = limits
+        """ The resource limits the task is running under. """
+
+        self.cpu_timeout: typing.Union[float, None] = None
+        """ The CPU time (in seconds) this task may use (see with_timeout()). """
+
+        self.cpu_deadline: typing.Union[float, None] = None
+        """ When this task will time out (according to its worker's total CPU time). """
+
+        self.deadline: typing.Union[float, None] = None
+        """ When this task will time out (according to time.monotonic()). """
+
+        if (timeout is not None):
+            self.deadline = time.monotonic() + timeout
+
+        self.result: typing.Union[typing.Tuple[bool, typing.Any], None] = None
+        """ The result of this task (see with_timeout()), None while the task is still running. """
+
+    def get_result(self) -> typing.Tuple[bool, typing.Any]:
+        """ Get the result of a finished task. """
+
+        if (self.result is None):
+            raise ValueError("Task is not done.")
+
+        return self.result
+
+class _Worker:
+    """ A single worker process (and its connection) for a WorkerPool. """
+
+    def __init__(self, shared: typing.Dict[int, typing.Any]) -> None:
+        self.process: typing.Union[multiprocessing.Process, None] = None
+        self.connection: typing.Any = None
+        self.known_ids: typing.FrozenSet[int] = frozenset(shared)
+        self.num_tasks: int = 0
+
+    def start(self, shared: typing.Dict[int, typing.Any], task: typing.Union['_WorkerTask', None] = None) -> None:
+        """
+        Fork the worker process if it is not already running.
+        If a task is given, the worker will run it as soon as it starts.
+        """
+
+        if (self.process is not None):
+            return
+
+        parent_connection, child_connection = multiprocessing.Pipe()
+
+        self.known_ids = frozenset(shared)
+        self.process = multiprocessing.Process(target = _worker_main, args = (child_connection, shared, task))
+        self.process.start()
+
+        # Close the child's end in this process so a dead worker will be seen as EOF.
+        child_connection.close()
+        self.connection = parent_connection
+
+    def dumps(self, task: '_WorkerTask') -> bytes:
+        """ Pickle a task, sending all objects this worker already knows about by reference. """
+
+        buffer = io.BytesIO()
+        _SharedPickler(buffer, self.known_ids).dump(task)
+        return buffer.getvalue()
+
+    @property
+    def sentinel(self) -> typing.Any:
+        """ An object that will become ready when the worker process ends (see multiprocessing.connection.wait()). """
+
+        if (self.process is None):
+            raise ValueError("Worker is not running.")
+
+        return self.process.sentinel
+
+    def stop(self) -> None:
+        """ Ask the worker to exit, and kill it if it does not. """
+
+        if (self.process is None):
+            return
+
+        try:
+            self.connection.send_bytes(b'')
+        except Exception:
+            pass
+
+        self.process.join(CLOSE_TIME_SEC)
+        self.kill()
+
+    def kill(self) -> None:
+        """ Kill (and reap) the worker process. """
+
+        if (self.process is None):
+            return
+
+        if (self.process.is_alive()):
+            self.process.terminate()
+
+            # Try to reap the process once before just giving up on it.
+            self.process.join(REAP_TIME_SEC)
+
+        self.connection.close()
+
+        self.process = None
+        self.connection = None
+
+class _SharedPickler(pickle.Pickler):
+    """ A pickler that sends known objects by reference (their id()). """
+
+    def __init__(self, file: typing.BinaryIO, shared_ids: typing.FrozenSet[int]) -> None:
+        super().__init__(file, protocol = pickle.HIGHEST_PROTOCOL)
+        self._shared_ids = shared_ids
+
+    def persistent_id(self, obj: typing.Any) -> typing.Union[int, None]:  # pylint: disable=missing-function-docstring
+        if (id(obj) in self._shared_ids):
+            return id(obj)
+
+        return None
+
+class _SharedUnpickler(pickle.Unpickler):
+    """ An unpickler that resolves references made by _SharedPickler. """
+
+    def __init__(self, file: typing.BinaryIO, shared: typing.Dict[int, typing.Any]) -> None:
+        super().__init__(file)
+        self._shared = shared
+
+    def persistent_load(self, pid: typing.Any) -> typing.Any:  # pylint: disable=missing-function-docstring
+        return self._shared[pid]
+
+def _worker_main(
+        connection: multiprocessing.connection.Connection,
+        shared: typing.Dict[int, typing.Any],
+        task: typing.Union['_WorkerTask', None],
+        ) -> None:
+    """
+    The main loop for a pool worker.
+    An empty message (or a closed connection) signals the worker to exit.
+    An exit from the function (e.g., sys.exit()) will end the worker without sending a result.
+    """
+
+    while True:
+        if (task is None):
+            try:
+                payload = connection.recv_bytes()
+            except EOFError:
+                return
+
+            if (len(payload) == 0):
+                return
+
+            try:
+                task = _SharedUnpickler(io.BytesIO(payload), shared).load()
+            except Exception:
+                _send_result(connection, None, traceback.format_exc())
+                continue
+
+        function, limits = typing.cast(_WorkerTask, task)
+        task = None
+
+        value, error = _run_limited(function, limits)
+
+        # Drop the references to the function before waiting on the next task.
+        del function, limits
+
+        _send_result(connection, value, error)
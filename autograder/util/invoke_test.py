@@ -0,0 +1,287 @@
+import os
+import signal
+import sys
+import time
+import typing
+import unittest
+
+import edq.testing.unittest
+
+import autograder.util.invoke
+import autograder.util.resources
+
+LIMIT_TIMEOUT_SEC: float = 30
+""" A wall-clock timeout loose enough that only the resource limits should stop the code (even on a loaded machine). """
+
+def _get_pid() -> int:
+    return os.getpid()
+
+def _raise() -> None:
+    raise ValueError("Test Error")
+
+def _exit() -> None:
+    sys.exit(0)
+
+def _kill_self() -> None:
+    os.kill(os.getpid(), signal.SIGKILL)
+
+def _sleep() -> None:
+    time.sleep(10)
+
+class _Counter:
+    """ An object that is not picklable (because of the lambda), and can only be shared. """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.func = lambda: None
+
+    def increment(self) -> int:
+        """ Increment and return the count. """
+
+        self.count += 1
+        return self.count
+
+def _allocate() -> int:
+    data = bytearray(512 * 1024 * 1024)
+    return len(data)
+
+def _spin() -> None:
+    while True:
+        pass
+
+def _spin_ignoring_cpu_limit() -> None:
+    signal.signal(signal.SIGXCPU, signal.SIG_IGN)
+    _spin()
+
+def _open_files() -> int:
+    files = [open(__file__, 'r', encoding = 'utf-8') for _ in range(100)]  # pylint: disable=consider-using-with
+    for file in files:
+        file.close()
+
+    return len(files)
+
+def _large_result() -> str:
+    # Much larger than a pipe's buffer.
+    return 'a' * (16 * 1024 * 1024)
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "timeouts require Linux")
+class TestWithTimeout(edq.testing.unittest.BaseTest):
+    """ Test running functions in a separate process. """
+
+    def test_with_timeout_base(self) -> None:
+        """ Test the results of running functions with a timeout. """
+
+        # [(function, expected success, expected value, value substring), ...]
+        test_cases: typing.List[typing.Tuple[typing.Callable, bool, typing.Any, typing.Union[str, None]]] = [
+            (lambda: 1, True, 1, None),
+            (lambda: None, True, None, None),
+            (_raise, False, None, 'Test Error'),
+            (_exit, False, autograder.util.invoke.EXPLICIT_EXIT_MESSAGE, None),
+            (_sleep, False, None, None),
+            (lambda: _Counter(), False, None, 'pickle'),  # pylint: disable=unnecessary-lambda
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (function, expected_success, expected_value, value_substring) = test_case
+
+            with self.subTest(msg = f"Case {i}"):
+                success, value = autograder.util.invoke.with_timeout(0.5, function)
+
+                self.assertEqual(expected_success, success)
+
+                if (value_substring is None):
+                    self.assertEqual(expected_value, value)
+                else:
+                    self.assertIn(value_substring, value)
+
+    def test_with_timeout_cpu(self) -> None:
+        """ Test that CPU timeouts only count CPU time (and that the wall-clock timeout is still a backstop). """
+
+        def _short_sleep() -> int:
+            time.sleep(0.5)
+            return 1
+
+        # [(function, wall timeout, expected success, expected value, expected CPU timeout), ...]
+        test_cases: typing.List[typing.Tuple[typing.Callable, float, bool, typing.Any, bool]] = [
+            (_spin, LIMIT_TIMEOUT_SEC, False, None, True),
+            (_short_sleep, LIMIT_TIMEOUT_SEC, True, 1, False),
+            (_sleep, 1, False, None, False),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (function, timeout, expected_success, expected_value, expected_cpu_timeout) = test_case
+
+            for use_pool in [False, True]:
+                with self.subTest(msg = f"Case {i}, Pool: {use_pool}"):
+                    with autograder.util.invoke.WorkerPool() as pool:
+                        success, value = autograder.util.invoke.with_timeout(timeout, function,
+                                pool = (pool if use_pool else None), cpu_timeout = 0.3)
+
+                    self.assertEqual(expected_success, success)
+
+                    if (expected_cpu_timeout):
+                        self.assertIsInstance(value, autograder.util.invoke.CPUTimeoutError)
+                    else:
+                        self.assertEqual(expected_value, value)
+
+    def test_with_timeout_large_result(self) -> None:
+        """ Test that a large result does not block the child process (and look like a timeout). """
+
+        success, value = autograder.util.invoke.with_timeout(5, _large_result)
+
+        self.assertTrue(success)
+        self.assertEqual(_large_result(), value)
+
+    def test_with_timeout_limits(self) -> None:
+        """ Test that exceeding a resource limit is reported as a limit error. """
+
+        # [(function, limits, expected limit name), ...]
+        test_cases: typing.List[typing.Tuple[typing.Callable, autograder.util.resources.ResourceLimits, typing.Union[str, None]]] = [
+            (_allocate, autograder.util.resources.ResourceLimits(max_memory_mb = 64), autograder.util.resources.LIMIT_MEMORY),
+            (_allocate, autograder.util.resources.ResourceLimits(max_memory_mb = 1024), None),
+            (_spin, autograder.util.resources.ResourceLimits(max_cpu_sec = 1), autograder.util.resources.LIMIT_CPU),
+            (_spin_ignoring_cpu_limit, autograder.util.resources.ResourceLimits(max_cpu_sec = 1), autograder.util.resources.LIMIT_CPU),
+            (_open_files, autograder.util.resources.ResourceLimits(max_open_files = 32), autograder.util.resources.LIMIT_OPEN_FILES),
+            (_open_files, autograder.util.resources.ResourceLimits(max_open_files = 256), None),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (function, limits, expected_limit_name) = test_case
+
+            for use_pool in [False, True]:
+                with self.subTest(msg = f"Case {i}, Pool: {use_pool}"):
+                    with autograder.util.invoke.WorkerPool() as pool:
+                        success, value = autograder.util.invoke.with_timeout(LIMIT_TIMEOUT_SEC, function,
+                                pool = (pool if use_pool else None), limits = limits)
+
+                    if (expected_limit_name is None):
+                        self.assertTrue(success, value)
+                        continue
+
+                    self.assertFalse(success)
+                    self.assertIsInstance(value, autograder.util.resources.ResourceLimitError)
+                    self.assertEqual(expected_limit_name, value.limit_name)
+
+    def test_with_timeout_killed(self) -> None:
+        """ Test that a SIGKILL that is not from the hard CPU limit is not reported as a limit error. """
+
+        limits = autograder.util.resources.ResourceLimits(max_cpu_sec = 10)
+        expected = autograder.util.invoke.KILLED_MESSAGE.format(signal = 'SIGKILL')
+
+        for use_pool in [False, True]:
+            with self.subTest(msg = f"Pool: {use_pool}"):
+                with autograder.util.invoke.WorkerPool() as pool:
+                    success, value = autograder.util.invoke.with_timeout(LIMIT_TIMEOUT_SEC, _kill_self,
+                            pool = (pool if use_pool else None), limits = limits)
+
+                self.assertFalse(success)
+                self.assertEqual(expected, value)
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "worker pools require Linux")
+class TestWorkerPool(edq.testing.unittest.BaseTest):
+    """ Test running functions on a worker pool. """
+
+    def setUp(self) -> None:
+        # Shorten the reap time for testing.
+        self._old_reap_time = autograder.util.invoke.REAP_TIME_SEC
+        autograder.util.invoke.REAP_TIME_SEC = 0.01
+
+    def tearDown(self) -> None:
+        autograder.util.invoke.REAP_TIME_SEC = self._old_reap_time
+
+    def test_pool_base(self) -> None:
+        """ Test the results of running functions on a pool. """
+
+        # [(function, expected success, expected value, value substring), ...]
+        test_cases: typing.List[typing.Tuple[typing.Callable, bool, typing.Any, typing.Union[str, None]]] = [
+            (lambda: 1, True, 1, None),
+            (lambda: None, True, None, None),
+            (_raise, False, None, 'Test Error'),
+            (_exit, False, autograder.util.invoke.EXPLICIT_EXIT_MESSAGE, None),
+            (_sleep, False, None, None),
+        ]
+
+        with autograder.util.invoke.WorkerPool() as pool:
+            for (i, test_case) in enumerate(test_cases):
+                (function, expected_success, expected_value, value_substring) = test_case
+
+                with self.subTest(msg = f"Case {i}"):
+                    success, value = autograder.util.invoke.with_timeout(0.5, function, pool = pool)
+
+                    self.assertEqual(expected_success, success)
+
+                    if (value_substring is None):
+                        self.assertEqual(expected_value, value)
+                    else:
+                        self.assertIn(value_substring, value)
+
+    def test_pool_reuse(self) -> None:
+        """ Test that workers are reused until they are dirty. """
+
+        with autograder.util.invoke.WorkerPool() as pool:
+            _, first_pid = pool.run(1, _get_pid)
+            _, second_pid = pool.run(1, _get_pid)
+
+            self.assertNotEqual(os.getpid(), first_pid)
+            self.assertEqual(first_pid, second_pid)
+
+            pool.run(1, _raise)
+
+            _, third_pid = pool.run(1, _get_pid)
+            self.assertNotEqual(first_pid, third_pid)
+
+    def test_pool_max_tasks(self) -> None:
+        """ Test that workers are replaced after running the max number of tasks. """
+
+        with autograder.util.invoke.WorkerPool(max_tasks_per_worker = 2) as pool:
+            pids = [pool.run(1, _get_pid)[1] for _ in range(4)]
+
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertNotEqual(pids[1], pids[2])
+
+    def test_pool_shared(self) -> None:
+        """ Test that shared objects are sent by reference to the worker's copy. """
+
+        counter = _Counter()
+
+        with autograder.util.invoke.WorkerPool() as pool:
+            pool.share(counter)
+
+            results = [pool.run(1, counter.increment) for _ in range(3)]
+
+        self.assertEqual([(True, 1), (True, 2), (True, 3)], results)
+        self.assertEqual(0, counter.count)
+
+    def test_pool_unpicklable(self) -> None:
+        """ Test that functions that cannot be pickled get a fresh worker. """
+
+        counter = _Counter()
+
+        with autograder.util.invoke.WorkerPool() as pool:
+            _, first_pid = pool.run(1, _get_pid)
+            result = pool.run(1, counter.increment)
+            _, second_pid = pool.run(1, _get_pid)
+
+        self.assertEqual((True, 1), result)
+        self.assertNotEqual(first_pid, second_pid)
+
+    def test_pool_closed(self) -> None:
+        """ Test that a closed pool does not accept work. """
+
+        pool = autograder.util.invoke.WorkerPool()
+        pool.close()
+
+        with self.assertRaises(ValueError):
+            pool.run(1, _get_pid)
+
+    def test_pool_limits_recycle(self) -> None:
+        """ Test that workers that ran with limits are not reused. """
+
+        limits = autograder.util.resources.ResourceLimits(max_open_files = 256)
+
+        with autograder.util.invoke.WorkerPool() as pool:
+            _, first_pid = pool.run(1, _get_pid, limits = limits)
+            _, second_pid = pool.run(1, _get_pid)
+
+        self.assertNotEqual(first_pid, second_pid)
@@ -2,8 +2,14 @@
 Utilities for network and HTTP.
 """
 
+import hashlib
+import os
 import typing
+import uuid
 
+import edq.net.request
+import edq.net.settings
+import edq.util.dirent
 import edq.util.json
 import requests
 
@@ -38,6 +44,150 @@ FULL_NORMALIZE_TIMESTAMP_KEYS: typing.Set[str] = autograder.testing.asserts.NORM
 }
 """ Keys for timestamp values to normalize. """
 
+DEFAULT_CHECKSUM_ALGORITHM: str = 'sha256'
+""" The hash algorithm for checksums that do not specify one (see parse_checksum()). """
+
+DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024
+""" The number of bytes held in memory at a time when downloading. """
+
+def parse_checksum(checksum: str) -> typing.Tuple[str, str]:
+    """
+    Parse a checksum of the form `<algorithm>:<hex digest>` (e.g., `sha256:abc123...`) into its algorithm and digest.
+    A checksum without an algorithm uses DEFAULT_CHECKSUM_ALGORITHM.
+    Raises a ValueError on an unknown algorithm or a malformed digest.
+    """
+
+    algorithm = DEFAULT_CHECKSUM_ALGORITHM
+    digest = checksum.strip().lower()
+
+    if (':' in digest):
+        algorithm, digest = digest.split(':', 1)
+        algorithm = algorithm.strip()
+        digest = digest.strip()
+
+    if (algorithm not in hashlib.algorithms_guaranteed):
+        raise ValueError(f"Unknown checksum algorithm '{algorithm}' in checksum: '{checksum}'.")
+
+    try:
+        size = len(bytes.fromhex(digest))
+    except ValueError:
+        size = -1
+
+    if (size != hashlib.new(algorithm).digest_size):
+        raise ValueError(f"Checksum does not have a valid {algorithm} digest: '{checksum}'.")
+
+    return algorithm, digest
+
+def compute_checksum(path: str, algorithm: str = DEFAULT_CHECKSUM_ALGORITHM) -> str:
+    """ Compute the hex digest of a file, reading it a chunk at a time. """
+
+    digest = hashlib.new(algorithm)
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def download(url: str, dest_path: str,
+        checksum: typing.Union[str, None] = None,
+        headers: typing.Union[typing.Dict[str, str], None] = None,
+        raise_for_status: bool = True,
+        ) -> typing.Tuple[requests.Response, typing.Union[str, None]]:
+    """
+    Download the body of a URL into a file, a chunk at a time (so memory use does not depend on the size of the body).
+    The body is written as the exact bytes that were served,
+    and only appears at the destination once it has been fully downloaded (and matches the checksum, if one is given).
+
+    edq.net.request always reads the full body into memory (so that the exchange can be recorded),
+    so it cannot be used to stream.
+    When exchanges are being recorded (see edq.net.settings.get_exchanges_out_dir() and get_request_complete_callback()),
+    the request is made through edq.net.request (and the body is held in memory) so it is still recorded.
+    Otherwise, the body is streamed using the same network settings (timeouts and HTTPS verification) as edq.net.request.
+
+    Return the response and the sha256 hex digest of the body.
+    Bodies are only written for successful (2xx) responses,
+    other responses (when not raising) return a None digest and leave the destination untouched.
+    """
+
+    if (not url.lower().startswith('http')):
+        url = 'http://' + url
+
+    expected = None
+    if (checksum is not None):
+        expected = parse_checksum(checksum)
+
+    if (_is_recording_exchanges()):
+        response, _ = edq.net.request.make_request('GET', url, headers = headers, raise_for_status = raise_for_status)
+        if ((response.status_code < 200) or (response.status_code >= 300)):
+            return response, None
+
+        return response, _write_chunks(url, [response.content], dest_path, expected)
+
+    options: typing.Dict[str, typing.Any] = {
+        'headers': headers,
+        'stream': True,
+        'timeout': (edq.net.settings.get_connection_timeout_secs(), edq.net.settings.get_read_timeout_secs()),
+        'verify': edq.net.settings.get_https_verification(),
+    }
+
+    response = requests.get(url, **options)
+    with response:
+        if (raise_for_status):
+            response.raise_for_status()
+
+        if ((response.status_code < 200) or (response.status_code >= 300)):
+            return response, None
+
+        digest = _write_chunks(url, response.iter_content(chunk_size = DOWNLOAD_CHUNK_SIZE), dest_path, expected)
+
+    return response, digest
+
+def _is_recording_exchanges() -> bool:
+    """ Check if edq.net.request would record (or report) HTTP exchanges. """
+
+    return ((edq.net.settings.get_exchanges_out_dir() is not None)
+            or (edq.net.settings.get_request_complete_callback() is not None))
+
+def _write_chunks(url: str, chunks: typing.Iterable[bytes], dest_path: str,
+        expected: typing.Union[typing.Tuple[str, str], None],
+        ) -> str:
+    """
+    Write a body (as chunks of bytes) to a temp file and move it to the destination once it matches the expected checksum.
+    Return the sha256 hex digest of the body.
+    """
+
+    digest = hashlib.sha256()
+    checksum_digest = None
+    if ((expected is not None) and (expected[0] != 'sha256')):
+        checksum_digest = hashlib.new(expected[0])
+
+    edq.util.dirent.mkdir(os.path.dirname(os.path.abspath(dest_path)))
+    temp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+
+    try:
+        with open(temp_path, 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+                digest.update(chunk)
+
+                if (checksum_digest is not None):
+                    checksum_digest.update(chunk)
+
+        if (checksum_digest is None):
+            checksum_digest = digest
+
+        if ((expected is not None) and (checksum_digest.hexdigest() != expected[1])):
+            raise ValueError(f"Checksum mismatch for '{url}'."
+                + f" Expected {expected[0]} '{expected[1]}', found '{checksum_digest.hexdigest()}'.")
+
+        os.replace(temp_path, dest_path)
+    finally:
+        if (os.path.exists(temp_path)):
+            os.remove(temp_path)
+
+    return digest.hexdigest()
+
 def clean_api_response(response: requests.Response, body: str) -> str:
     """
     Clean autograder API responses (so they can be stored consistently).
@@ -0,0 +1,136 @@
+import functools
+import hashlib
+import http.server
+import os
+import threading
+import typing
+
+import edq.net.settings
+import edq.testing.unittest
+import edq.util.dirent
+
+import autograder.filespec
+import autograder.util.filespeccache
+import autograder.util.net
+
+class TestNet(edq.testing.unittest.BaseTest):
+    """ Test network utilities. """
+
+    def test_parse_checksum_base(self) -> None:
+        """ Test parsing checksums. """
+
+        sha256 = hashlib.sha256(b'').hexdigest()
+        md5 = hashlib.md5(b'').hexdigest()
+
+        # [(checksum, expected, error substring), ...]
+        test_cases = [
+            (sha256, ('sha256', sha256), None),
+            (f"sha256:{sha256}", ('sha256', sha256), None),
+            (f" SHA256 : {sha256.upper()} ", ('sha256', sha256), None),
+            (f"md5:{md5}", ('md5', md5), None),
+
+            (f"zzz:{sha256}", None, 'Unknown checksum algorithm'),
+            (md5, None, 'valid sha256 digest'),
+            (f"md5:{sha256}", None, 'valid md5 digest'),
+            ('sha256:xyz', None, 'valid sha256 digest'),
+            ('', None, 'valid sha256 digest'),
+        ]
+
+        for (i, test_case) in enumerate(test_cases):
+            (checksum, expected, error_substring) = test_case
+
+            with self.subTest(msg = f"Case {i} ('{checksum}'):"):
+                try:
+                    actual = autograder.util.net.parse_checksum(checksum)
+                except ValueError as ex:
+                    if (error_substring is None):
+                        self.fail(f"Unexpected error: '{str(ex)}'.")
+
+                    self.assertIn(error_substring, str(ex))
+                    continue
+
+                if (error_substring is not None):
+                    self.fail(f"Did not get expected error: '{error_substring}'.")
+
+                self.assertEqual(expected, actual)
+
+    def test_download_base(self) -> None:
+        """ Test streaming (binary) URL filespecs to disk and checking their checksums. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-net-')
+        serve_dir = os.path.join(temp_dir, 'serve')
+        edq.util.dirent.mkdir(serve_dir)
+
+        # Larger than a single chunk, and not valid text.
+        content = bytes(range(256)) * ((autograder.util.net.DOWNLOAD_CHUNK_SIZE // 256) + 3)
+        with open(os.path.join(serve_dir, 'data.bin'), 'wb') as file:
+            file.write(content)
+
+        sha256 = hashlib.sha256(content).hexdigest()
+        md5 = hashlib.md5(content).hexdigest()
+        bad_checksum = hashlib.sha256(b'').hexdigest()
+
+        server = _start_server(serve_dir)
+
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/data.bin"
+
+            for cached in [False, True]:
+                cache = None
+                if (cached):
+                    cache = autograder.util.filespeccache.FileSpecCache(os.path.join(temp_dir, 'cache'))
+
+                for checksum in ['', sha256, f"md5:{md5}"]:
+                    with self.subTest(cached = cached, checksum = checksum):
+                        dest_dir = edq.util.dirent.get_temp_path(prefix = 'autograder-test-net-dest-')
+                        spec = autograder.filespec.get_url(url, checksum = checksum)
+                        autograder.filespec.copy(spec, '', dest_dir, False, cache = cache)
+
+                        with open(os.path.join(dest_dir, 'data.bin'), 'rb') as file:
+                            self.assertEqual(content, file.read())
+
+                with self.subTest(cached = cached, checksum = bad_checksum):
+                    dest_dir = edq.util.dirent.get_temp_path(prefix = 'autograder-test-net-dest-')
+                    spec = autograder.filespec.get_url(url, checksum = bad_checksum)
+
+                    with self.assertRaisesRegex(autograder.filespec.FileSpecError, 'Checksum mismatch'):
+                        autograder.filespec.copy(spec, '', dest_dir, False, cache = cache)
+
+                    # Nothing (not even a partial file) is left behind.
+                    self.assertFalse(os.path.exists(os.path.join(dest_dir, 'data.bin')))
+
+            # When exchanges are being recorded, downloads go through edq.net.request.
+            exchanges: typing.List[typing.Any] = []
+            edq.net.settings.set_request_complete_callback(exchanges.append)
+            try:
+                dest_path = os.path.join(edq.util.dirent.get_temp_path(prefix = 'autograder-test-net-dest-'), 'data.bin')
+                _, digest = autograder.util.net.download(url, dest_path, checksum = sha256)
+            finally:
+                edq.net.settings.set_request_complete_callback(None)
+
+            self.assertEqual(1, len(exchanges))
+            self.assertEqual(sha256, digest)
+            with open(dest_path, 'rb') as file:
+                self.assertEqual(content, file.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # Specs without a checksum keep their original shape.
+        self.assertNotIn('checksum', autograder.filespec.get_url('http://example.com/a.txt'))
+        self.assertEqual(sha256, autograder.filespec.get_url('http://example.com/a.txt', checksum = sha256)['checksum'])
+
+        with self.assertRaisesRegex(autograder.filespec.FileSpecError, 'invalid checksum'):
+            autograder.filespec.parse({'type': 'url', 'path': 'http://example.com/a.txt', 'checksum': 'sha256:xyz'})
+
+def _start_server(serve_dir: str) -> http.server.ThreadingHTTPServer:
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        """ A quiet handler. """
+
+        def log_message(self, format: str, *args: object) -> None:  # pylint: disable=redefined-builtin
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory = serve_dir))
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    return server
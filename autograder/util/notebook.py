@@ -0,0 +1,321 @@
+"""
+Extract code from iPython notebooks without loading the whole notebook.
+
+Notebooks often carry large outputs (e.g., base64 images) that are never needed for grading.
+Instead of parsing the full JSON document, the notebook is scanned incrementally (in chunks)
+and only the code cells are materialized, everything else (e.g., outputs and metadata) is skipped over.
+So the memory and time needed to extract code depends on the size of the code, not the size of the outputs.
+
+The extracted code is the same as edq.util.code.extract_notebook_code() and edq.util.code.extract_code().
+"""
+
+import json
+import re
+import typing
+
+import edq.util.code
+import edq.util.dirent
+
+DEFAULT_CHUNK_SIZE: int = 64 * 1024
+""" The number of characters to read from a notebook at a time. """
+
+_WHITESPACE: typing.Pattern = re.compile(r'[ \t\n\r]*')
+_STRING_BODY: typing.Pattern = re.compile(r'[^"\\]*(?:\\[\s\S][^"\\]*)*')
+_CONTAINER_SPECIAL: typing.Pattern = re.compile(r'["\[\]{}]')
+_SCALAR_END: typing.Pattern = re.compile(r'[,\]}\s]')
+
+def extract_code(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """
+    Get the (cleaned) source code out of a path (to either a notebook or vanilla python).
+    A drop-in replacement for edq.util.code.extract_code() that streams notebooks.
+    """
+
+    if (path.lower().endswith('.ipynb')):
+        return extract_notebook_code(path, chunk_size = chunk_size).strip()
+
+    return edq.util.code.extract_code(path)
+
+def extract_notebook_code(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """
+    Extract all the code cells from an iPython notebook.
+    A concatenation of all the cells (with a newline between each cell) will be output.
+    A drop-in replacement for edq.util.code.extract_notebook_code() that streams the notebook.
+    """
+
+    with open(path, 'r', encoding = edq.util.dirent.DEFAULT_ENCODING) as file:
+        try:
+            cells = _NotebookScanner(file, chunk_size).read_code_cells()
+        except ValueError as ex:
+            raise ValueError(f"Failed to read notebook '{path}': {ex}") from ex
+
+    contents = []
+    for cell in cells:
+        cell_code = ''.join(cell).strip()
+
+        # Ignore empty cells.
+        if (cell_code == ''):
+            continue
+
+        contents.append(cell_code)
+
+    return "\n".join(contents) + "\n"
+
+class _NotebookScanner:
+    """
+    An incremental scanner over a notebook's JSON.
+    Only a window of the file is kept in memory, and skipped values are never decoded.
+    """
+
+    def __init__(self, file: typing.TextIO, chunk_size: int) -> None:
+        if (chunk_size < 1):
+            raise ValueError(f"Chunk size must be positive, got {chunk_size}.")
+
+        self._file: typing.TextIO = file
+        self._chunk_size: int = chunk_size
+        self._buffer: str = ''
+        self._pos: int = 0
+        self._eof: bool = False
+        self._decoder: json.JSONDecoder = json.JSONDecoder()
+
+    def read_code_cells(self) -> typing.List[typing.Union[str, typing.List[str]]]:
+        """ Read the source for all the code cells in the notebook (in order). """
+
+        cells: typing.List[typing.Union[str, typing.List[str]]] = []
+
+        for key in self._iter_object():
+            if (key != 'cells'):
+                self._skip_value()
+                continue
+
+            for _ in self._iter_array():
+                cell_type = None
+                source: typing.Union[str, typing.List[str]] = ''
+
+                for cell_key in self._iter_object():
+                    if (cell_key == 'cell_type'):
+                        cell_type = self._read_value()
+                    elif (cell_key == 'source'):
+                        source = self._read_value()
+                    else:
+                        self._skip_value()
+
+                if (cell_type == 'code'):
+                    cells.append(source)
+
+        self._skip_whitespace()
+        if (self._peek() != ''):
+            raise self._error("Extra data after notebook")
+
+        return cells
+
+    def _iter_object(self) -> typing.Iterator[str]:
+        """ Iterate over the keys of an object, the caller must consume each key's value. """
+
+        self._expect('{')
+
+        self._skip_whitespace()
+        if (self._peek() == '}'):
+            self._pos += 1
+            return
+
+        while (True):
+            self._skip_whitespace()
+            if (self._peek() != '"'):
+                raise self._error("Expected an object key")
+
+            key = self._read_value()
+            self._expect(':')
+
+            yield key
+
+            self._skip_whitespace()
+            char = self._next()
+            if (char == '}'):
+                return
+
+            if (char != ','):
+                raise self._error("Expected ',' or '}'")
+
+    def _iter_array(self) -> typing.Iterator[None]:
+        """ Iterate over the items of an array, the caller must consume each item. """
+
+        self._expect('[')
+
+        self._skip_whitespace()
+        if (self._peek() == ']'):
+            self._pos += 1
+            return
+
+        while (True):
+            yield None
+
+            self._skip_whitespace()
+            char = self._next()
+            if (char == ']'):
+                return
+
+            if (char != ','):
+                raise self._error("Expected ',' or ']'")
+
+    def _read_value(self) -> typing.Any:
+        """ Decode the next value (which should be small). """
+
+        self._skip_whitespace()
+
+        while (True):
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as ex:
+                if (self._eof):
+                    raise ValueError(str(ex)) from ex
+
+                # The value may just not be fully read yet, read at least as much as we have and try again.
+                self._fill(max(self._chunk_size, len(self._buffer) - self._pos))
+                continue
+
+            if ((end < len(self._buffer)) or self._eof or (not isinstance(value, (int, float)))):
+                self._pos = end
+                return value
+
+            # A number at the end of the buffer may continue into the next chunk.
+            self._fill(self._chunk_size)
+
+    def _skip_value(self) -> None:
+        """ Skip over the next value without decoding it. """
+
+        self._skip_whitespace()
+
+        char = self._peek()
+        if (char == '"'):
+            self._skip_string()
+        elif (char in ('{', '[')):
+            self._skip_container()
+        elif (char == ''):
+            raise self._error("Expected a value")
+        else:
+            self._skip_scalar()
+
+    def _skip_string(self) -> None:
+        """ Skip over a string (starting at its opening quote). """
+
+        self._pos += 1
+
+        while (True):
+            # str.find() is much faster than a regex for skipping long strings without escapes (e.g., base64 images).
+            quote_index = self._buffer.find('"', self._pos)
+            end_index = len(self._buffer) if (quote_index == -1) else quote_index
+            escape_index = self._buffer.find('\\', self._pos, end_index)
+
+            if (escape_index == -1):
+                if (quote_index != -1):
+                    self._pos = quote_index + 1
+                    return
+
+                # Nothing in the rest of the buffer matters.
+                self._pos = len(self._buffer)
+            else:
+                # Skip escapes (and everything between them), stopping at the closing quote,
+                # or at the end of the buffer (possibly at a backslash whose escaped character has not been read yet).
+                match = _STRING_BODY.match(self._buffer, escape_index)
+                self._pos = match.end() if (match is not None) else escape_index
+
+                if ((self._pos < len(self._buffer)) and (self._buffer[self._pos] == '"')):
+                    self._pos += 1
+                    return
+
+            if (not self._fill(self._chunk_size)):
+                raise self._error("Unterminated string")
+
+    def _skip_container(self) -> None:
+        """ Skip over an object or array (starting at its opening bracket). """
+
+        depth = 0
+
+        while (True):
+            match = _CONTAINER_SPECIAL.search(self._buffer, self._pos)
+            if (match is None):
+                self._pos = len(self._buffer)
+                if (not self._fill(self._chunk_size)):
+                    raise self._error("Unterminated object or array")
+
+                continue
+
+            char = match.group()
+            if (char == '"'):
+                self._pos = match.start()
+                self._skip_string()
+                continue
+
+            self._pos = match.end()
+
+            if (char in ('{', '[')):
+                depth += 1
+            else:
+                depth -= 1
+                if (depth == 0):
+                    return
+
+    def _skip_scalar(self) -> None:
+        """ Skip over a number, true, false, or null. """
+
+        while (True):
+            match = _SCALAR_END.search(self._buffer, self._pos)
+            if (match is not None):
+                self._pos = match.start()
+                return
+
+            self._pos = len(self._buffer)
+            if (not self._fill(self._chunk_size)):
+                return
+
+    def _skip_whitespace(self) -> None:
+        while (True):
+            match = _WHITESPACE.match(self._buffer, self._pos)
+            self._pos = match.end() if (match is not None) else self._pos
+
+            if ((self._pos < len(self._buffer)) or (not self._fill(self._chunk_size))):
+                return
+
+    def _expect(self, expected: str) -> None:
+        self._skip_whitespace()
+        if (self._next() != expected):
+            raise self._error(f"Expected '{expected}'")
+
+    def _peek(self) -> str:
+        """ Get the next character (without consuming it), or an empty string at the end of the file. """
+
+        if ((self._pos >= len(self._buffer)) and (not self._fill(self._chunk_size))):
+            return ''
+
+        return self._buffer[self._pos]
+
+    def _next(self) -> str:
+        """ Consume the next character, or return an empty string at the end of the file. """
+
+        char = self._peek()
+        if (char != ''):
+            self._pos += 1
+
+        return char
+
+    def _fill(self, size: int) -> bool:
+        """
+        Read more of the file into the buffer (dropping what has already been consumed).
+        Return false if the end of the file has been reached.
+        """
+
+        if (self._eof):
+            return False
+
+        data = self._file.read(size)
+        if (data == ''):
+            self._eof = True
+            return False
+
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+
+        return True
+
+    def _error(self, message: str) -> ValueError:
+        return ValueError(f"{message} (near: {self._buffer[self._pos:self._pos + 20]!r}).")
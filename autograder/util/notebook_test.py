@@ -0,0 +1,108 @@
+import glob
+import os
+import typing
+
+import edq.testing.unittest
+import edq.util.code
+import edq.util.dirent
+import edq.util.json
+
+import autograder.util.notebook
+
+THIS_DIR: str = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+CODE_TESTDATA_DIR: str = os.path.join(THIS_DIR, '..', 'testdata', 'code')
+
+CHUNK_SIZES: typing.List[int] = [1, 7, autograder.util.notebook.DEFAULT_CHUNK_SIZE]
+
+class TestNotebook(edq.testing.unittest.BaseTest):
+    """ Test streaming code out of notebooks. """
+
+    def test_extract_notebook_code_testdata(self) -> None:
+        """ Test that the streamed code matches the (non-streaming) edq extraction. """
+
+        paths = sorted(glob.glob(os.path.join(CODE_TESTDATA_DIR, '*.ipynb')))
+        self.assertGreater(len(paths), 0)
+
+        for path in paths:
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(path = os.path.basename(path), chunk_size = chunk_size):
+                    expected = edq.util.code.extract_notebook_code(path)
+                    actual = autograder.util.notebook.extract_notebook_code(path, chunk_size = chunk_size)
+                    self.assertEqual(expected, actual)
+
+                    expected = edq.util.code.extract_code(path)
+                    actual = autograder.util.notebook.extract_code(path, chunk_size = chunk_size)
+                    self.assertEqual(expected, actual)
+
+    def test_extract_notebook_code_outputs(self) -> None:
+        """ Test notebooks with large and awkward (escapes, nesting, scalars) values to skip. """
+
+        notebook = {
+            'metadata': {'kernelspec': {'name': 'python3', 'display_name': 'Python 3 "quoted" \\ [{'}},
+            'nbformat': 4,
+            'nbformat_minor': 5,
+            'cells': [
+                {
+                    'cell_type': 'markdown',
+                    'metadata': {},
+                    'source': ['# Some Code'],
+                },
+                {
+                    'outputs': [
+                        {
+                            'output_type': 'display_data',
+                            'data': {'image/png': 'A' * 100000, 'text/plain': ['"}]', '\\"', '\u00e9\u2603']},
+                            'metadata': {'nested': [[[{}]], [], None, True, False, -1.5e10]},
+                        },
+                    ],
+                    'execution_count': 12345,
+                    'cell_type': 'code',
+                    'metadata': {'tags': []},
+                    'source': ['def f():\n', '    return "\u2603 \\"}]"\n'],
+                },
+                {
+                    'cell_type': 'code',
+                    'execution_count': None,
+                    'outputs': [],
+                    'source': '   ',
+                },
+                {
+                    'cell_type': 'code',
+                    'source': 'x = 1',
+                    'outputs': [{'text': ['\\' * 10]}],
+                },
+            ],
+        }
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-notebook-')
+        path = os.path.join(temp_dir, 'test.ipynb')
+
+        for indent in [None, 1]:
+            edq.util.json.dump_path(notebook, path, indent = indent)
+            expected = edq.util.code.extract_notebook_code(path)
+
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(indent = indent, chunk_size = chunk_size):
+                    actual = autograder.util.notebook.extract_notebook_code(path, chunk_size = chunk_size)
+                    self.assertEqual(expected, actual)
+
+    def test_extract_notebook_code_errors(self) -> None:
+        """ Test malformed notebooks. """
+
+        temp_dir = edq.util.dirent.get_temp_dir('autograder-test-notebook-')
+        path = os.path.join(temp_dir, 'test.ipynb')
+
+        test_cases = [
+            '',
+            '[]',
+            '{"cells": [',
+            '{"cells": [{"cell_type": "code", "source": "x = 1"}], "metadata": {"a": "b}}',
+            '{"cells": []} []',
+        ]
+
+        for (i, contents) in enumerate(test_cases):
+            edq.util.dirent.write_file(path, contents)
+
+            with self.subTest(i = i, contents = contents):
+                with self.assertRaisesRegex(ValueError, 'Failed to read notebook'):
+                    autograder.util.notebook.extract_notebook_code(path, chunk_size = 3)
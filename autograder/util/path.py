@@ -1,4 +1,5 @@
 import os
+import stat
 import typing
 
 THIS_DIR: str = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
@@ -47,6 +48,34 @@ def is_local(path: str) -> bool:
 
     return True
 
+def ensure_private_dir(path: str) -> str:
+    """
+    Create (if it does not exist, with access only for the current user) and return the absolute path to a private dir.
+    This should be used for any dir whose contents are trusted (e.g., caches of code or results).
+    Raise a ValueError if the path is not a dir (links are not followed), is owned by another user,
+    or can be written to by other users.
+    Ownership and permissions are only checked on platforms with POSIX permissions.
+    """
+
+    path = os.path.abspath(path)
+    os.makedirs(path, mode = 0o700, exist_ok = True)
+
+    if (not hasattr(os, 'getuid')):
+        return path
+
+    path_stat = os.lstat(path)
+
+    if (not stat.S_ISDIR(path_stat.st_mode)):
+        raise ValueError(f"Private dir is not a dir: '{path}'.")
+
+    if (path_stat.st_uid != os.getuid()):
+        raise ValueError(f"Private dir is not owned by the current user: '{path}'.")
+
+    if ((path_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)) != 0):
+        raise ValueError(f"Private dir can be written to by other users (mode {oct(stat.S_IMODE(path_stat.st_mode))}): '{path}'.")
+
+    return path
+
 def _is_reserved(path: str) -> bool:
     """
     A very weak version of ntpath.isreserved(path) (which was added in version 3.13).
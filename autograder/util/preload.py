@@ -0,0 +1,119 @@
+"""
+Preload (import) modules in a parent process before it forks grading processes.
+
+Forked children inherit everything the parent has already imported (sharing the memory copy-on-write),
+so heavy modules (e.g., numpy, scipy, pandas, matplotlib) that are imported once in the parent
+do not need to be imported again by every question or submission process.
+
+Modules preloaded in this process are tracked, so the time saved can be reported (see get_report()).
+"""
+
+import importlib
+import sys
+import time
+import typing
+
+import edq.util.serial
+
+class PreloadedModule(edq.util.serial.DictConverter):
+    """ A module that was requested to be preloaded. """
+
+    def __init__(self,
+            name: str = '',
+            import_sec: float = 0.0,
+            already_loaded: bool = False,
+            error: str = '',
+            **kwargs: typing.Any) -> None:
+        self.name: str = name
+        """ The name of the module. """
+
+        self.import_sec: float = import_sec
+        """ The time (in seconds) it took to import the module (and everything it imports that was not already loaded). """
+
+        self.already_loaded: bool = already_loaded
+        """ Whether the module was already loaded before it was preloaded (so preloading did not take any time). """
+
+        self.error: str = error
+        """ Why the module could not be imported (empty if it was imported). """
+
+class PreloadReport(edq.util.serial.DictConverter):
+    """ A summary of preloaded modules. """
+
+    def __init__(self,
+            modules: typing.Union[typing.List[PreloadedModule], None] = None,
+            **kwargs: typing.Any) -> None:
+        if (modules is None):
+            modules = []
+
+        self.modules: typing.List[PreloadedModule] = modules
+        """ The modules that were requested to be preloaded (in the order they were requested). """
+
+    def import_sec(self) -> float:
+        """ Get the total time (in seconds) spent importing modules. """
+
+        return sum(module.import_sec for module in self.modules)
+
+    def report(self, num_children: int = 0) -> str:
+        """
+        Return a string representation of the preloaded modules and the import time they saved.
+        Each forked child (`num_children`) would have otherwise spent (up to) the same import time on its own.
+        """
+
+        lines = []
+        for module in self.modules:
+            if (module.error != ''):
+                status = f"failed ({module.error})"
+            elif (module.already_loaded):
+                status = 'already loaded'
+            else:
+                status = f"{module.import_sec:.3f}s"
+
+            lines.append(f"    {module.name}: {status}")
+
+        import_sec = self.import_sec()
+        lines.insert(0, f"Preloaded {len(self.modules)} module(s) in {import_sec:.3f}s (saves up to {import_sec:.3f}s per forked process).")
+
+        if (num_children > 0):
+            lines.append(f"Saved up to {import_sec * num_children:.3f}s of import time across {num_children} forked process(es).")
+
+        return "\n".join(lines)
+
+_preloaded: typing.Dict[str, PreloadedModule] = {}
+""" All the modules preloaded in this process (keyed by name). """
+
+def preload_modules(names: typing.Union[typing.Sequence[str], None]) -> PreloadReport:
+    """
+    Import each of the named modules (in order).
+    Modules that cannot be imported are reported (but do not raise).
+    Return a report on just these modules (see get_report() for all the modules preloaded in this process).
+    """
+
+    if (names is None):
+        names = []
+
+    modules = []
+    for name in names:
+        if (name in _preloaded):
+            modules.append(_preloaded[name])
+            continue
+
+        module = PreloadedModule(name = name, already_loaded = (name in sys.modules))
+
+        if (not module.already_loaded):
+            start_time = time.perf_counter()
+
+            try:
+                importlib.import_module(name)
+                module.import_sec = time.perf_counter() - start_time
+            except Exception as ex:
+                module.error = f"{type(ex).__name__}: {ex}"
+
+        _preloaded[name] = module
+        modules.append(module)
+
+    return PreloadReport(modules = modules)
+
+def get_report() -> PreloadReport:
+    """ Get a report on all the modules preloaded in this process. """
+
+    return PreloadReport(modules = list(_preloaded.values()))
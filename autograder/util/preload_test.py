@@ -0,0 +1,43 @@
+import sys
+
+import edq.testing.unittest
+
+import autograder.util.preload
+
+class TestPreload(edq.testing.unittest.BaseTest):
+    """ Test preloading modules. """
+
+    def test_preload_modules_base(self) -> None:
+        """ Test preloading new, already loaded, and missing modules. """
+
+        # A small stdlib module that nothing else imports.
+        new_module = 'colorsys'
+        sys.modules.pop(new_module, None)
+
+        names = ['os', new_module, 'autograder_zzz_missing_module']
+        report = autograder.util.preload.preload_modules(names)
+
+        self.assertEqual(names, [module.name for module in report.modules])
+        self.assertEqual([True, False, False], [module.already_loaded for module in report.modules])
+        self.assertEqual('', report.modules[0].error)
+        self.assertEqual('', report.modules[1].error)
+        self.assertIn('ModuleNotFoundError', report.modules[2].error)
+
+        self.assertIn(new_module, sys.modules)
+        self.assertEqual(0.0, report.modules[0].import_sec)
+        self.assertEqual(0.0, report.modules[2].import_sec)
+        self.assertAlmostEqual(report.modules[1].import_sec, report.import_sec())
+
+        text = report.report(num_children = 10)
+        self.assertIn('Preloaded 3 module(s)', text)
+        self.assertIn('os: already loaded', text)
+        self.assertIn('autograder_zzz_missing_module: failed (ModuleNotFoundError', text)
+        self.assertIn('across 10 forked process(es)', text)
+
+        # Modules are only loaded once, and are remembered for the process-wide report.
+        again = autograder.util.preload.preload_modules([new_module])
+        self.assertEqual(report.modules[1], again.modules[0])
+
+        all_names = [module.name for module in autograder.util.preload.get_report().modules]
+        for name in names:
+            self.assertIn(name, all_names)
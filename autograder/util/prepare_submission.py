@@ -1,13 +1,53 @@
+import logging
+import marshal
 import os
+import sys
 import types
 import typing
+import uuid
 
+import edq
 import edq.util.code
+import edq.util.dirent
+import edq.util.hash
+
+import autograder.util.notebook
+import autograder.util.path
 
 ALL_SUBMISSION_KEY: str = '__all__'
 ALLOWED_EXTENSIONS: typing.List[str] = ['.py', '.ipynb']
 
-def prepare(path: str, raise_on_collision: bool = False) -> object:
+CACHE_VERSION: int = 1
+""" Bump this to invalidate all existing cached code (e.g., when sanitization changes). """
+
+CACHE_STAT_HITS: str = 'hits'
+CACHE_STAT_MISSES: str = 'misses'
+
+_cache_stats: typing.Dict[str, int] = {
+    CACHE_STAT_HITS: 0,
+    CACHE_STAT_MISSES: 0,
+}
+
+_logger = logging.getLogger(__name__)
+
+def get_cache_stats() -> typing.Dict[str, int]:
+    """ Get the number of code cache hits and misses (in this process) since the last reset. """
+
+    return dict(_cache_stats)
+
+def reset_cache_stats() -> None:
+    """ Reset the code cache hit/miss counters. """
+
+    for key in _cache_stats:
+        _cache_stats[key] = 0
+
+def prepare(
+        path: str,
+        raise_on_collision: bool = False,
+        use_cache: bool = False,
+        cache_dir: typing.Union[str, None] = None,
+        lazy: bool = False,
+        ) -> object:
     """
     Get a submission from a path, prepare it for grading,
     and return a submission namespace that contains all parsed entities.
@@ -26,22 +66,64 @@ def prepare(path: str, raise_on_collision: bool = False) -> object:
         4) All entries in the module will be put in the ALL_SUBMISSION_KEY attribute of the
             returned namespace.
             If raise_on_collision is True, an error will be raised if a key already exists.
+
+    If use_cache is True, the sanitized and compiled code for each file will be cached on disk
+    (in cache_dir, which is required) and keyed by the file's contents,
+    so unchanged files do not need to be parsed and sanitized again (see get_cache_stats()).
+    Cached code is executed as-is, so the cache dir must be private to the grading user
+    (see autograder.util.path.ensure_private_dir()) and must never be writable by submissions.
+    If the cache dir cannot be created, is not private, or cannot be written to, files are prepared without the cache.
+
+    If lazy is True, files will not be imported until an entry from them is accessed
+    (e.g., `submission.a.b.c.foo` will only import "./a/b/c.py" (and "./a/b/c.ipynb")).
+    Looking up an entry in ALL_SUBMISSION_KEY will import files (last to first) until one defines the entry
+    (or all files when raise_on_collision is True), and listing entries (e.g., with dir()) will import all relevant files.
+    Entries are converted and checked for collisions the same way as an eager preparation,
+    but errors (including import errors) are only raised when the affected entries are accessed.
+    Note that submissions are usually graded in child processes,
+    so use preload() before grading to do the imports once (in the parent) instead of in each child.
     """
 
+    if (not use_cache):
+        cache_dir = None
+    elif (cache_dir is None):
+        raise ValueError("A cache dir must be given to use the code cache.")
+    else:
+        try:
+            cache_dir = autograder.util.path.ensure_private_dir(cache_dir)
+        except (OSError, ValueError) as ex:
+            _logger.warning("Could not use the code cache dir '%s', not using the cache: '%s'.", cache_dir, ex)
+            cache_dir = None
+
+    if (lazy):
+        return _prepare_lazy(path, raise_on_collision, cache_dir)
+
     submission: typing.Dict[str, typing.Any] = {}
 
     if (os.path.isfile(path)):
-        _prepare_submission_file(submission, path, [], raise_on_collision)
+        _prepare_submission_file(submission, path, [], raise_on_collision, cache_dir)
     else:
-        _prepare_submission_dir(submission, path, [], raise_on_collision)
+        _prepare_submission_dir(submission, path, [], raise_on_collision, cache_dir)
 
     return _dict_to_namespace(submission)
 
+def preload(submission: typing.Any) -> None:
+    """
+    Import all the files of a lazy submission (see prepare()) in this process,
+    so processes forked from this one do not need to import them again.
+    Errors are remembered and raised when the affected entries are accessed (like a normal lazy import).
+    Does nothing for submissions that were not prepared lazily.
+    """
+
+    if (isinstance(submission, _LazyNamespace)):
+        submission._lazy_loader.preload()  # pylint: disable=protected-access
+
 def _prepare_submission_dir(
         submission: typing.Dict[str, typing.Any],
         path: str,
         prefix: typing.List[str],
         raise_on_collision: bool,
+        cache_dir: typing.Union[str, None],
         ) -> None:
     """ Prepare a submission directory. """
 
@@ -55,15 +137,16 @@ def _prepare_submission_dir(
             if (os.path.splitext(dirent)[1] not in ALLOWED_EXTENSIONS):
                 continue
 
-            _prepare_submission_file(submission, dirent_path, prefix, raise_on_collision)
+            _prepare_submission_file(submission, dirent_path, prefix, raise_on_collision, cache_dir)
         else:
-            _prepare_submission_dir(submission, dirent_path, prefix + [dirent], raise_on_collision)
+            _prepare_submission_dir(submission, dirent_path, prefix + [dirent], raise_on_collision, cache_dir)
 
 def _prepare_submission_file(
         submission: typing.Dict[str, typing.Any],
         path: str,
         prefix: typing.List[str],
         raise_on_collision: bool,
+        cache_dir: typing.Union[str, None],
         ) -> None:
     """ Prepare a submission file. """
 
@@ -72,7 +155,7 @@ def _prepare_submission_file(
 
     basename = os.path.splitext(os.path.basename(path))[0]
 
-    defs = vars(edq.util.code.sanitize_and_import_path(path))
+    defs = _import_file(path, cache_dir)
 
     for (name, value) in defs.items():
         if (name.startswith('__')):
@@ -99,6 +182,265 @@ def _prepare_submission_file(
 
     context.update(defs)
 
+def _prepare_lazy(path: str, raise_on_collision: bool, cache_dir: typing.Union[str, None]) -> object:
+    """ Build a lazy submission namespace (see prepare()) by only walking the files (without importing them). """
+
+    # {name: ([file path, ...], children, [subtree file path, ...]), ...}
+    root: typing.Dict[str, typing.Any] = {}
+    paths: typing.List[str] = []
+    top_level_names: typing.List[str] = []
+
+    def add_file(file_path: str, prefix: typing.List[str]) -> None:
+        parts = prefix + [os.path.splitext(os.path.basename(file_path))[0]]
+        context = root
+        node = None
+
+        for part in parts:
+            node = context.setdefault(part, ([], {}, []))
+            node[2].append(file_path)
+            context = node[1]
+
+        typing.cast(typing.Tuple[typing.List[str], typing.Dict, typing.List[str]], node)[0].append(file_path)
+        paths.append(file_path)
+        top_level_names.append(parts[0])
+
+    def add_dir(dir_path: str, prefix: typing.List[str]) -> None:
+        if (not os.path.isdir(dir_path)):
+            raise ValueError(f"Preparation target must be a dir: '{dir_path}'.")
+
+        for dirent in os.listdir(dir_path):
+            dirent_path = os.path.join(dir_path, dirent)
+
+            if (os.path.isfile(dirent_path)):
+                if (os.path.splitext(dirent)[1] in ALLOWED_EXTENSIONS):
+                    add_file(dirent_path, prefix)
+            else:
+                add_dir(dirent_path, prefix + [dirent])
+
+    if (os.path.isfile(path)):
+        add_file(path, [])
+    else:
+        add_dir(path, [])
+
+    loader = _LazyLoader(paths, top_level_names, raise_on_collision, cache_dir)
+
+    def build(files: typing.List[str], children: typing.Dict[str, typing.Any], subtree_paths: typing.List[str]) -> '_LazyNamespace':
+        built = {name: build(*child) for (name, child) in children.items()}
+        child_paths = {name: child[2] for (name, child) in children.items()}
+        return _LazyNamespace(loader, files, built, child_paths)
+
+    submission = build([], root, paths)
+    submission.__dict__[ALL_SUBMISSION_KEY] = _LazyAllNamespace(loader)
+
+    return submission
+
+class _LazyLoader:
+    """ Imports (and remembers) the files for a lazy submission. """
+
+    def __init__(self,
+            paths: typing.List[str],
+            top_level_names: typing.List[str],
+            raise_on_collision: bool,
+            cache_dir: typing.Union[str, None],
+            ) -> None:
+        self.paths: typing.List[str] = paths
+        """ All the submission's files, in the same order an eager preparation would import them. """
+
+        self.top_level_names: typing.List[str] = top_level_names
+        """ The top-level submission entry (dir or file name) for each file in `paths`. """
+
+        self.raise_on_collision: bool = raise_on_collision
+        """ See prepare(). """
+
+        self.cache_dir: typing.Union[str, None] = cache_dir
+        """ See prepare(). """
+
+        self._defs: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        self._errors: typing.Dict[str, Exception] = {}
+
+    def load(self, path: str) -> typing.Dict[str, typing.Any]:
+        """
+        Get the entries defined in a file, importing it if necessary.
+        Entries are converted like an eager preparation (dicts become namespaces).
+        """
+
+        if (path in self._errors):
+            raise self._errors[path]
+
+        if (path not in self._defs):
+            defs = _import_file(path, self.cache_dir)
+            self._defs[path] = {name: _dict_to_namespace(value) for (name, value) in defs.items()}
+
+        return self._defs[path]
+
+    def preload(self) -> None:
+        """ Import every file, remembering any errors for when the file is accessed. """
+
+        for path in self.paths:
+            if ((path in self._defs) or (path in self._errors)):
+                continue
+
+            try:
+                self.load(path)
+            except Exception as ex:
+                self._errors[path] = ex
+
+    def find(self, name: str) -> typing.Tuple[bool, typing.Any]:
+        """
+        Find the value for a top-level entry (like a lookup in ALL_SUBMISSION_KEY).
+        Later files take precedence (matching eager preparation), so files are searched last to first.
+        """
+
+        for path in reversed(self.paths):
+            defs = self.load(path)
+            if (name in defs):
+                return True, defs[name]
+
+        return False, None
+
+    def load_all(self) -> typing.Dict[str, typing.Any]:
+        """
+        Import all files and get the combined top-level entries (like ALL_SUBMISSION_KEY).
+        Collisions are checked the same way as an eager preparation:
+        against the top-level submission entries (dirs and files) of the files before each one.
+        """
+
+        entries: typing.Dict[str, typing.Any] = {}
+        seen_top_level_names: typing.Set[str] = set()
+
+        for (path, top_level_name) in zip(self.paths, self.top_level_names):
+            for (name, value) in self.load(path).items():
+                if (name.startswith('__')):
+                    continue
+
+                if ((name in seen_top_level_names) and (self.raise_on_collision)):
+                    raise ValueError(f"Name collision ('{name}') when importing all keys for '{path}'.")
+
+                entries[name] = value
+
+            seen_top_level_names.add(top_level_name)
+
+        return entries
+
+    def index(self, path: str) -> int:
+        """ Get the order a file is imported in (see `paths`). """
+
+        return self.paths.index(path)
+
+class _LazyNamespace:
+    """
+    A namespace for a lazy submission (see prepare()).
+    Child namespaces (for dirs and files) are available immediately,
+    and the entries for this namespace's files are imported on the first lookup that misses.
+    If this namespace has both files and children (e.g., "a.py" and "a/"),
+    then its files are imported on the first lookup (since their entries may replace children).
+    """
+
+    __slots__ = ('_lazy_loader', '_lazy_paths', '_lazy_children', '_lazy_held_children', '__dict__')
+
+    def __init__(self,
+            loader: _LazyLoader,
+            paths: typing.List[str],
+            children: typing.Dict[str, typing.Any],
+            child_paths: typing.Union[typing.Dict[str, typing.List[str]], None] = None,
+            ) -> None:
+        if (child_paths is None):
+            child_paths = {}
+
+        self._lazy_loader = loader
+        self._lazy_paths = paths
+
+        # {child name: [file path in the child's subtree, ...], ...}
+        self._lazy_children = child_paths
+
+        # Children that are only added once this namespace's files are imported.
+        self._lazy_held_children: typing.Dict[str, typing.Any] = {}
+
+        if (len(paths) > 0):
+            self._lazy_held_children = children
+        else:
+            self.__dict__.update(children)
+
+    def __getattr__(self, name: str) -> typing.Any:
+        # Only called on a failed lookup.
+        if (name.startswith('__') or name.startswith('_lazy_') or (len(self._lazy_paths) == 0)):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'.")
+
+        self._lazy_load()
+        return getattr(self, name)
+
+    def __dir__(self) -> typing.Iterable[str]:
+        self._lazy_load()
+        return super().__dir__()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(sorted(self.__dict__.keys()))})"
+
+    def _lazy_load(self) -> None:
+        """
+        Import this namespace's files.
+        Entries that have the same name as a child (dir or file) are handled like an eager preparation
+        (which imports files in order): the entry replaces the child if the child's files were imported first,
+        and is an error if any of the child's files would be imported after it.
+        """
+
+        self.__dict__.update(self._lazy_held_children)
+        self._lazy_held_children = {}
+
+        for path in self._lazy_paths:
+            defs = self._lazy_loader.load(path)
+            index = self._lazy_loader.index(path)
+
+            for (name, value) in defs.items():
+                child_paths = self._lazy_children.get(name, None)
+                if (child_paths is not None):
+                    if (max(self._lazy_loader.index(child_path) for child_path in child_paths) > index):
+                        raise ValueError(f"Name collision ('{name}') when importing all keys for '{child_paths[-1]}'.")
+
+                    self._lazy_children.pop(name)
+
+                self.__dict__[name] = value
+
+        self._lazy_paths = []
+
+class _LazyAllNamespace(_LazyNamespace):
+    """ A lazy namespace for ALL_SUBMISSION_KEY. """
+
+    __slots__ = ('_lazy_complete', )
+
+    def __init__(self, loader: _LazyLoader) -> None:
+        super().__init__(loader, [], {})
+        self._lazy_complete = False
+
+    def __getattr__(self, name: str) -> typing.Any:
+        if (name.startswith('__') or name.startswith('_lazy_') or self._lazy_complete):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'.")
+
+        if (self._lazy_loader.raise_on_collision):
+            self._lazy_load()
+            return getattr(self, name)
+
+        found, value = self._lazy_loader.find(name)
+        if (not found):
+            raise AttributeError(f"Submission has no entry '{name}'.")
+
+        self.__dict__[name] = value
+        return value
+
+    def _lazy_load(self) -> None:
+        if (not self._lazy_complete):
+            self.__dict__.update(self._lazy_loader.load_all())
+            self._lazy_complete = True
+
+def _import_file(path: str, cache_dir: typing.Union[str, None]) -> typing.Dict[str, typing.Any]:
+    """ Import a submission file and get its entries. """
+
+    if (cache_dir is None):
+        source_code = autograder.util.notebook.extract_code(path)
+        return vars(edq.util.code.sanitize_and_import_code(source_code, code_path = path))
+
+    return _import_cached(path, cache_dir)
+
 def _dict_to_namespace(root: typing.Union[typing.Dict, object]) -> object:
     """ Recursively convert a dict to a namespace. """
 
@@ -109,3 +451,98 @@ def _dict_to_namespace(root: typing.Union[typing.Dict, object]) -> object:
         root[key] = _dict_to_namespace(value)
 
     return types.SimpleNamespace(**root)
+
+def _import_cached(path: str, cache_dir: str) -> typing.Dict[str, typing.Any]:
+    """
+    Import a file like edq.util.code.sanitize_and_import_path(),
+    but use a cached code object if the same file contents have already been compiled.
+    """
+
+    code = _get_cached_code(path, cache_dir)
+
+    # Match the import environment of edq.util.code.sanitize_and_import_code().
+    syspath = os.path.dirname(os.path.abspath(os.getcwd()))
+    globals_defs: typing.Dict[str, typing.Any] = {}
+
+    try:
+        sys.path.append(syspath)
+        exec(code, globals_defs)  # pylint: disable=exec-used
+    finally:
+        sys.path.pop()
+
+    return globals_defs
+
+def _get_cached_code(path: str, cache_dir: str) -> types.CodeType:
+    """ Get the compiled (and sanitized) code for a file, using (and populating) the cache. """
+
+    with open(path, 'rb') as file:
+        contents = file.read()
+
+    key = edq.util.hash.sha256_hex("\n".join([
+        str(CACHE_VERSION),
+        sys.implementation.cache_tag or '',
+        edq.__version__,
+        os.path.splitext(path)[1].lower(),
+        edq.util.hash.sha256_hex(contents),
+    ]))
+
+    code_path = os.path.join(cache_dir, key + '.pyc')
+
+    code = None
+    if (os.path.isfile(code_path)):
+        try:
+            with open(code_path, 'rb') as file:
+                code = marshal.load(file)
+        except (EOFError, ValueError, TypeError, OSError):
+            # A bad cache entry is just a miss.
+            code = None
+
+    if (isinstance(code, types.CodeType)):
+        _cache_stats[CACHE_STAT_HITS] += 1
+        return _set_filename(code, path)
+
+    _cache_stats[CACHE_STAT_MISSES] += 1
+
+    module_ast = edq.util.code.parse_module_code(autograder.util.notebook.extract_code(path))
+    code = compile(module_ast, filename = path, mode = 'exec')
+
+    # Caching is best-effort, a failed write (e.g., a full disk) just means a miss next time.
+    try:
+        # Keep the sanitized source next to the code for debugging.
+        _write_cache_file(os.path.join(cache_dir, key + '.py'), edq.util.code.ast_to_source(module_ast).encode())
+        _write_cache_file(code_path, marshal.dumps(code))
+    except OSError as ex:
+        _logger.warning("Failed to write to the code cache '%s': '%s'.", cache_dir, ex)
+
+    return code
+
+def _write_cache_file(path: str, data: bytes) -> None:
+    """ Atomically write a cache file, so concurrent graders never see partial files. """
+
+    edq.util.dirent.mkdir(os.path.dirname(path))
+
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+
+        os.replace(temp_path, path)
+    finally:
+        if (os.path.exists(temp_path)):
+            os.remove(temp_path)
+
+def _set_filename(code: types.CodeType, path: str) -> types.CodeType:
+    """
+    Recursively point a code object (and all nested code objects) at a new file.
+    Cached code may have been compiled from another file with the same contents.
+    """
+
+    if (code.co_filename == path):
+        return code
+
+    consts = tuple(
+        (_set_filename(const, path) if isinstance(const, types.CodeType) else const)
+        for const in code.co_consts
+    )
+
+    return code.replace(co_filename = path, co_consts = consts)
@@ -0,0 +1,272 @@
+"""
+Measure and limit the resources (CPU time, memory, etc.) used by a process.
+Measurements and limits rely on the `resource` module, so they are not available on all platforms (e.g., Windows).
+"""
+
+import errno
+import math
+import os
+import signal
+import sys
+import time
+import typing
+
+import edq.util.serial
+
+LIMIT_MEMORY: str = 'memory'
+LIMIT_CPU: str = 'cpu'
+LIMIT_OPEN_FILES: str = 'open files'
+
+CPU_LIMIT_TOLERANCE_SEC: float = 0.1
+""" How close (in CPU seconds) a killed process must have gotten to its hard CPU limit to have been killed by it. """
+
+class ResourceLimitError(RuntimeError):
+    """
+    This error indicates that code exceeded one of its resource limits (see ResourceLimits).
+    """
+
+    def __init__(self, limit_name: str, limit: typing.Union[float, None] = None) -> None:
+        self.limit_name: str = limit_name
+        """ The name of the limit (one of the LIMIT_* constants). """
+
+        self.limit: typing.Union[float, None] = limit
+        """ The value of the limit (in the limit's units, see ResourceLimits), if known. """
+
+        super().__init__(limit_name, limit)
+
+    def __str__(self) -> str:
+        if (self.limit is None):
+            return f"Exceeded {self.limit_name} limit."
+
+        units = {
+            LIMIT_MEMORY: ' MB',
+            LIMIT_CPU: ' CPU seconds',
+            LIMIT_OPEN_FILES: ' files',
+        }.get(self.limit_name, '')
+
+        return f"Exceeded {self.limit_name} limit ({self.limit:g}{units})."
+
+class ResourceLimits:
+    """
+    Limits on the resources a process may use.
+    Limits are applied with resource.setrlimit(), so they are only available on POSIX platforms.
+    Once applied, limits cannot be removed (the hard limits are lowered),
+    so they should only be applied in a process dedicated to the limited code.
+    """
+
+    def __init__(self,
+            max_memory_mb: typing.Union[float, None] = None,
+            max_cpu_sec: typing.Union[float, None] = None,
+            max_open_files: typing.Union[int, None] = None,
+            ) -> None:
+        self.max_memory_mb: typing.Union[float, None] = max_memory_mb
+        """
+        The most additional memory (address space, in MB) the process may allocate after the limits are applied.
+        Allocations past this limit raise a MemoryError.
+        """
+
+        self.max_cpu_sec: typing.Union[float, None] = max_cpu_sec
+        """
+        The most CPU time (in seconds, rounded up) the process may use after the limits are applied.
+        The process will be killed (with SIGXCPU) past this limit,
+        or with SIGKILL at the hard limit (a second later) if it survives the SIGXCPU (e.g., the signal is handled or ignored).
+        """
+
+        self.max_open_files: typing.Union[int, None] = max_open_files
+        """
+        The most files (file descriptors) the process may have open at the same time.
+        This includes files that are already open when the limits are applied.
+        """
+
+    def is_empty(self) -> bool:
+        """ Check if there are no limits set. """
+
+        return ((self.max_memory_mb is None) and (self.max_cpu_sec is None) and (self.max_open_files is None))
+
+    def apply(self) -> None:
+        """ Apply these limits to the current process. """
+
+        import resource  # pylint: disable=import-outside-toplevel
+
+        if (self.max_memory_mb is not None):
+            limit = _get_address_space_bytes() + int(self.max_memory_mb * 1024 * 1024)
+            _set_limit(resource.RLIMIT_AS, limit, limit)
+
+        if (self.max_cpu_sec is not None):
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            limit = math.ceil(usage.ru_utime + usage.ru_stime + self.max_cpu_sec)
+
+            # Leave a second between the soft limit (SIGXCPU) and the hard limit (SIGKILL).
+            _set_limit(resource.RLIMIT_CPU, limit, limit + 1)
+
+        if (self.max_open_files is not None):
+            _set_limit(resource.RLIMIT_NOFILE, self.max_open_files, self.max_open_files)
+
+    def get_error(self, ex: BaseException) -> typing.Union[ResourceLimitError, None]:
+        """ Get the limit error that an exception (raised while running under these limits) represents, if any. """
+
+        if ((self.max_memory_mb is not None) and isinstance(ex, MemoryError)):
+            return ResourceLimitError(LIMIT_MEMORY, self.max_memory_mb)
+
+        if ((self.max_open_files is not None) and isinstance(ex, OSError) and (ex.errno == errno.EMFILE)):
+            return ResourceLimitError(LIMIT_OPEN_FILES, self.max_open_files)
+
+        return None
+
+def get_exit_error(
+        exitcode: typing.Union[int, None],
+        limits: typing.Union[ResourceLimits, None] = None,
+        cpu_time: typing.Union[float, None] = None,
+        hard_cpu_limit: typing.Union[float, None] = None,
+        ) -> typing.Union[ResourceLimitError, None]:
+    """
+    Get the limit error that caused a process to exit (according to its exit code), if any.
+    A process that was killed with SIGKILL is only considered to have hit the hard CPU limit
+    (after surviving the soft limit's SIGXCPU, see ResourceLimits.apply())
+    if its CPU time (in seconds) reached its hard CPU limit (see get_hard_cpu_limit()).
+    Other SIGKILLs (e.g., from the OOM killer or `kill -9`) are not limit errors.
+    """
+
+    if ((exitcode is None) or (not hasattr(signal, 'SIGXCPU'))):
+        return None
+
+    limit = None
+    if (limits is not None):
+        limit = limits.max_cpu_sec
+
+    if (exitcode == -signal.SIGXCPU):
+        return ResourceLimitError(LIMIT_CPU, limit)
+
+    if ((exitcode == -signal.SIGKILL) and (limit is not None)
+            and (cpu_time is not None) and (hard_cpu_limit is not None)
+            and (cpu_time >= (hard_cpu_limit - CPU_LIMIT_TOLERANCE_SEC))):
+        return ResourceLimitError(LIMIT_CPU, limit)
+
+    return None
+
+def get_hard_cpu_limit(pid: typing.Union[int, None]) -> typing.Union[float, None]:
+    """
+    Get the hard CPU time limit (in seconds) of a (Linux) process that has not been reaped yet.
+    Returns None if the process has no CPU limit or the limit cannot be found.
+    """
+
+    if (pid is None):
+        return None
+
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+        _, hard = resource.prlimit(pid, resource.RLIMIT_CPU)
+    except (ImportError, AttributeError, OSError):
+        return None
+
+    if (hard == resource.RLIM_INFINITY):
+        return None
+
+    return float(hard)
+
+class ResourceUsage(edq.util.serial.DictConverter):
+    """ The resources used while running some code. """
+
+    def __init__(self,
+            user_cpu_sec: float = 0.0,
+            system_cpu_sec: float = 0.0,
+            wall_sec: float = 0.0,
+            peak_rss_kb: int = 0,
+            **kwargs: typing.Any) -> None:
+        self.user_cpu_sec: float = user_cpu_sec
+        """ The CPU time spent in user mode (in seconds). """
+
+        self.system_cpu_sec: float = system_cpu_sec
+        """ The CPU time spent in kernel mode (in seconds). """
+
+        self.wall_sec: float = wall_sec
+        """ The (wall clock) time spent (in seconds). """
+
+        self.peak_rss_kb: int = peak_rss_kb
+        """
+        The largest resident set size (in kilobytes) of the process while the code was running.
+        If the peak could not be reset before the code started (see UsageTracker),
+        then this may also include memory used before the code started.
+        """
+
+class UsageTracker:
+    """
+    Track the resources used by the current process, starting from when the tracker is created.
+    Usage is only measured for the current process (not children),
+    so code should generally be tracked in its own process (e.g., inside with_timeout()).
+    """
+
+    def __init__(self) -> None:
+        self._start_wall: float = time.monotonic()
+        self._start_usage: typing.Any = _get_rusage()
+
+        _reset_peak_rss()
+
+    def get_usage(self) -> typing.Union[ResourceUsage, None]:
+        """ Get the resources used since this tracker was created, or None if usage cannot be measured on this platform. """
+
+        end_wall = time.monotonic()
+        end_usage = _get_rusage()
+
+        if ((self._start_usage is None) or (end_usage is None)):
+            return None
+
+        peak_rss_kb = end_usage.ru_maxrss
+        if (sys.platform == 'darwin'):
+            # Mac reports bytes instead of kilobytes.
+            peak_rss_kb //= 1024
+
+        return ResourceUsage(
+            user_cpu_sec = (end_usage.ru_utime - self._start_usage.ru_utime),
+            system_cpu_sec = (end_usage.ru_stime - self._start_usage.ru_stime),
+            wall_sec = (end_wall - self._start_wall),
+            peak_rss_kb = peak_rss_kb,
+        )
+
+def _get_rusage() -> typing.Any:
+    """ Get the resource usage of the current process, or None if it is not available. """
+
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF)
+
+def _reset_peak_rss() -> None:
+    """
+    Try to reset the peak RSS of the current process (only available on Linux, see proc(5)),
+    so the peak only reflects the memory used after this point.
+    """
+
+    if (not sys.platform.startswith('linux')):
+        return
+
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding = 'utf-8') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+def _set_limit(kind: int, soft: int, hard: int) -> None:
+    """ Lower a resource limit (a limit can never be raised above its current hard limit). """
+
+    import resource  # pylint: disable=import-outside-toplevel
+
+    _, current_hard = resource.getrlimit(kind)
+    if (current_hard != resource.RLIM_INFINITY):
+        soft = min(soft, current_hard)
+        hard = min(hard, current_hard)
+
+    resource.setrlimit(kind, (soft, hard))
+
+def _get_address_space_bytes() -> int:
+    """ Get the current size of this process' address space (zero if it cannot be found). """
+
+    try:
+        with open('/proc/self/statm', 'r', encoding = 'utf-8') as file:
+            pages = int(file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0
+
+    return pages * os.sysconf('SC_PAGE_SIZE')
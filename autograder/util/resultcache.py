@@ -0,0 +1,298 @@
+"""
+A cache of question results, so that regrading only reruns the questions whose inputs have changed.
+
+A result is keyed by:
+ - the contents of the submission (the input dir),
+ - the source of the question's class (and any of its base classes from the grader),
+ - the source of the rest of the grader's module (everything but the question classes),
+ - the question's settings (its instance variables),
+ - and the assignment's additional data.
+So, changing a single question class only invalidates that question's results,
+while changing shared code (like a helper function) invalidates every question in that module.
+Code from other modules (like modules the grader imports) is not considered.
+
+The cache is a dir of JSON files (one per result), and is bounded by the number of results it holds.
+When the cache grows past its bound, the least recently used results are evicted.
+Cached results are trusted as-is, so the cache dir must be private to the grading user
+(see autograder.util.path.ensure_private_dir()).
+If the cache dir cannot be created or is not private, then the cache is disabled (every lookup misses and nothing is stored).
+"""
+
+import ast
+import hashlib
+import inspect
+import logging
+import os
+import sys
+import typing
+import uuid
+
+import edq.util.dirent
+import edq.util.hash
+import edq.util.json
+
+import autograder.question
+import autograder.util.path
+
+CACHE_VERSION: int = 1
+""" Bump this to invalidate all existing cached results. """
+
+DEFAULT_MAX_ENTRIES: int = 10000
+
+EVICTION_RATIO: float = 0.9
+""" When evicting, the cache is shrunk to this fraction of its max size (so evictions are not done on every write). """
+
+RESULT_EXTENSION: str = '.json'
+
+IGNORE_QUESTION_ATTRIBUTES: typing.Set[str] = {'result', '_complete'}
+""" Question attributes that hold the state of the last grading (and not the question's settings). """
+
+_logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """ A bounded, on-disk cache of GradedQuestions (see the module docs). """
+
+    def __init__(self, cache_dir: str, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        if (max_entries < 1):
+            raise ValueError(f"Result cache max entries must be positive, got {max_entries}.")
+
+        self.cache_dir: str = os.path.abspath(cache_dir)
+        """ The dir that holds the cached results. """
+
+        self.max_entries: int = max_entries
+        """ The most results this cache will hold. """
+
+        self.hits: int = 0
+        """ The number of lookups that found a result. """
+
+        self.misses: int = 0
+        """ The number of lookups that did not find a result. """
+
+        self._num_entries: typing.Union[int, None] = None
+        """ The number of results in the cache (lazily counted). """
+
+        self._module_hashes: typing.Dict[str, str] = {}
+        """ The hash of each grader module's shared (non-question) source, keyed by module name. """
+
+        self.enabled: bool = self._ensure_cache_dir()
+        """ Whether the cache dir is usable (see the module docs). """
+
+    def get_key(self,
+            question: autograder.question.Question,
+            submission_hash: str,
+            additional_data: typing.Union[typing.Dict[str, typing.Any], None] = None,
+            ) -> str:
+        """ Compute the key for a question's result (see the module docs). """
+
+        state = {name: value for (name, value) in vars(question).items() if (name not in IGNORE_QUESTION_ATTRIBUTES)}
+
+        parts = [
+            str(CACHE_VERSION),
+            submission_hash,
+            self._get_question_source_hash(question),
+            _dumps(state),
+            _dumps(additional_data),
+        ]
+
+        return edq.util.hash.sha256_hex("\n".join(parts))
+
+    def get(self, key: str) -> typing.Union[autograder.question.GradedQuestion, None]:
+        """ Get a cached result (or None). """
+
+        if (not self.enabled):
+            self.misses += 1
+            return None
+
+        path = self._get_path(key)
+
+        try:
+            data = edq.util.json.load_path(path)
+            result = autograder.question.GradedQuestion.from_dict(data)
+        except Exception:
+            # Missing or bad entries are just misses.
+            self.misses += 1
+            return None
+
+        # Mark this result as recently used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: autograder.question.GradedQuestion) -> None:
+        """ Store a result, evicting old results if the cache is full. """
+
+        # The cache dir may have been removed (or changed) since it was last checked.
+        if ((not self.enabled) or (not self._ensure_cache_dir())):
+            self.enabled = False
+            return
+
+        path = self._get_path(key)
+        exists = os.path.exists(path)
+
+        # Write to a temp file first, so concurrent graders never see a partial result.
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        edq.util.json.dump_path(result.to_dict(), temp_path)
+        os.replace(temp_path, path)
+
+        if (exists):
+            return
+
+        if (self._num_entries is None):
+            self._num_entries = len(self._list_entries())
+        else:
+            self._num_entries += 1
+
+        if (self._num_entries > self.max_entries):
+            self._evict()
+
+    def _ensure_cache_dir(self) -> bool:
+        """ Create and check the cache dir, logging and returning False if it cannot be used. """
+
+        try:
+            autograder.util.path.ensure_private_dir(self.cache_dir)
+        except (OSError, ValueError) as ex:
+            _logger.warning("Could not use the result cache dir '%s', not using the cache: '%s'.", self.cache_dir, ex)
+            return False
+
+        return True
+
+    def _evict(self) -> None:
+        """ Remove the least recently used results until the cache is comfortably under its bound. """
+
+        entries = []
+        for path in self._list_entries():
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                # Another process may have already removed this entry.
+                continue
+
+        entries.sort()
+
+        target = int(self.max_entries * EVICTION_RATIO)
+        while (len(entries) > target):
+            _, path = entries.pop(0)
+            edq.util.dirent.remove(path)
+
+        self._num_entries = len(entries)
+
+    def _list_entries(self) -> typing.List[str]:
+        """ Get the paths to all the results in the cache. """
+
+        if (not os.path.isdir(self.cache_dir)):
+            return []
+
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(RESULT_EXTENSION)]
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + RESULT_EXTENSION)
+
+    def _get_question_source_hash(self, question: autograder.question.Question) -> str:
+        """ Hash the source for the question's classes and their module's shared code. """
+
+        parts = []
+
+        for cls in type(question).__mro__:
+            if (cls.__module__.startswith('autograder.') or (cls.__module__ == 'builtins')):
+                continue
+
+            parts.append(self._get_module_hash(cls.__module__))
+            parts.append(_get_source(cls))
+
+        return edq.util.hash.sha256_hex("\n".join(parts))
+
+    def _get_module_hash(self, module_name: str) -> str:
+        """ Hash the source of a module, excluding all of its question classes. """
+
+        if (module_name in self._module_hashes):
+            return self._module_hashes[module_name]
+
+        module = sys.modules.get(module_name, None)
+        source = _get_source(module)
+
+        try:
+            module_ast = ast.parse(source)
+        except SyntaxError:
+            module_ast = None
+
+        if (module_ast is not None):
+            module_ast.body = [node for node in module_ast.body if (not _is_question_class(module, node))]
+            source = ast.unparse(module_ast)
+
+        module_hash = edq.util.hash.sha256_hex(source)
+        self._module_hashes[module_name] = module_hash
+
+        return module_hash
+
+def hash_dir(path: str) -> str:
+    """ Hash the names and contents of all the files in a dir (or a single file). """
+
+    digest = hashlib.sha256()
+
+    if (os.path.isfile(path)):
+        paths = [path]
+        base_dir = os.path.dirname(path)
+    else:
+        paths = []
+        base_dir = path
+
+        for (dirpath, dirnames, filenames) in os.walk(path):
+            dirnames.sort()
+            paths += [os.path.join(dirpath, filename) for filename in sorted(filenames)]
+
+    for file_path in paths:
+        digest.update(os.path.relpath(file_path, base_dir).encode(edq.util.dirent.DEFAULT_ENCODING))
+        digest.update(b'\0')
+
+        with open(file_path, 'rb') as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+
+    return digest.hexdigest()
+
+def _is_question_class(module: typing.Any, node: ast.stmt) -> bool:
+    """ Check if a top-level AST node defines a question class. """
+
+    if (not isinstance(node, ast.ClassDef)):
+        return False
+
+    cls = getattr(module, node.name, None)
+    return (inspect.isclass(cls) and issubclass(cls, autograder.question.Question))
+
+def _get_source(obj: typing.Any) -> str:
+    """
+    Get the source for an object.
+    If the source is not available, then a unique string is returned (so nothing will ever be cached for it).
+    """
+
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return uuid.uuid4().hex
+
+def _dumps(data: typing.Any) -> str:
+    """ Dump data for a key (as JSON when possible). """
+
+    try:
+        return edq.util.json.dumps(data, default = _serialize)
+    except ValueError:
+        # E.g., circular references.
+        return repr(data)
+
+def _serialize(obj: typing.Any) -> typing.Any:
+    """
+    Serialize objects that JSON does not handle.
+    Functions and classes are represented by their name,
+    and objects that edq cannot serialize fall back to repr().
+    """
+
+    if (inspect.isroutine(obj) or inspect.isclass(obj)):
+        return f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', repr(obj))}"
+
+    try:
+        return edq.util.json.json_serialization_handle(obj)
+    except ValueError:
+        return repr(obj)